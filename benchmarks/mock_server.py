@@ -0,0 +1,344 @@
+"""
+In-process mock of the Netsapiens APIv2 endpoints used by netsapiens_asyncio.
+
+The mock serves tokens, messages, message sessions, calls, call counts and
+subscriptions with configurable latency, error rate and payload sizes. It is meant
+for benchmarks and local testing, not for checking API semantics: it accepts any
+domain, user or ID and returns generated data.
+
+Run it standalone with:
+
+    python benchmarks/mock_server.py --port 8080 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+from aiohttp import web
+
+
+class MockNetsapiens:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        calls: int = 20,
+        sessions: int = 100,
+        messages: int = 100,
+        subscriptions: int = 20,
+        message_size: int = 160,
+        token_expires_in: int = 3600,
+        call_duration: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Configure the mock.
+
+        :param latency: Seconds added to every response.
+        :param latency_jitter: Extra random latency, uniform between 0 and this value.
+        :param error_rate: Fraction of requests (0..1) answered with `error_status`.
+        :param error_status: Status returned for injected errors.
+        :param calls: Number of active calls returned per domain.
+        :param sessions: Number of message sessions per domain.
+        :param messages: Number of messages per session.
+        :param subscriptions: Number of subscriptions.
+        :param message_size: Length in characters of each message body.
+        :param token_expires_in: Lifetime in seconds of issued access tokens.
+        :param call_duration: Seconds a call placed with new_call stays active. Active
+                              placed calls are added to the domain's call count.
+        :param seed: Optional seed for the random error injection and jitter.
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = calls
+        self.sessions = sessions
+        self.messages = messages
+        self.subscriptions = subscriptions
+        self.message_size = message_size
+        self.token_expires_in = token_expires_in
+        self.call_duration = call_duration
+        self.placed_calls: Dict[str, List[float]] = {}
+        self.random = random.Random(seed)
+
+        self.requests = 0
+        self.errors_injected = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+        # Bodies that do not depend on the request are encoded once
+        self._calls_body = json.dumps(
+            [self._call(i) for i in range(self.calls)]
+        ).encode()
+        self._subscriptions_body = json.dumps(
+            [self._subscription(i) for i in range(self.subscriptions)]
+        ).encode()
+
+    def make_app(self) -> web.Application:
+        """
+        Build the aiohttp application serving the mocked routes.
+        """
+        app = web.Application(middlewares=[self._middleware])
+        api = "/ns-api/v2"
+        domain = api + "/domains/{domain}"
+        user = domain + "/users/{user}"
+        app.router.add_post(api + "/tokens", self._token)
+        app.router.add_post(user + "/messages", self._send_message)
+        app.router.add_post(
+            user + "/messagesessions/{session}/messages", self._send_message
+        )
+        app.router.add_get(domain + "/messagesessions", self._list_sessions)
+        app.router.add_get(user + "/messagesessions", self._list_sessions)
+        app.router.add_get(
+            user + "/messagesessions/{session}/messages", self._list_messages
+        )
+        app.router.add_get(domain + "/calls", self._list_calls)
+        app.router.add_get(domain + "/calls/count", self._count_calls)
+        app.router.add_get(user + "/calls", self._list_calls)
+        app.router.add_get(user + "/calls/{callid}", self._get_call)
+        app.router.add_post(user + "/calls", self._new_call)
+        app.router.add_get(api + "/subscriptions", self._list_subscriptions)
+        app.router.add_post(api + "/subscriptions", self._create_subscription)
+        app.router.add_get(api + "/subscriptions/{id}", self._get_subscription)
+        app.router.add_put(api + "/subscriptions/{id}", self._update_subscription)
+        app.router.add_delete(api + "/subscriptions/{id}", self._delete_subscription)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving and return the base URL, e.g. "http://127.0.0.1:41234". Port 0
+        picks a free port.
+        """
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sockets = site._server.sockets
+        bound_port = sockets[0].getsockname()[1] if sockets else port
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def auth_config(self) -> dict:
+        """
+        Return an auth_config for NetsapiensAPI pointing at the mock.
+        """
+        return {
+            "base_url": self.url,
+            "client_id": "bench",
+            "client_secret": "bench",
+            "username": "bench@mock",
+            "password": "bench",
+        }
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        delay = self.latency
+        if self.latency_jitter:
+            delay += self.random.uniform(0, self.latency_jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors_injected += 1
+            return web.json_response(
+                {"code": self.error_status, "message": "Injected error"},
+                status=self.error_status,
+                headers={"Retry-After": "0"} if self.error_status == 429 else None,
+            )
+        if request.path != "/ns-api/v2/tokens" and not request.headers.get(
+            "Authorization", ""
+        ).startswith("Bearer "):
+            return web.json_response(
+                {"code": 401, "message": "Missing token"}, status=401
+            )
+        return await handler(request)
+
+    @staticmethod
+    def _raw_json(body: bytes, status: int = 200) -> web.Response:
+        return web.Response(body=body, status=status, content_type="application/json")
+
+    def _page(self, request: web.Request, total: int, make) -> web.Response:
+        start = int(request.query.get("start", 0))
+        limit = int(request.query.get("limit", total))
+        stop = min(total, start + limit)
+        return web.json_response([make(i) for i in range(start, stop)])
+
+    def _call(self, i: int) -> dict:
+        return {
+            "call-orig-call-id": f"mock-call-{i}",
+            "call-term-call-id": f"mock-term-{i}",
+            "call-orig-domain": "mock.example",
+            "call-orig-user": str(1000 + i),
+            "call-term-domain": "mock.example",
+            "call-term-user": f"1555000{i:04d}",
+            "call-status": "active",
+            "call-start-datetime": "2024-12-09 21:27:11",
+        }
+
+    def _subscription(self, i: int) -> dict:
+        return {
+            "id": f"mock-sub-{i}",
+            "model": "call",
+            "post-url": "https://hooks.example.com/netsapiens/call",
+            "subscription-geo-support": "no",
+            "reseller": "mock",
+            "domain": "*",
+            "user": "*",
+            "status": "active",
+            "error-count": 0,
+            "posts-count": i,
+            "subscription-creation-datetime": "2024-12-09T21:27:11+00:00",
+            "subscription-expires-datetime": "2099-12-09T21:27:11+00:00",
+        }
+
+    async def _token(self, request: web.Request) -> web.Response:
+        token = f"mock-{time.monotonic_ns()}"
+        return web.json_response(
+            {
+                "access_token": token,
+                "refresh_token": f"refresh-{token}",
+                "expires_in": self.token_expires_in,
+                "token_type": "Bearer",
+            }
+        )
+
+    async def _send_message(self, request: web.Request) -> web.Response:
+        await request.read()
+        return web.json_response({"code": 200, "status": "queued"})
+
+    async def _list_sessions(self, request: web.Request) -> web.Response:
+        domain = request.match_info["domain"]
+        return self._page(
+            request,
+            self.sessions,
+            lambda i: {
+                "messagesession": f"mocksession{i:024d}",
+                "domain": domain,
+                "user": request.match_info.get("user", "1000"),
+                "last-message": "x" * self.message_size,
+                "last-timestamp": "2024-12-09 21:27:11",
+            },
+        )
+
+    async def _list_messages(self, request: web.Request) -> web.Response:
+        session = request.match_info["session"]
+        return self._page(
+            request,
+            self.messages,
+            lambda i: {
+                "id": f"{session}-{i}",
+                "messagesession": session,
+                "type": "sms",
+                "direction": "out",
+                "message": "x" * self.message_size,
+                "from-number": "15550000000",
+                "destination": "15551111111",
+                "timestamp": "2024-12-09 21:27:11",
+            },
+        )
+
+    async def _list_calls(self, request: web.Request) -> web.Response:
+        return self._raw_json(self._calls_body)
+
+    def active_placed(self, domain: str) -> int:
+        """
+        Return how many calls placed in `domain` are still active.
+        """
+        now = time.monotonic()
+        ends = [end for end in self.placed_calls.get(domain, ()) if end > now]
+        self.placed_calls[domain] = ends
+        return len(ends)
+
+    async def _count_calls(self, request: web.Request) -> web.Response:
+        domain = request.match_info["domain"]
+        return web.json_response({"total": self.calls + self.active_placed(domain)})
+
+    async def _get_call(self, request: web.Request) -> web.Response:
+        return web.json_response(self._call(0))
+
+    async def _new_call(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.call_duration:
+            self.placed_calls.setdefault(request.match_info["domain"], []).append(
+                time.monotonic() + self.call_duration
+            )
+        return web.json_response(
+            {"call-id": payload.get("call-id"), "status": "queued"}, status=202
+        )
+
+    async def _list_subscriptions(self, request: web.Request) -> web.Response:
+        return self._raw_json(self._subscriptions_body)
+
+    async def _create_subscription(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        return web.json_response(dict(self._subscription(0), **payload))
+
+    async def _get_subscription(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            dict(self._subscription(0), id=request.match_info["id"])
+        )
+
+    async def _update_subscription(self, request: web.Request) -> web.Response:
+        await request.read()
+        return web.json_response({"code": 202, "status": "updated"}, status=202)
+
+    async def _delete_subscription(self, request: web.Request) -> web.Response:
+        return web.json_response({"code": 202, "status": "deleted"}, status=202)
+
+
+async def _serve(args):
+    mock = MockNetsapiens(
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        error_rate=args.error_rate,
+        calls=args.calls,
+        sessions=args.sessions,
+        messages=args.messages,
+        message_size=args.message_size,
+    )
+    url = await mock.start(args.host, args.port)
+    print(f"Mock Netsapiens API listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--message-size", type=int, default=160)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
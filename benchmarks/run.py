@@ -0,0 +1,310 @@
+"""
+Benchmark the public API methods of netsapiens_asyncio against the local mock server.
+
+For each method and concurrency level the harness reports requests per second,
+p50/p99 latency, peak memory allocated by Python during the run and the number of
+TCP connections opened, and writes the results as JSON so that runs can be compared
+between versions:
+
+    python benchmarks/run.py --concurrency 1,10,50 --requests 2000 --output new.json
+    python benchmarks/run.py --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockNetsapiens  # noqa: E402
+from netsapiens_asyncio.auth import NetsapiensAPI  # noqa: E402
+from netsapiens_asyncio.calls import CallsAPI  # noqa: E402
+from netsapiens_asyncio.concurrency import run_bounded  # noqa: E402
+from netsapiens_asyncio.messages import MessageAPI  # noqa: E402
+from netsapiens_asyncio.retry import NO_RETRY  # noqa: E402
+from netsapiens_asyncio.subscribe import SubscriptionAPI  # noqa: E402
+
+SESSION = "mocksession" + "0" * 24
+QUIET = logging.WARNING
+
+
+class Clients:
+    def __init__(self, auth: NetsapiensAPI):
+        self.auth = auth
+        self.messages = MessageAPI(auth, log_level=QUIET)
+        self.calls = CallsAPI(auth, log_level=QUIET)
+        self.subscriptions = SubscriptionAPI(auth, log_level=QUIET)
+
+
+async def _drain(iterator) -> int:
+    count = 0
+    async for _ in iterator:
+        count += 1
+    return count
+
+
+# Each scenario performs one operation. An operation is usually one HTTP request;
+# the iterator scenarios consume a whole listing.
+SCENARIOS: Dict[str, Callable[[Clients, int], Awaitable]] = {
+    "get_token": lambda c, i: c.auth.get_token(),
+    "send_message": lambda c, i: c.messages.send_message(
+        "sms", "Benchmark message", "15551111111", "15550000000"
+    ),
+    "get_messages.sessions": lambda c, i: c.messages.get_messages(domain="mock"),
+    "get_messages.session": lambda c, i: c.messages.get_messages(
+        messagesession=SESSION, domain="mock", user="1000"
+    ),
+    "stream_messages": lambda c, i: _drain(
+        c.messages.stream_messages(SESSION, domain="mock", user="1000")
+    ),
+    "iter_sessions": lambda c, i: _drain(
+        c.messages.iter_sessions(domain="mock", page_size=25)
+    ),
+    "read_calls": lambda c, i: c.calls.read_calls("mock"),
+    "read_calls.count": lambda c, i: c.calls.read_calls("mock", count=True),
+    "read_calls.typed": lambda c, i: c.calls.read_calls("mock", typed=True),
+    "stream_calls": lambda c, i: _drain(c.calls.stream_calls("mock")),
+    "new_call": lambda c, i: c.calls.new_call(
+        "mock", "1000", "no", "15551111111", call_id=f"bench{i}"
+    ),
+    "read_subscription": lambda c, i: c.subscriptions.read_subscription(),
+    "create_subscription": lambda c, i: c.subscriptions.create_subscription(
+        "call", "https://hooks.example.com/netsapiens/call"
+    ),
+    "update_subscription": lambda c, i: c.subscriptions.update_subscription(
+        f"mock-sub-{i}", model="call", posts_count=1
+    ),
+    "delete_subscription": lambda c, i: c.subscriptions.delete_subscription(
+        f"mock-sub-{i}"
+    ),
+}
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _connection_tracer(counters: Dict[str, int]) -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+
+    async def created(session, context, params):
+        counters["opened"] += 1
+
+    async def reused(session, context, params):
+        counters["reused"] += 1
+
+    trace.on_connection_create_end.append(created)
+    trace.on_connection_reuseconn.append(reused)
+    return trace
+
+
+async def run_scenario(
+    mock: MockNetsapiens,
+    name: str,
+    concurrency: int,
+    requests: int,
+    measure_memory: bool,
+) -> dict:
+    """
+    Run one scenario at one concurrency level against a fresh client.
+    """
+    counters = {"opened": 0, "reused": 0}
+    auth = NetsapiensAPI(
+        mock.auth_config(),
+        log_level=QUIET,
+        connection_limit=max(100, concurrency),
+        retry_policy=NO_RETRY,
+        trace_configs=[_connection_tracer(counters)],
+    )
+    operation = SCENARIOS[name]
+    async with auth:
+        await auth.get_token()
+        clients = Clients(auth)
+        # Warm up the pool so that connection setup is counted but not timed
+        await operation(clients, 0)
+
+        if measure_memory:
+            tracemalloc.start()
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        async for outcome in run_bounded(
+            range(requests), lambda i: operation(clients, i), concurrency
+        ):
+            if outcome.ok:
+                latencies.append(outcome.latency)
+            else:
+                errors += 1
+        elapsed = time.perf_counter() - started
+        peak_memory = None
+        if measure_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "method": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed": round(elapsed, 4),
+        "rps": round(requests / elapsed, 1) if elapsed else None,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": (
+            round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None
+        ),
+        "peak_memory_bytes": peak_memory,
+        "connections_opened": counters["opened"],
+        "connections_reused": counters["reused"],
+    }
+
+
+def _library_version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("netsapiens-asyncio")
+    except Exception:
+        return "unknown"
+
+
+async def run_all(args) -> dict:
+    mock = MockNetsapiens(
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        error_rate=args.error_rate,
+        calls=args.calls,
+        sessions=args.sessions,
+        messages=args.messages,
+        message_size=args.message_size,
+        seed=args.seed,
+    )
+    methods = args.methods.split(",") if args.methods else list(SCENARIOS)
+    unknown = [name for name in methods if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown methods: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = []
+    async with mock:
+        for name in methods:
+            for concurrency in levels:
+                result = await run_scenario(
+                    mock, name, concurrency, args.requests, not args.no_memory
+                )
+                results.append(result)
+                print(
+                    f"{name:24} c={concurrency:<4} {result['rps']:>9} req/s  "
+                    f"p50={result['p50_ms']:>8}ms  p99={result['p99_ms']:>8}ms  "
+                    f"conns={result['connections_opened']:<4} errors={result['errors']}"
+                )
+
+    return {
+        "meta": {
+            "library_version": _library_version(),
+            "git_revision": os.environ.get("GIT_REVISION"),
+            "python": platform.python_version(),
+            "aiohttp": aiohttp.__version__,
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "mock": {
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "error_rate": args.error_rate,
+                "calls": args.calls,
+                "sessions": args.sessions,
+                "messages": args.messages,
+                "message_size": args.message_size,
+            },
+            "requests": args.requests,
+            "memory_traced": not args.no_memory,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float = 0.10) -> int:
+    """
+    Print the change in throughput and p99 latency between two result files.
+
+    :return: 1 if any method slowed down by more than `threshold`, otherwise 0.
+    """
+    with open(old_path) as f:
+        old = {(r["method"], r["concurrency"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {(r["method"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    regressed = False
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if not before["rps"] or not after["rps"]:
+            continue
+        change = after["rps"] / before["rps"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(
+            f"{key[0]:24} c={key[1]:<4} rps {before['rps']:>9} -> {after['rps']:>9} "
+            f"({change:+.1%})  p99 {before['p99_ms']}ms -> {after['p99_ms']}ms{flag}"
+        )
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--methods",
+        help=f"Comma separated methods to run (default all): {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--concurrency", default="1,10,50,100")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--message-size", type=int, default=160)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Do not trace memory; tracing lowers throughput noticeably",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Compare two result files instead of running",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare))
+
+    report = asyncio.run(run_all(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,82 @@
 import aiohttp
+import asyncio
 import logging
+import sys
+import time
 from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from .cache import ResponseCache, make_key
+from .codec import JSONCodec, default_codec
+from .coalesce import RequestCoalescer
+from .log import get_logger
+from .metrics import Instrumentation, MetricsHook, RequestEvent, TokenEvent
+from .exceptions import (
+    AuthenticationError,
+    DeadlineExceededError,
+    NetsapiensAPIError,
+    NetworkError,
+    RateLimitError,
+    RetryableError,
+    ServerError,
+)
+from .ratelimit import THROTTLE_STATUSES, RateLimiter, parse_retry_after
+from .retry import IDEMPOTENT_METHODS, RETRYABLE_STATUSES, RetryPolicy
+from .streaming import JSONArrayDecoder
+
+_MISSING = object()
+# Token endpoint statuses meaning the refresh token itself was refused
+REFRESH_REJECTED_STATUSES = (400, 401)
 
 
 class NetsapiensAPI:
-    def __init__(self, auth_config: dict, log_level=logging.INFO):
+    def __init__(
+        self,
+        auth_config: dict,
+        log_level=logging.INFO,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: Optional[int] = 300,
+        request_timeout: Optional[float] = 60,
+        refresh_skew: float = 60,
+        auto_refresh: bool = True,
+        rate_limits: Optional[Dict[str, dict]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        response_cache: Optional[ResponseCache] = None,
+        coalesce_requests: bool = False,
+        trace_configs: Optional[List[aiohttp.TraceConfig]] = None,
+        json_codec: Optional[JSONCodec] = None,
+    ):
         """
         Initialize the NetsapiensAPI class with authentication details and logging setup.
 
+        The client owns a single pooled HTTP session that is shared by every API class
+        constructed with it. Use the client as an async context manager, or call
+        `close()` when finished, to release the pooled connections.
+
         :param auth_config: Dictionary containing authentication information.
         :param log_level: Logging level (default is INFO).
+        :param connection_limit: Maximum number of simultaneous connections in the pool (0 for no limit).
+        :param connection_limit_per_host: Maximum number of simultaneous connections per host (0 for no limit).
+        :param keepalive_timeout: Seconds an idle connection is kept open for reuse.
+        :param dns_cache_ttl: Seconds resolved DNS entries are cached (None to cache forever).
+        :param request_timeout: Total timeout in seconds for a single request (None to disable).
+        :param refresh_skew: Seconds before expiry at which the access token is refreshed.
+        :param auto_refresh: If True, refresh the token ahead of expiry in a background task.
+        :param rate_limits: Optional per endpoint group limits ("messages", "calls",
+                            "subscriptions", "tokens"), see RateLimiter.
+        :param retry_policy: Optional RetryPolicy for API requests. Defaults to
+                             RetryPolicy() (up to 4 attempts with jittered backoff).
+        :param response_cache: Optional ResponseCache for slowly changing GET responses
+                               (subscriptions and message session listings). Disabled
+                               by default.
+        :param coalesce_requests: If True, identical GET requests made concurrently share
+                                  one HTTP request and receive the same decoded result.
+        :param trace_configs: Optional aiohttp TraceConfig objects attached to the
+                              session, e.g. to count connections.
+        :param json_codec: Optional JSONCodec used to encode request bodies and decode
+                           responses. Defaults to orjson when it is installed and the
+                           json module otherwise.
         """
         self.base_url = auth_config.get("base_url")
         self.client_id = auth_config.get("client_id")
@@ -18,28 +85,120 @@ class NetsapiensAPI:
         self.password = auth_config.get("password")
         self.token_data = None
 
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.request_timeout = request_timeout
+        self.trace_configs = trace_configs
+        self.codec = json_codec or default_codec()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        self.refresh_skew = refresh_skew
+        self.auto_refresh = auto_refresh
+        # Monotonic deadlines for the current token; see _track_token()
+        self._tracked_token: Optional[dict] = None
+        self._expires_at_monotonic = 0.0
+        self._refresh_at_monotonic = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._auto_refresh_task: Optional[asyncio.Task] = None
+        self._token_listeners: List[Callable[[dict], None]] = []
+
+        self.rate_limiter = RateLimiter(rate_limits)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.response_cache = response_cache
+        self.coalescer = RequestCoalescer() if coalesce_requests else None
+        self.instrumentation = Instrumentation()
+
         # Create a dedicated logger for this class
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(log_level)
-
-        # Add a handler if the logger has no handlers (to avoid duplicate logs)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
+        self.logger = get_logger(self.__class__.__name__, log_level)
 
+        self.instrumentation.logger = self.logger
         self.logger.debug("NetsapiensAPI initialized")
 
+    async def __aenter__(self):
+        self.get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def api_origin(self) -> str:
+        """
+        Scheme and host of the API. base_url is normally a bare host name, which implies
+        https; a base_url that already includes a scheme (e.g. "http://127.0.0.1:8080"
+        for a local mock server) is used as is.
+        """
+        if "://" in (self.base_url or ""):
+            return self.base_url.rstrip("/")
+        return f"https://{self.base_url}"
+
+    def add_hook(self, hook: MetricsHook):
+        """
+        Register an instrumentation hook receiving request, retry, connection and token
+        events, e.g. a metrics.MetricsAggregator. Register hooks before the first request
+        so that connection reuse is reported as well.
+
+        :param hook: A MetricsHook instance.
+        """
+        self.instrumentation.add_hook(hook)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared HTTP session, creating the connection pool on first use.
+
+        Must be called from within a running event loop. A new session is created
+        if the previous one has been closed.
+
+        :return: The pooled aiohttp.ClientSession owned by this client.
+        """
+        if self._session is None or self._session.closed:
+            trace_configs = list(self.trace_configs or [])
+            if self.instrumentation.hooks:
+                # Connection reuse is only traced when hooks exist at session creation
+                trace_configs.append(self.instrumentation.trace_config())
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                trace_configs=trace_configs or None,
+            )
+            self.logger.debug(
+                f"Created HTTP connection pool (limit={self.connection_limit}, "
+                f"limit_per_host={self.connection_limit_per_host})"
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Close the shared HTTP session, stop the background token refresh and release
+        all pooled connections.
+        """
+        if self._auto_refresh_task is not None:
+            self._auto_refresh_task.cancel()
+            try:
+                await self._auto_refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._auto_refresh_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            self.logger.debug("HTTP connection pool closed")
+        self._session = None
+
     async def get_token(self):
         """
         Asynchronously request a new OAuth2 token using the password grant.
 
         :return: A dictionary containing the token data.
         """
-        url = f"https://{self.base_url}/ns-api/v2/tokens"
         payload = {
             "grant_type": "password",
             "client_id": self.client_id,
@@ -47,27 +206,13 @@ class NetsapiensAPI:
             "username": self.username,
             "password": self.password,
         }
-        self.logger.debug(f"Requesting token with payload: {payload}")
+        self.logger.debug("Requesting token for user %s", self.username)
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    token_data = await response.json()
-                    expires_in_seconds = token_data.get("expires_in", 0)
-                    token_data["expires_at"] = (
-                        datetime.now(timezone.utc)
-                        + timedelta(seconds=expires_in_seconds)
-                    ).strftime("%Y-%m-%d %H:%M:%S")
-                    token_data["api_url"] = f"https://{self.base_url}"
-                    self.token_data = token_data
-                    self.logger.info(
-                        f"Received new auth token: {self.token_data['access_token']}"
-                    )
-                    return self.token_data
-                else:
-                    error_message = await response.text()
-                    self.logger.error(f"Failed to get token: {error_message}")
-                    raise Exception(f"Failed to get token: {error_message}")
+        token_data = await self._request_token(payload, "get token")
+        self.logger.info(
+            "Received new auth token (expires in %ss)", token_data.get("expires_in")
+        )
+        return token_data
 
     async def refresh_access_token(self):
         """
@@ -79,69 +224,684 @@ class NetsapiensAPI:
             self.logger.error("No refresh token available. Please authenticate first.")
             raise Exception("No refresh token available. Please authenticate first.")
 
-        url = f"https://{self.base_url}/ns-api/v2/tokens"
         payload = {
             "grant_type": "refresh_token",
             "client_id": self.client_id,
             "client_secret": self.client_secret,
             "refresh_token": self.token_data["refresh_token"],
         }
-        self.logger.debug(f"Refreshing token with payload: {payload}")
+        self.logger.debug("Refreshing token using refresh_token grant")
 
-        async with aiohttp.ClientSession() as session:
+        token_data = await self._request_token(payload, "refresh token")
+        self.logger.info(
+            "Token refreshed successfully (expires in %ss)",
+            token_data.get("expires_in"),
+        )
+        return token_data
+
+    async def _request_token(self, payload: dict, action: str) -> dict:
+        """
+        POST a grant to the token endpoint and store the resulting token data.
+
+        :param payload: The grant payload to send.
+        :param action: Short description of the grant used in error messages.
+        :return: A dictionary containing the token data.
+        """
+        url = f"{self.api_origin}/ns-api/v2/tokens"
+        started = time.perf_counter()
+        status = None
+
+        limiter = self.rate_limiter.group("tokens")
+        await limiter.acquire()
+        try:
+            session = self.get_session()
             async with session.post(url, json=payload) as response:
+                status = response.status
+                limiter.observe(response.status, response.headers.get("Retry-After"))
                 if response.status == 200:
-                    token_data = await response.json()
+                    token_data = self.codec.loads(await response.read())
                     expires_in_seconds = token_data.get("expires_in", 0)
                     token_data["expires_at"] = (
                         datetime.now(timezone.utc)
                         + timedelta(seconds=expires_in_seconds)
                     ).strftime("%Y-%m-%d %H:%M:%S")
-                    token_data["api_url"] = f"https://{self.base_url}"
-                    self.token_data = token_data
-                    self.logger.info(
-                        f"Token refreshed successfully: {self.token_data['access_token']}"
-                    )
-                    return self.token_data
+                    token_data["api_url"] = self.api_origin
+                    self._track_token(token_data, expires_in_seconds)
+                    return token_data
+                elif status in THROTTLE_STATUSES or status in RETRYABLE_STATUSES:
+                    # The endpoint is overloaded or down; the grant was not judged
+                    await self._raise_for_status(response, action)
                 else:
                     error_message = await response.text()
-                    self.logger.error(f"Failed to refresh token: {error_message}")
-                    raise Exception(f"Failed to refresh token: {error_message}")
+                    self.logger.error(f"Failed to {action}: {error_message}")
+                    raise AuthenticationError(
+                        f"Failed to {action}: {error_message}", status=response.status
+                    )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Network error while trying to {action}: {e}")
+            raise NetworkError(
+                f"Network error occurred while trying to {action}."
+            ) from e
+        finally:
+            limiter.release()
+            if self.instrumentation.hooks:
+                self.instrumentation.token(
+                    TokenEvent(
+                        payload["grant_type"],
+                        status,
+                        time.perf_counter() - started,
+                        sys.exc_info()[1],
+                    )
+                )
+
+    def _track_token(self, token_data: dict, expires_in_seconds: float):
+        """
+        Make token_data the current token and record its expiry as monotonic deadlines.
+
+        :param token_data: The token data to use for subsequent requests.
+        :param expires_in_seconds: Remaining lifetime of the access token in seconds.
+        """
+        now = time.monotonic()
+        self.token_data = token_data
+        self._tracked_token = token_data
+        self._expires_at_monotonic = now + expires_in_seconds
+        # Never schedule the refresh earlier than halfway through a short-lived token
+        skew = max(0.0, min(self.refresh_skew, expires_in_seconds / 2))
+        self._refresh_at_monotonic = self._expires_at_monotonic - skew
+
+        if self.auto_refresh and (
+            self._auto_refresh_task is None or self._auto_refresh_task.done()
+        ):
+            self._auto_refresh_task = asyncio.ensure_future(self._auto_refresh_loop())
+
+        for listener in self._token_listeners:
+            try:
+                listener(token_data)
+            except Exception as e:
+                self.logger.error(f"Token listener failed: {e}")
+
+    @property
+    def token_refresh_at(self) -> float:
+        """
+        time.monotonic() value at which the current token is due for refresh.
+        """
+        return self._refresh_at_monotonic
+
+    def add_token_listener(self, listener: Callable[[dict], None]):
+        """
+        Register a callback invoked with the token data whenever a new token is tracked,
+        e.g. after login or refresh.
+
+        :param listener: Function called with the token data dictionary.
+        """
+        self._token_listeners.append(listener)
+
+    async def refresh_token(self) -> dict:
+        """
+        Refresh the access token, sharing a single in-flight request between all callers.
+
+        Concurrent callers wait on the same refresh. If the refresh token is rejected
+        (400 or 401), a new token is requested using the password grant. Throttling,
+        server and network errors are raised as retryable errors instead.
+
+        :return: A dictionary containing the new token data.
+        """
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_or_login())
+        # Shield so that one cancelled waiter does not abort the shared refresh
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh_or_login(self) -> dict:
+        if self.token_data and "refresh_token" in self.token_data:
+            try:
+                return await self.refresh_access_token()
+            except AuthenticationError as e:
+                if e.status not in REFRESH_REJECTED_STATUSES:
+                    raise
+                self.logger.warning(
+                    f"Refresh token rejected (status {e.status}). "
+                    "Falling back to password grant."
+                )
+        return await self.get_token()
+
+    async def _auto_refresh_loop(self):
+        """
+        Background task that refreshes the token shortly before it expires.
+        """
+        retry_delay = 1.0
+        while True:
+            delay = self._refresh_at_monotonic - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                # The token may have been replaced while sleeping
+                if time.monotonic() < self._refresh_at_monotonic:
+                    continue
+            try:
+                await self.refresh_token()
+                retry_delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(
+                    f"Background token refresh failed, retrying in {retry_delay}s: {e}"
+                )
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60.0)
 
     async def check_token_expiry(self):
         """
         Check if the access token has expired. If expired, refresh it and update the token data.
         Raises an exception if token data or expires_at is not available.
 
+        The check compares a cached monotonic deadline, so the common case of a valid
+        token costs a single clock read. Inside the refresh skew window the current token
+        is returned while a refresh runs in the background.
+
         :return: Updated token data.
         """
-        if not self.token_data:
+        token_data = self.token_data
+        if (
+            token_data is not None
+            and token_data is self._tracked_token
+            and time.monotonic() < self._refresh_at_monotonic
+        ):
+            return token_data
+
+        if not token_data:
             self.logger.error("Token data is not available. Please authenticate first.")
             raise Exception("Token data is missing. Authentication is required.")
 
-        if "expires_at" not in self.token_data:
-            self.logger.error(
-                "'expires_at' is missing in token data. Authentication failed."
+        if token_data is not self._tracked_token:
+            # Token data was assigned directly; derive its deadlines once
+            if "expires_at" not in token_data:
+                self.logger.error(
+                    "'expires_at' is missing in token data. Authentication failed."
+                )
+                raise Exception(
+                    "'expires_at' is missing in token data. Cannot verify token validity."
+                )
+
+            # Parse the expiration time and make it timezone-aware
+            try:
+                expires_at = datetime.strptime(
+                    token_data["expires_at"], "%Y-%m-%d %H:%M:%S"
+                ).replace(tzinfo=timezone.utc)
+            except ValueError as e:
+                self.logger.error(f"Invalid 'expires_at' format in token data: {e}")
+                raise Exception("Invalid 'expires_at' format in token data.") from e
+
+            remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+            self._track_token(token_data, remaining)
+            if time.monotonic() < self._refresh_at_monotonic:
+                return token_data
+
+        # Check if the token has expired
+        if time.monotonic() >= self._expires_at_monotonic:
+            if self._refresh_task is None or self._refresh_task.done():
+                self.logger.info("Access token has expired. Refreshing token...")
+            return await self.refresh_token()
+
+        # Still valid but inside the skew window: refresh without blocking the caller
+        if self._refresh_task is None or self._refresh_task.done():
+            self.logger.info(
+                "Access token is about to expire. Refreshing in background."
             )
-            raise Exception(
-                "'expires_at' is missing in token data. Cannot verify token validity."
+            self._refresh_task = asyncio.ensure_future(self._refresh_or_login())
+            self._refresh_task.add_done_callback(self._log_refresh_failure)
+        return token_data
+
+    def _log_refresh_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"Token refresh failed: {task.exception()}")
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        group: str,
+        action: str,
+        ok_statuses=(200,),
+        json: Optional[dict] = None,
+        params: Optional[dict] = None,
+        idempotent: Optional[bool] = None,
+        deadline: Optional[float] = None,
+        cache: bool = False,
+        raw: bool = False,
+        body=None,
+    ):
+        """
+        Send an authenticated request through the shared session, rate limiter and retry policy.
+
+        All API classes route their requests through this method. The request waits for
+        a slot in the limiter for its endpoint group, and the response status (including
+        any Retry-After header on 429/503) is fed back into that limiter. Retryable
+        failures are retried according to `self.retry_policy`.
+
+        :param method: HTTP method.
+        :param url: Full request URL.
+        :param group: Endpoint group used for rate limiting ("messages", "calls", ...).
+        :param action: Short description of the operation used in error messages,
+                       e.g. "retrieve calls".
+        :param ok_statuses: HTTP statuses that indicate success.
+        :param json: Optional JSON body.
+        :param params: Optional query parameters.
+        :param idempotent: Whether the request is safe to repeat. Defaults to True for
+                           GET, PUT and DELETE and False for POST.
+        :param deadline: Total time budget in seconds including retries. Defaults to the
+                         retry policy's deadline.
+        :param cache: If True and a response cache is configured, serve a GET from the
+                      cache and store the response on a miss.
+        :param raw: If True, return the undecoded response body as bytes. Raw responses
+                    are never cached.
+        :param body: Optional streamed JSON body used instead of `json`, such as a
+                     media.MessageBody. Its open() is called for every attempt and
+                     returns an async iterator of bytes; its `length`, if not None,
+                     is sent as Content-Length. A body whose `replayable` is False
+                     is not retried.
+        :return: The decoded JSON response, or bytes when `raw` is True.
+        """
+        response_cache = (
+            self.response_cache if cache and method == "GET" and not raw else None
+        )
+        if response_cache is not None:
+            key = make_key(url, params)
+            cached = response_cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+
+        async def fetch():
+            generation = response_cache.generation if response_cache else None
+            result = await self._request_with_retries(
+                method,
+                url,
+                group,
+                action,
+                ok_statuses,
+                json,
+                params,
+                idempotent,
+                deadline,
+                raw,
+                body,
             )
+            if response_cache is not None:
+                response_cache.set(key, result, generation)
+            return result
 
-        # Parse the expiration time and make it timezone-aware
+        if self.coalescer is None or method != "GET":
+            return await fetch()
+
+        # Concurrent identical GETs share the request started by the first caller. Each
+        # caller still honours its own deadline while waiting.
+        if deadline is None:
+            deadline = self.retry_policy.deadline
         try:
-            expires_at = datetime.strptime(
-                self.token_data["expires_at"], "%Y-%m-%d %H:%M:%S"
-            ).replace(tzinfo=timezone.utc)
+            return await self.coalescer.run(
+                (make_key(url, params), tuple(ok_statuses), raw),
+                fetch,
+                deadline,
+            )
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceededError(
+                f"Deadline exceeded while trying to {action}."
+            ) from e
+
+    async def _request_with_retries(
+        self,
+        method: str,
+        url: str,
+        group: str,
+        action: str,
+        ok_statuses,
+        json: Optional[dict],
+        params: Optional[dict],
+        idempotent: Optional[bool],
+        deadline: Optional[float],
+        raw: bool = False,
+        body=None,
+    ):
+        policy = self.retry_policy
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        if deadline is None:
+            deadline = policy.deadline
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = None
+            if deadline_at is not None:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded while trying to {action}."
+                    )
+                timeout = aiohttp.ClientTimeout(total=remaining)
+
+            try:
+                return await self._send_request(
+                    method,
+                    url,
+                    group,
+                    action,
+                    ok_statuses,
+                    json,
+                    params,
+                    timeout,
+                    attempt,
+                    raw,
+                    body,
+                )
+            except RetryableError as e:
+                if deadline_at is not None and time.monotonic() >= deadline_at:
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded while trying to {action}."
+                    ) from e
+                if not policy.should_retry(e, attempt, idempotent):
+                    raise
+                # Media read from an async iterator has been consumed by this attempt
+                if body is not None and not body.replayable:
+                    raise
+                delay = policy.backoff(attempt, getattr(e, "retry_after", None))
+                if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                    raise
+                if self.instrumentation.hooks:
+                    self.instrumentation.retry(
+                        RequestEvent(method, url, group, action, attempt), delay
+                    )
+                self.logger.warning(
+                    f"Attempt {attempt} to {action} failed ({e}). "
+                    f"Retrying in {delay:.2f}s."
+                )
+                await asyncio.sleep(delay)
+
+    def invalidate_cache(self, url_prefix: str = "", contains: Optional[str] = None):
+        """
+        Evict cached responses whose URL starts with `url_prefix` and, if given, contains
+        `contains`. Does nothing when no response cache is configured.
+        """
+        if self.response_cache is not None:
+            self.response_cache.invalidate(url_prefix, contains)
+
+    async def _send_request(
+        self,
+        method: str,
+        url: str,
+        group: str,
+        action: str,
+        ok_statuses,
+        json: Optional[dict],
+        params: Optional[dict],
+        timeout: Optional[aiohttp.ClientTimeout],
+        attempt: int = 1,
+        raw: bool = False,
+        body=None,
+    ):
+        token_data = await self.check_token_expiry()
+        headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+        kwargs = {"params": params, "headers": headers}
+        if body is not None:
+            kwargs["data"] = body.open()
+            headers["Content-Type"] = "application/json"
+            if body.length is not None:
+                headers["Content-Length"] = str(body.length)
+        elif json is not None:
+            kwargs["data"] = self.codec.dumps(json)
+            headers["Content-Type"] = "application/json"
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        event = None
+        if self.instrumentation.hooks:
+            event = RequestEvent(method, url, group, action, attempt)
+            kwargs["trace_request_ctx"] = event
+
+        limiter = self.rate_limiter.group(group)
+        # Waiting for the limiter counts against the deadline like the request itself
+        budget = timeout.total if timeout is not None else None
+        try:
+            waited = await limiter.acquire(budget)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceededError(
+                f"Deadline exceeded while trying to {action}."
+            ) from e
+        if budget is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=max(budget - waited, 0.001))
+        if event is not None:
+            event.limiter_wait = waited
+            self.instrumentation.request_start(event)
+        try:
+            session = self.get_session()
+            async with session.request(method, url, **kwargs) as response:
+                limiter.observe(response.status, response.headers.get("Retry-After"))
+                if event is not None:
+                    self._record_response(event, response)
+                if response.status in ok_statuses:
+                    body = await response.read()
+                    if raw:
+                        return body
+                    return self._decode(body, response.status, action)
+                await self._raise_for_status(response, action)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Network error while trying to {action}: {e}")
+            raise NetworkError(
+                f"Network error occurred while trying to {action}."
+            ) from e
+        finally:
+            limiter.release()
+            if event is not None:
+                self.instrumentation.request_end(event, sys.exc_info()[1])
+
+    def _decode(self, body: bytes, status: int, action: str):
+        """
+        Decode a response body with the configured codec. An empty body decodes to None.
+        """
+        if not body.strip():
+            return None
+        try:
+            return self.codec.loads(body)
         except ValueError as e:
-            self.logger.error(f"Invalid 'expires_at' format in token data: {e}")
-            raise Exception("Invalid 'expires_at' format in token data.") from e
+            raise NetsapiensAPIError(
+                f"Failed to {action}: invalid JSON in response ({e})", status
+            ) from e
 
-        now = datetime.now(timezone.utc)
+    @staticmethod
+    def _record_response(event: RequestEvent, response: aiohttp.ClientResponse):
+        event.status = response.status
+        event.bytes_received = response.content_length
+        sent = response.request_info.headers.get("Content-Length")
+        event.bytes_sent = int(sent) if sent else 0
 
-        # Check if the token has expired
-        if now >= expires_at:
-            self.logger.info("Access token has expired. Refreshing token...")
-            return await self.refresh_access_token()
-        else:
-            self.logger.info("Access token is still valid.")
-            return self.token_data
+    async def _raise_for_status(self, response: aiohttp.ClientResponse, action: str):
+        """
+        Raise the error matching an unsuccessful response.
+        """
+        status = response.status
+        error_message = await response.text()
+        self.logger.error(
+            f"Failed to {action}. Status: {status}, Error: {error_message}"
+        )
+        message = f"Failed to {action}: {error_message}"
+        if status in THROTTLE_STATUSES:
+            raise RateLimitError(
+                message,
+                status,
+                error_message,
+                retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            )
+        if status in RETRYABLE_STATUSES:
+            raise ServerError(message, status, error_message)
+        raise NetsapiensAPIError(message, status, error_message)
+
+    async def stream_request(
+        self,
+        method: str,
+        url: str,
+        group: str,
+        action: str,
+        ok_statuses=(200,),
+        params: Optional[dict] = None,
+        chunk_size: int = 65536,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Send an authenticated request and yield the elements of a JSON array response
+        as they are decoded from the socket.
+
+        Peak memory depends on the largest element instead of the whole response, and the
+        first elements are available before the download finishes. A response that is
+        not an array is yielded as a single element. The request is retried like
+        request() until the first element has been yielded; after that, errors are
+        raised to the caller.
+
+        The endpoint group's concurrency slot is only held until the response headers
+        arrive. After that it is released, so a consumer that iterates slowly does not
+        block other requests in the group.
+
+        :param method: HTTP method.
+        :param url: Full request URL.
+        :param group: Endpoint group used for rate limiting.
+        :param action: Short description of the operation used in error messages.
+        :param ok_statuses: HTTP statuses that indicate success.
+        :param params: Optional query parameters.
+        :param chunk_size: Maximum number of bytes read from the socket at a time.
+        :param deadline: Total time budget in seconds for the whole stream, including
+                         retries, limiter waits and the time the consumer takes between
+                         elements. Defaults to the retry policy's deadline.
+        :return: An async iterator of decoded elements.
+        """
+        policy = self.retry_policy
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if deadline is None:
+            deadline = policy.deadline
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            try:
+                async for element in self._stream_once(
+                    method,
+                    url,
+                    group,
+                    action,
+                    ok_statuses,
+                    params,
+                    chunk_size,
+                    attempt,
+                    deadline_at,
+                ):
+                    started = True
+                    yield element
+                return
+            except RetryableError as e:
+                if deadline_at is not None and time.monotonic() >= deadline_at:
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded while trying to {action}."
+                    ) from e
+                if started or not policy.should_retry(e, attempt, idempotent):
+                    raise
+                delay = policy.backoff(attempt, getattr(e, "retry_after", None))
+                if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                    raise
+                if self.instrumentation.hooks:
+                    self.instrumentation.retry(
+                        RequestEvent(method, url, group, action, attempt, True), delay
+                    )
+                self.logger.warning(
+                    f"Attempt {attempt} to {action} failed ({e}). "
+                    f"Retrying in {delay:.2f}s."
+                )
+                await asyncio.sleep(delay)
+
+    async def _stream_once(
+        self,
+        method: str,
+        url: str,
+        group: str,
+        action: str,
+        ok_statuses,
+        params: Optional[dict],
+        chunk_size: int,
+        attempt: int = 1,
+        deadline_at: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        token_data = await self.check_token_expiry()
+        headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+        kwargs = {"params": params, "headers": headers}
+
+        event = None
+        if self.instrumentation.hooks:
+            event = RequestEvent(method, url, group, action, attempt, streamed=True)
+            kwargs["trace_request_ctx"] = event
+
+        limiter = self.rate_limiter.group(group)
+        budget = None
+        if deadline_at is not None:
+            budget = deadline_at - time.monotonic()
+            if budget <= 0:
+                raise DeadlineExceededError(
+                    f"Deadline exceeded while trying to {action}."
+                )
+        try:
+            waited = await limiter.acquire(budget)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceededError(
+                f"Deadline exceeded while trying to {action}."
+            ) from e
+        if budget is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=max(budget - waited, 0.001))
+        held = True
+        if event is not None:
+            event.limiter_wait = waited
+            self.instrumentation.request_start(event)
+        try:
+            session = self.get_session()
+            async with session.request(method, url, **kwargs) as response:
+                limiter.observe(response.status, response.headers.get("Retry-After"))
+                # The slot bounds requests being started, not how long the consumer
+                # takes to iterate, so it is released once the headers are in
+                limiter.release()
+                held = False
+                if event is not None:
+                    self._record_response(event, response)
+                    event.bytes_received = 0
+                if response.status not in ok_statuses:
+                    await self._raise_for_status(response, action)
+
+                decoder = JSONArrayDecoder(self.codec.loads)
+                try:
+                    while True:
+                        chunk = await response.content.read(chunk_size)
+                        if not chunk:
+                            break
+                        if event is not None:
+                            event.bytes_received += len(chunk)
+                        for element in decoder.feed(chunk):
+                            yield element
+                    for element in decoder.close():
+                        yield element
+                except ValueError as e:
+                    raise NetsapiensAPIError(
+                        f"Failed to {action}: invalid JSON in response ({e})",
+                        response.status,
+                    ) from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if deadline_at is not None and time.monotonic() >= deadline_at:
+                raise DeadlineExceededError(
+                    f"Deadline exceeded while trying to {action}."
+                ) from e
+            self.logger.error(f"Network error while trying to {action}: {e}")
+            raise NetworkError(
+                f"Network error occurred while trying to {action}."
+            ) from e
+        finally:
+            if held:
+                limiter.release()
+            if event is not None:
+                error = sys.exc_info()[1]
+                # The consumer stopping early is not a failed request
+                if isinstance(error, GeneratorExit):
+                    error = None
+                self.instrumentation.request_end(event, error)
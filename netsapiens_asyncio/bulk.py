@@ -0,0 +1,214 @@
+import logging
+import random
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional, Union
+from .concurrency import TaskOutcome, aiterate, run_bounded
+from .log import get_logger
+from .messages import MessageAPI
+
+
+class BulkStats:
+    def __init__(self, sample_size: int = 10000):
+        """
+        Aggregate throughput and latency statistics for a bulk send.
+
+        Latency percentiles are computed from a fixed-size reservoir sample, so memory
+        use does not grow with the number of jobs.
+
+        :param sample_size: Maximum number of latency samples kept for percentiles.
+        """
+        self.sample_size = sample_size
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._samples = []
+
+    def record(self, outcome: TaskOutcome):
+        """
+        Record the outcome of a single job.
+
+        :param outcome: The completed job outcome.
+        """
+        if outcome.ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.total_latency += outcome.latency
+        self.max_latency = max(self.max_latency, outcome.latency)
+
+        completed = self.completed
+        if len(self._samples) < self.sample_size:
+            self._samples.append(outcome.latency)
+        else:
+            slot = random.randrange(completed)
+            if slot < self.sample_size:
+                self._samples[slot] = outcome.latency
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """
+        Completed jobs per second.
+        """
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.completed if self.completed else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """
+        Return the approximate latency at the given percentile.
+
+        :param percentile: Percentile between 0 and 100.
+        :return: Latency in seconds.
+        """
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        position = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[position]
+
+    def as_dict(self) -> dict:
+        """
+        Return a snapshot of the statistics as a dictionary.
+        """
+        return {
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed": self.elapsed,
+            "throughput": self.throughput,
+            "latency_mean": self.mean_latency,
+            "latency_p50": self.latency_percentile(50),
+            "latency_p90": self.latency_percentile(90),
+            "latency_p99": self.latency_percentile(99),
+            "latency_max": self.max_latency,
+        }
+
+
+class BulkMessageSender:
+    def __init__(
+        self,
+        message_api: MessageAPI,
+        concurrency: int = 20,
+        rate: Optional[float] = None,
+        timeout: Optional[float] = None,
+        log_level=logging.INFO,
+    ):
+        """
+        Fan out many messages through MessageAPI.send_message.
+
+        :param message_api: Instance of MessageAPI used to send each message.
+        :param concurrency: Maximum number of messages in flight at once.
+        :param rate: Optional maximum number of messages started per second.
+        :param timeout: Optional timeout in seconds for each message.
+        :param log_level: Logging level (default is INFO).
+        """
+        self.message_api = message_api
+        self.concurrency = concurrency
+        self.rate = rate
+        self.timeout = timeout
+        self.stats = BulkStats()
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("BulkMessageSender initialized")
+
+    async def send(
+        self, jobs: Union[Iterable, AsyncIterable]
+    ) -> AsyncIterator[TaskOutcome]:
+        """
+        Send a stream of messages and yield each outcome as it completes.
+
+        Each job is either a tuple of (destination, message, from_number, media) where
+        media is optional, or a dictionary with those keys. Media, when given, is a
+        dictionary with "data", "mime_type" and "size" as accepted by send_message, or
+        any `media` accepted by send_message (a PreparedMedia is encoded only once for
+        all jobs), and switches the message type to "mms". A dictionary job may also set
+        "message_type" and "messagesession" explicitly.
+
+        Jobs are consumed lazily, so the input can be a generator or async generator
+        of any length. Failures are reported in the outcome's `error` attribute and do
+        not stop the run. Aggregate statistics are available in `self.stats`.
+
+        :param jobs: An iterable or async iterable of jobs.
+        :return: An async iterator of TaskOutcome objects in completion order.
+        """
+        self.stats = stats = BulkStats()
+        stats.started_at = time.monotonic()
+        self.logger.info(
+            f"Starting bulk send (concurrency={self.concurrency}, rate={self.rate})"
+        )
+
+        async def counted(source):
+            async for job in source:
+                stats.submitted += 1
+                yield job
+
+        try:
+            async for outcome in run_bounded(
+                counted(aiterate(jobs)),
+                self._send_one,
+                concurrency=self.concurrency,
+                rate=self.rate,
+                timeout=self.timeout,
+            ):
+                stats.record(outcome)
+                if not outcome.ok:
+                    self.logger.debug(
+                        "Bulk job %s failed: %s", outcome.index, outcome.error
+                    )
+                yield outcome
+        finally:
+            stats.finished_at = time.monotonic()
+            self.logger.info(
+                f"Bulk send finished: {stats.succeeded} sent, {stats.failed} failed, "
+                f"{stats.throughput:.1f} msg/s"
+            )
+
+    async def _send_one(self, job: Union[tuple, dict]):
+        if isinstance(job, dict):
+            fields = dict(job)
+        else:
+            fields = dict(zip(("destination", "message", "from_number", "media"), job))
+
+        media = fields.pop("media", None)
+        message_type = fields.pop("message_type", None) or ("mms" if media else "sms")
+        if media is not None and not isinstance(media, dict):
+            return await self.message_api.send_message(
+                message_type=message_type,
+                message=fields["message"],
+                destination=fields["destination"],
+                from_number=fields["from_number"],
+                messagesession=fields.get("messagesession"),
+                mime_type=fields.get("mime_type"),
+                media=media,
+            )
+        media = media or {}
+        return await self.message_api.send_message(
+            message_type=message_type,
+            message=fields["message"],
+            destination=fields["destination"],
+            from_number=fields["from_number"],
+            messagesession=fields.get("messagesession"),
+            data=media.get("data"),
+            mime_type=media.get("mime_type"),
+            size=media.get("size"),
+        )
@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+CacheKey = Tuple[str, tuple]
+
+_MISSING = object()
+
+
+def make_key(url: str, params: Optional[dict] = None) -> CacheKey:
+    """
+    Build a cache key from a request URL and its query parameters.
+    """
+    return url, tuple(sorted((params or {}).items()))
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = 30, max_entries: int = 1024):
+        """
+        In-memory read-through cache for decoded GET responses.
+
+        Entries expire `ttl` seconds after they were stored. When the cache is full the
+        least recently used entry is evicted. Cached values are returned as-is to every
+        caller, so they must not be modified.
+
+        :param ttl: Seconds an entry stays valid.
+        :param max_entries: Maximum number of cached responses.
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be positive.")
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        # Bumped by every invalidation so that responses fetched before a write are
+        # not stored after it
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        """
+        Counter that changes on every invalidation. Pass the value read before a fetch
+        to set() so that a result fetched across a write is discarded.
+        """
+        return self._generation
+
+    def get(self, key: CacheKey, default: Any = None) -> Any:
+        """
+        Return the cached value for `key`, or `default` if it is missing or expired.
+        """
+        entry = self._entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: CacheKey, value: Any, generation: Optional[int] = None):
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+
+        :param key: The cache key, see make_key().
+        :param value: The decoded response.
+        :param generation: Optional value of `generation` read before the response was
+                           fetched. The value is not stored if an invalidation happened
+                           since.
+        """
+        if generation is not None and generation != self._generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, url_prefix: str = "", contains: Optional[str] = None) -> int:
+        """
+        Remove the entries whose URL starts with `url_prefix` and, if given, contains
+        `contains`. With no arguments the whole cache is cleared.
+
+        :return: The number of entries removed.
+        """
+        self._generation += 1
+        self.invalidations += 1
+        stale = [
+            key
+            for key in self._entries
+            if key[0].startswith(url_prefix)
+            and (contains is None or contains in key[0])
+        ]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+        """
+        self.invalidate()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> dict:
+        """
+        Return the hit/miss counters, the hit ratio and the current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+        }
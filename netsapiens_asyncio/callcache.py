@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from .calls import CallsAPI
+from .concurrency import run_bounded
+from .log import get_logger
+from .webhook import WebhookEvent, WebhookServer
+
+# Field names tried, in order, to identify a call and its legs. The v2 REST API and
+# the event feeds do not use the same names, so both spellings are accepted.
+CALL_ID_FIELDS = ("call-orig-call-id", "orig_callid", "call-id", "callid", "id")
+ORIG_DOMAIN_FIELDS = ("call-orig-domain", "orig_domain", "domain")
+ORIG_USER_FIELDS = ("call-orig-user", "orig_user", "user")
+TERM_DOMAIN_FIELDS = ("call-term-domain", "term_domain")
+TERM_USER_FIELDS = ("call-term-user", "term_user")
+REMOVE_VALUES = {"yes", "true", "1", True, 1}
+
+
+def _first(record: dict, fields: Tuple[str, ...]) -> Optional[str]:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+class ActiveCallStore:
+    def __init__(
+        self,
+        calls_api: Optional[CallsAPI] = None,
+        reconcile_domains: Optional[Iterable[str]] = None,
+        log_level=logging.INFO,
+    ):
+        """
+        In-memory index of active calls kept current from call subscription events.
+
+        Calls are indexed by call ID, by domain and by (domain, user) for both legs, so
+        the queries read_calls() supports are answered locally without API traffic. A
+        periodic reconciliation against CallsAPI.read_calls repairs missed events.
+
+        :param calls_api: Optional CallsAPI used for reconciliation.
+        :param reconcile_domains: Domains to reconcile, one query each. Defaults to
+                                  ["*"], a single query covering every domain, so
+                                  domains with no calls in the store are repaired too.
+        :param log_level: Logging level (default is INFO).
+        """
+        self.calls_api = calls_api
+        self.reconcile_domains = (
+            list(reconcile_domains) if reconcile_domains is not None else None
+        )
+
+        self._calls: Dict[str, dict] = {}
+        self._index_keys: Dict[str, List[tuple]] = {}
+        self._updated_at: Dict[str, float] = {}
+        # Start times of the reconciliations in flight
+        self._reconciling: List[float] = []
+        self._by_domain: Dict[str, Set[str]] = {}
+        self._by_user: Dict[Tuple[str, str], Set[str]] = {}
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+        self.events_applied = 0
+        self.reconciliations = 0
+        self.repaired = 0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("ActiveCallStore initialized")
+
+    def __len__(self):
+        return len(self._calls)
+
+    def attach(self, server: WebhookServer):
+        """
+        Feed the store from the "call" and "call_origid" deliveries of a webhook server.
+
+        :param server: The WebhookServer receiving the subscription posts.
+        """
+        server.add_handler("call", self.handle_event)
+        server.add_handler("call_origid", self.handle_event)
+
+    async def handle_event(self, event: WebhookEvent):
+        """
+        Webhook handler that applies a call event.
+
+        :param event: The delivered event.
+        """
+        self.apply(event.payload)
+
+    def apply(self, record: dict):
+        """
+        Insert, update or remove a call from an event or API record.
+
+        :param record: The call record. A record with "remove" set to "yes" removes the call.
+        """
+        call_id = _first(record, CALL_ID_FIELDS)
+        if call_id is None:
+            self.logger.debug("Ignoring call event without a call ID")
+            return
+        self.events_applied += 1
+        if str(record.get("remove", "")).lower() in REMOVE_VALUES:
+            self._remove(call_id)
+        else:
+            self._upsert(call_id, record)
+
+    def read_calls(
+        self,
+        domain: str,
+        count: bool = False,
+        user: Optional[str] = None,
+        callid: Optional[str] = None,
+    ) -> Union[dict, list, None]:
+        """
+        Answer the same queries as CallsAPI.read_calls from the local index.
+
+        :param domain: The domain to query, or "*" for all domains.
+        :param count: If True, return {"total": n} instead of the calls.
+        :param user: Optional. The user for whom to return active calls.
+        :param callid: Optional. The specific call ID to return (requires user).
+        :return: A list of calls, a single call (None if unknown) or a count.
+        """
+        if count and (user or callid):
+            raise ValueError("'count' cannot be used with 'user' or 'callid'.")
+        if callid and not user:
+            raise ValueError("'callid' requires 'user' to be set.")
+
+        if callid:
+            return self._calls.get(callid)
+        if user:
+            ids = self._by_user.get((domain, user), ())
+        elif domain == "*":
+            ids = self._calls.keys()
+        else:
+            ids = self._by_domain.get(domain, ())
+        if count:
+            return {"total": len(ids)}
+        return [self._calls[call_id] for call_id in ids]
+
+    def count(self, domain: str, user: Optional[str] = None) -> int:
+        """
+        Return the number of active calls for a domain or user.
+
+        :param domain: The domain, or "*" for all domains.
+        :param user: Optional user within the domain.
+        """
+        if user:
+            return len(self._by_user.get((domain, user), ()))
+        if domain == "*":
+            return len(self._calls)
+        return len(self._by_domain.get(domain, ()))
+
+    def domains(self) -> List[str]:
+        """
+        Return the domains that currently have active calls.
+        """
+        return list(self._by_domain)
+
+    async def reconcile(self, domain: str = "*"):
+        """
+        Replace the calls of a domain with the result of CallsAPI.read_calls.
+
+        Calls updated by events while the query was in flight are left untouched.
+
+        :param domain: The domain to reconcile, or "*" for all domains.
+        """
+        if self.calls_api is None:
+            raise ValueError("A CallsAPI instance is required to reconcile.")
+        started = time.monotonic()
+        self._reconciling.append(started)
+        try:
+            records = await self.calls_api.read_calls(domain)
+            self._merge(domain, records, started)
+        finally:
+            self._reconciling.remove(started)
+            # Removal markers only matter to reconciliations still in flight
+            self._prune_removed(min(self._reconciling, default=float("inf")))
+
+    def _merge(self, domain: str, records, started: float):
+        # An empty response body decodes to None
+        if records is None:
+            records = []
+        elif isinstance(records, dict):
+            records = [records]
+
+        seen = set()
+        for record in records:
+            call_id = _first(record, CALL_ID_FIELDS)
+            if call_id is None:
+                continue
+            seen.add(call_id)
+            if self._updated_at.get(call_id, 0) < started:
+                if call_id not in self._calls:
+                    self.repaired += 1
+                self._upsert(call_id, record)
+
+        current = (
+            self._calls.keys() if domain == "*" else self._by_domain.get(domain, ())
+        )
+        stale = [
+            call_id
+            for call_id in current
+            if call_id not in seen and self._updated_at.get(call_id, 0) < started
+        ]
+        for call_id in stale:
+            self._remove(call_id)
+        self.repaired += len(stale)
+        self.reconciliations += 1
+
+    def start_reconciler(self, interval: float = 60, concurrency: int = 10):
+        """
+        Start a background task that reconciles the store every `interval` seconds.
+
+        :param interval: Seconds between reconciliation passes.
+        :param concurrency: Maximum number of domains reconciled at once.
+        """
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.ensure_future(
+                self._reconcile_loop(interval, concurrency)
+            )
+
+    async def stop_reconciler(self):
+        """
+        Stop the background reconciliation task.
+        """
+        task, self._reconcile_task = self._reconcile_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _reconcile_loop(self, interval: float, concurrency: int):
+        while True:
+            await asyncio.sleep(interval)
+            domains = self.reconcile_domains or ["*"]
+            async for outcome in run_bounded(domains, self.reconcile, concurrency):
+                if not outcome.ok:
+                    self.logger.warning(
+                        f"Failed to reconcile calls for {outcome.item}: {outcome.error}"
+                    )
+
+    def _upsert(self, call_id: str, record: dict):
+        if call_id in self._calls:
+            self._unindex(call_id)
+        keys = []
+        for domain_fields, user_fields in (
+            (ORIG_DOMAIN_FIELDS, ORIG_USER_FIELDS),
+            (TERM_DOMAIN_FIELDS, TERM_USER_FIELDS),
+        ):
+            domain = _first(record, domain_fields)
+            if domain is None:
+                continue
+            self._by_domain.setdefault(domain, set()).add(call_id)
+            keys.append(("domain", domain))
+            user = _first(record, user_fields)
+            if user is not None:
+                self._by_user.setdefault((domain, user), set()).add(call_id)
+                keys.append(("user", (domain, user)))
+        self._calls[call_id] = record
+        self._index_keys[call_id] = keys
+        self._updated_at[call_id] = time.monotonic()
+
+    def _remove(self, call_id: str):
+        if call_id in self._calls:
+            self._unindex(call_id)
+            del self._calls[call_id]
+            del self._index_keys[call_id]
+        if self._reconciling:
+            # Remember the removal so a reconciliation in flight does not resurrect it
+            self._updated_at[call_id] = time.monotonic()
+        else:
+            self._updated_at.pop(call_id, None)
+
+    def _prune_removed(self, before: float):
+        for call_id in [
+            call_id
+            for call_id, updated_at in self._updated_at.items()
+            if updated_at < before and call_id not in self._calls
+        ]:
+            del self._updated_at[call_id]
+
+    def _unindex(self, call_id: str):
+        for kind, key in self._index_keys.get(call_id, ()):
+            index = self._by_domain if kind == "domain" else self._by_user
+            members = index.get(key)
+            if members is not None:
+                members.discard(call_id)
+                if not members:
+                    del index[key]
@@ -1,10 +1,22 @@
 import random
 import string
+import time
 from datetime import datetime, timezone
-import aiohttp
 import logging
-from typing import Optional, Union
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional, Union
 from .auth import NetsapiensAPI
+from .concurrency import TaskOutcome, run_bounded
+from .log import SAMPLED, get_logger, summarize
+from .models import CallRecord
+
+
+def make_call_id() -> str:
+    """
+    Generate a unique call ID for new_call, e.g. "nsaio20241209212711rAb3dE9".
+    """
+    utc_timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    random_suffix = "".join(random.choices(string.ascii_letters + string.digits, k=6))
+    return f"nsaio{utc_timestamp}r{random_suffix}"
 
 
 class CallsAPI:
@@ -22,17 +34,7 @@ class CallsAPI:
         self.user = "~"
 
         # Create a dedicated logger for this class
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(log_level)
-
-        # Add a handler if the logger has no handlers (to avoid duplicate logs)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
+        self.logger = get_logger(self.__class__.__name__, log_level)
 
         self.logger.debug("CallsAPI initialized with auth client")
 
@@ -42,7 +44,10 @@ class CallsAPI:
         count: bool = False,
         user: Optional[str] = None,
         callid: Optional[str] = None,
-    ) -> Union[dict, list]:
+        deadline: Optional[float] = None,
+        typed: bool = False,
+        raw: bool = False,
+    ) -> Union[dict, list, bytes]:
         """
         Retrieve active calls in the domain, for a specific user, or for a specific call ID.
         Optionally, retrieve the count of active calls.
@@ -51,8 +56,158 @@ class CallsAPI:
         :param count: If True, retrieve the count of active calls instead of detailed information.
         :param user: Optional. The user for whom to retrieve active calls. Defaults to None.
         :param callid: Optional. The specific call ID to retrieve. Defaults to None.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
+        :param typed: If True, return CallRecord objects instead of dictionaries.
+        :param raw: If True, return the undecoded JSON response body as bytes.
         :return: A dictionary or list of active calls based on the query.
         """
+        url = await self._calls_url(domain, count, user, callid)
+        self.logger.debug("Retrieving calls from URL: %s", url)
+
+        # Make GET request
+        result = await self.auth_client.request(
+            "GET",
+            url,
+            group="calls",
+            action="retrieve calls",
+            deadline=deadline,
+            raw=raw,
+        )
+        self.logger.info(
+            "Calls retrieved successfully: %s", summarize(result), extra=SAMPLED
+        )
+        if typed and not count and not raw:
+            return CallRecord.decode(result)
+        return result
+
+    async def stream_calls(
+        self,
+        domain: str,
+        user: Optional[str] = None,
+        typed: bool = False,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Stream active calls in the domain, or for a specific user, one call at a time.
+
+        The response is decoded incrementally as it arrives, so large call lists (e.g.
+        domain="*" on a busy system) never have to fit in memory at once.
+
+        :param domain: The domain to query.
+        :param user: Optional. The user for whom to retrieve active calls. Defaults to None.
+        :param typed: If True, yield CallRecord objects instead of dictionaries.
+        :param deadline: Optional. Total time budget in seconds for the whole stream.
+        :return: An async iterator of call dictionaries.
+        """
+        url = await self._calls_url(domain, False, user, None)
+        self.logger.debug("Streaming calls from URL: %s", url)
+
+        async for call in self.auth_client.stream_request(
+            "GET", url, group="calls", action="retrieve calls", deadline=deadline
+        ):
+            yield CallRecord(call) if typed else call
+
+    async def read_calls_many(
+        self,
+        domains: Union[Iterable[str], AsyncIterable[str]],
+        count: bool = False,
+        concurrency: int = 50,
+        timeout: Optional[float] = 10,
+        typed: bool = False,
+    ) -> AsyncIterator[TaskOutcome]:
+        """
+        Query active calls, or call counts, for many domains concurrently.
+
+        Outcomes are yielded as each domain completes, not in input order. A failed or
+        timed out domain yields an outcome with `error` set instead of stopping the sweep.
+
+        :param domains: The domains to query. May be a generator or async iterable.
+        :param count: If True, retrieve the count of active calls for each domain.
+        :param concurrency: Maximum number of domains queried at the same time.
+        :param timeout: Optional per-domain time budget in seconds, including retries.
+        :param typed: If True, results contain CallRecord objects instead of dictionaries.
+        :return: An async iterator of TaskOutcome objects whose `item` is the domain and
+                 whose `result` is what read_calls() returned for it.
+        """
+
+        async def read_domain(domain: str):
+            return await self.read_calls(
+                domain, count=count, deadline=timeout, typed=typed
+            )
+
+        async for outcome in run_bounded(
+            domains, read_domain, concurrency, None, timeout
+        ):
+            yield outcome
+
+    async def read_calls_snapshot(
+        self,
+        domains: Union[Iterable[str], AsyncIterable[str]],
+        count: bool = False,
+        concurrency: int = 50,
+        timeout: Optional[float] = 10,
+        typed: bool = False,
+    ) -> dict:
+        """
+        Query many domains concurrently and merge the results into one snapshot.
+
+        :param domains: The domains to query.
+        :param count: If True, retrieve call counts instead of the calls.
+        :param concurrency: Maximum number of domains queried at the same time.
+        :param timeout: Optional per-domain time budget in seconds, including retries.
+        :param typed: If True, calls are CallRecord objects instead of dictionaries.
+        :return: A dictionary with
+                 "results": {domain: result of read_calls()} for the domains that succeeded,
+                 "errors": {domain: exception} for the domains that failed,
+                 "calls": all calls merged into one list (omitted when count is True),
+                 "total": the number of calls across the successful domains,
+                 "complete": True if every domain succeeded,
+                 "elapsed": seconds the sweep took.
+        """
+        started = time.monotonic()
+        results = {}
+        errors = {}
+        calls = []
+        total = 0
+        async for outcome in self.read_calls_many(
+            domains, count, concurrency, timeout, typed
+        ):
+            if not outcome.ok:
+                errors[outcome.item] = outcome.error
+                continue
+            result = outcome.result
+            results[outcome.item] = result
+            if count:
+                total += int(result.get("total", 0)) if isinstance(result, dict) else 0
+            elif isinstance(result, list):
+                calls.extend(result)
+            elif result:
+                calls.append(result)
+
+        if errors:
+            self.logger.warning(
+                f"Failed to retrieve calls for {len(errors)} of "
+                f"{len(errors) + len(results)} domains"
+            )
+        snapshot = {"results": results, "errors": errors}
+        if not count:
+            snapshot["calls"] = calls
+            total = len(calls)
+        snapshot["total"] = total
+        snapshot["complete"] = not errors
+        snapshot["elapsed"] = time.monotonic() - started
+        return snapshot
+
+    async def _calls_url(
+        self,
+        domain: str,
+        count: bool,
+        user: Optional[str],
+        callid: Optional[str],
+    ) -> str:
+        """
+        Validate a calls query and build its URL.
+        """
         # Validate parameter combinations
         if count and (user or callid):
             self.logger.error(
@@ -74,39 +229,14 @@ class CallsAPI:
 
         # Add optional path segments based on parameters
         if user:
-            url += f"/users/{user}"
+            url += f"/users/{user}/calls"
             if callid:
-                url += f"/calls/{callid}"
+                url += f"/{callid}"
         elif count:
             url += "/calls/count"
         else:
             url += "/calls"
-
-        self.logger.debug(f"Retrieving calls from URL: {url}")
-
-        # Make GET request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            try:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        self.logger.info(f"Calls retrieved successfully: {result}")
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to retrieve calls. Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(f"Failed to retrieve calls: {error_message}")
-            except aiohttp.ClientError as e:
-                self.logger.error(f"Network error while retrieving calls: {e}")
-                raise Exception("Network error occurred while retrieving calls.") from e
-            except Exception as e:
-                self.logger.error(f"Unexpected error while retrieving calls: {e}")
-                raise Exception(
-                    "An unexpected error occurred while retrieving calls."
-                ) from e
+        return url
 
     async def new_call(
         self,
@@ -120,6 +250,7 @@ class CallsAPI:
         auto_answer_enabled: Optional[str] = "no",
         caller_id_number: Optional[str] = None,
         callback_caller_id_number: Optional[str] = None,
+        deadline: Optional[float] = None,
     ) -> dict:
         """
         Make a new call via the API.
@@ -134,6 +265,7 @@ class CallsAPI:
         :param auto_answer_enabled: Optional. Whether auto-answer is enabled. Defaults to "no".
         :param caller_id_number: Optional. The caller ID for the termination leg.
         :param callback_caller_id_number: Optional. The caller ID for the origination leg callback.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
         :return: A dictionary containing the response from the API.
         """
         # Validate synchronous parameter
@@ -143,12 +275,8 @@ class CallsAPI:
 
         # Generate call_id if not provided
         if not call_id:
-            utc_timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
-            random_suffix = "".join(
-                random.choices(string.ascii_letters + string.digits, k=6)
-            )
-            call_id = f"nsaio{utc_timestamp}r{random_suffix}"
-            self.logger.debug(f"Generated call_id: {call_id}")
+            call_id = make_call_id()
+            self.logger.debug("Generated call_id: %s", call_id)
 
         # Validate required parameters
         if not call_term_user:
@@ -176,28 +304,21 @@ class CallsAPI:
         if callback_caller_id_number:
             payload["callback-caller-id-number"] = callback_caller_id_number
 
-        self.logger.debug(f"Making new call with payload: {payload}")
-
-        # Make the POST request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            try:
-                async with session.post(url, json=payload, headers=headers) as response:
-                    if response.status in {200, 202}:
-                        result = await response.json()
-                        self.logger.info(f"Call created successfully: {result}")
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to create call. Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(f"Failed to create call: {error_message}")
-            except aiohttp.ClientError as e:
-                self.logger.error(f"Network error while creating call: {e}")
-                raise Exception("Network error occurred while creating call.") from e
-            except Exception as e:
-                self.logger.error(f"Unexpected error while creating call: {e}")
-                raise Exception(
-                    "An unexpected error occurred while creating call."
-                ) from e
+        self.logger.debug("Making new call with payload: %s", summarize(payload))
+
+        # Make the POST request. The client-supplied call-id makes the request safe
+        # to retry: a repeated request refers to the same call.
+        result = await self.auth_client.request(
+            "POST",
+            url,
+            group="calls",
+            action="create call",
+            ok_statuses=(200, 202),
+            json=payload,
+            idempotent=True,
+            deadline=deadline,
+        )
+        self.logger.info(
+            "Call created successfully: %s", summarize(result), extra=SAMPLED
+        )
+        return result
@@ -0,0 +1,560 @@
+import csv
+import logging
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, TextIO, Tuple
+from .log import get_logger
+from .models import parse_datetime
+from .webhook import WebhookEvent, WebhookServer
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+# Field names tried, in order, for each value the aggregator needs. The REST API and
+# the event feeds do not use the same names; pass field_map to CDRAggregator to add
+# or replace candidates.
+CDR_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "domain": ("domain", "cdr-domain", "call-orig-domain", "orig_domain", "by_domain"),
+    "user": ("user", "cdr-user", "call-orig-user", "orig_user", "by_user"),
+    "start": (
+        "call-start-datetime",
+        "time-start",
+        "time_start",
+        "cdr-start-datetime",
+        "start",
+    ),
+    "talk": (
+        "call-talking-duration-seconds",
+        "time-talking",
+        "time_talking",
+        "talk-duration",
+        "duration-talking",
+    ),
+    "duration": ("call-total-duration-seconds", "duration", "time-duration"),
+}
+# Dimensions aggregates can be grouped by
+DIMENSIONS = ("domain", "user")
+# Number of rolling spans whose running totals are kept at once
+MAX_ROLLING_SPANS = 16
+
+
+def _first(record: dict, names: Tuple[str, ...]) -> Any:
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _seconds(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    """
+    Convert an epoch number or an API timestamp string to epoch seconds.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = parse_datetime(value)
+    return parsed.timestamp() if hasattr(parsed, "timestamp") else None
+
+
+class Dictionary:
+    def __init__(self):
+        """
+        Dictionary encoding for a string column: each distinct value is stored once and
+        rows hold its integer code.
+        """
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class CDRBatch:
+    __slots__ = ("start", "talk", "duration", "answered", "domain", "user")
+
+    def __init__(self):
+        """
+        Columnar buffer of CDRs. Each column is a typed array, so a record costs about
+        40 bytes instead of a dict, and the columns can be handed to numpy without
+        copying. Domain and user are stored as dictionary codes.
+        """
+        self.start = array("d")
+        self.talk = array("d")
+        self.duration = array("d")
+        self.answered = array("B")
+        self.domain = array("q")
+        self.user = array("q")
+
+    def __len__(self):
+        return len(self.start)
+
+
+class _RollingTotals:
+    __slots__ = ("windows", "end", "groups")
+
+    def __init__(self, windows: int):
+        """
+        Running totals per (domain code, user code) over the `windows` buckets before
+        bucket `end`.
+        """
+        self.windows = windows
+        self.end: Optional[int] = None
+        self.groups: Dict[Tuple[int, int], List[float]] = {}
+
+    def covers(self, bucket: int) -> bool:
+        return self.end is not None and self.end - self.windows <= bucket < self.end
+
+    def add(self, key: Tuple[int, int, int], values: Sequence[float], sign: int = 1):
+        group = key[:2]
+        totals = self.groups.get(group)
+        if totals is None:
+            self.groups[group] = [value * sign for value in values]
+            return
+        for i, value in enumerate(values):
+            totals[i] += value * sign
+        # Calls are whole numbers, so a group with none left is exactly empty
+        if totals[0] <= 0:
+            del self.groups[group]
+
+
+class CDRAggregator:
+    def __init__(
+        self,
+        window: float = 3600,
+        by: Sequence[str] = ("domain", "user"),
+        retention: Optional[float] = None,
+        batch_size: int = 65536,
+        field_map: Optional[Dict[str, Tuple[str, ...]]] = None,
+        use_numpy: Optional[bool] = None,
+        log_level=logging.INFO,
+    ):
+        """
+        Aggregate CDRs into per-window call counts, answer-seizure ratio (ASR), average
+        call duration (ACD) and minutes.
+
+        Records are appended to a columnar CDRBatch. When the batch is full (or on
+        flush()) it is grouped by the `by` dimensions and by time window in one
+        vectorized pass, with numpy when it is installed and a plain loop otherwise, and
+        merged into running per-window totals. Each CDR is therefore aggregated once, and
+        queries such as totals() only combine the small set of window totals, however
+        many CDRs have been seen. rolling() keeps running totals for each span it is
+        asked for and only adds and removes the windows entering and leaving it.
+
+        :param window: Width of a time bucket in seconds (3600 for hourly buckets).
+        :param by: Dimensions kept in the totals: "domain", "user" or both. Queries can
+                   roll up to fewer dimensions.
+        :param retention: Optional seconds of buckets to keep, counted back from the
+                          newest bucket. Older buckets are dropped.
+        :param batch_size: Number of records buffered before they are aggregated.
+        :param field_map: Optional overrides of CDR_FIELDS, e.g.
+                          {"talk": ("billsec",)}.
+        :param use_numpy: Force the numpy (True) or plain Python (False) group-by.
+                          Defaults to numpy when it is installed.
+        :param log_level: Logging level (default is INFO).
+        """
+        unknown = [dimension for dimension in by if dimension not in DIMENSIONS]
+        if unknown:
+            raise ValueError(
+                f"Invalid dimension(s) {', '.join(unknown)}. "
+                f"Must be among: {', '.join(DIMENSIONS)}"
+            )
+        if use_numpy and numpy is None:
+            raise ImportError("use_numpy=True requires numpy: pip install numpy")
+        self.window = window
+        self.by = tuple(by)
+        self.retention = retention
+        self.batch_size = batch_size
+        self.fields = dict(CDR_FIELDS)
+        self.fields.update(field_map or {})
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+
+        self.domains = Dictionary()
+        self.users = Dictionary()
+        self.batch = CDRBatch()
+        # (domain code, user code, bucket) -> [calls, answered, talk seconds, duration]
+        self._buckets: Dict[Tuple[int, int, int], List[float]] = {}
+        self._newest_bucket: Optional[int] = None
+        # bucket -> keys of _buckets in that bucket
+        self._bucket_keys: Dict[int, Set[Tuple[int, int, int]]] = {}
+        # number of windows -> running totals kept by rolling()
+        self._rolling: Dict[int, _RollingTotals] = {}
+
+        self.ingested = 0
+        self.skipped = 0
+        self.flush_time = 0.0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("CDRAggregator initialized")
+
+    def attach(self, server: WebhookServer):
+        """
+        Feed the aggregator from the "cdr" deliveries of a webhook server.
+        """
+        server.add_handler("cdr", self.handle_event)
+
+    async def handle_event(self, event: WebhookEvent):
+        self.add(event.payload)
+
+    def add(self, record: dict):
+        """
+        Append one CDR. Records without a start time are counted in `skipped`.
+        """
+        fields = self.fields
+        start = _timestamp(_first(record, fields["start"]))
+        if start is None:
+            self.skipped += 1
+            return
+        talk = _seconds(_first(record, fields["talk"]))
+        batch = self.batch
+        batch.start.append(start)
+        batch.talk.append(talk)
+        batch.duration.append(_seconds(_first(record, fields["duration"])))
+        batch.answered.append(1 if talk > 0 else 0)
+        if "domain" in self.by:
+            batch.domain.append(
+                self.domains.encode(str(_first(record, fields["domain"]) or ""))
+            )
+        else:
+            batch.domain.append(0)
+        if "user" in self.by:
+            batch.user.append(
+                self.users.encode(str(_first(record, fields["user"]) or ""))
+            )
+        else:
+            batch.user.append(0)
+        self.ingested += 1
+        if len(batch) >= self.batch_size:
+            self.flush()
+
+    def extend(self, records: Iterable[dict]):
+        """
+        Append many CDRs.
+        """
+        for record in records:
+            self.add(record)
+
+    def flush(self):
+        """
+        Aggregate the buffered records into the window totals and empty the buffer.
+        """
+        batch = self.batch
+        if not len(batch):
+            return
+        started = time.perf_counter()
+        if self.use_numpy:
+            groups = self._group_numpy(batch)
+        else:
+            groups = self._group_python(batch)
+
+        buckets = self._buckets
+        rolling = list(self._rolling.values())
+        newest = self._newest_bucket
+        for key, calls, answered, talk, duration in groups:
+            totals = buckets.get(key)
+            if totals is None:
+                buckets[key] = [calls, answered, talk, duration]
+                self._bucket_keys.setdefault(key[2], set()).add(key)
+            else:
+                totals[0] += calls
+                totals[1] += answered
+                totals[2] += talk
+                totals[3] += duration
+            for running in rolling:
+                if running.covers(key[2]):
+                    running.add(key, (calls, answered, talk, duration))
+            if newest is None or key[2] > newest:
+                newest = key[2]
+        self._newest_bucket = newest
+
+        self.batch = CDRBatch()
+        self._expire()
+        self.flush_time += time.perf_counter() - started
+
+    def _group_numpy(self, batch: CDRBatch) -> list:
+        domain = numpy.frombuffer(batch.domain, dtype=numpy.int64)
+        user = numpy.frombuffer(batch.user, dtype=numpy.int64)
+        bucket = numpy.floor_divide(
+            numpy.frombuffer(batch.start, dtype=numpy.float64), self.window
+        ).astype(numpy.int64)
+        # Pack (domain, user, bucket) into one integer so grouping is a 1-D unique
+        first = int(bucket.min())
+        span = int(bucket.max()) - first + 1
+        users = max(len(self.users), 1)
+        if max(len(self.domains), 1) * users * span >= 2**63:
+            # The packed key would overflow int64 and merge unrelated groups
+            return self._group_python(batch)
+        packed = (domain * users + user) * span + (bucket - first)
+        keys, inverse = numpy.unique(packed, return_inverse=True)
+        size = len(keys)
+        calls = numpy.bincount(inverse, minlength=size)
+        answered = numpy.bincount(
+            inverse,
+            weights=numpy.frombuffer(batch.answered, dtype=numpy.uint8),
+            minlength=size,
+        )
+        talk = numpy.bincount(
+            inverse,
+            weights=numpy.frombuffer(batch.talk, dtype=numpy.float64),
+            minlength=size,
+        )
+        duration = numpy.bincount(
+            inverse,
+            weights=numpy.frombuffer(batch.duration, dtype=numpy.float64),
+            minlength=size,
+        )
+        rest, buckets = numpy.divmod(keys, span)
+        domains, user_codes = numpy.divmod(rest, users)
+        return list(
+            zip(
+                zip(domains.tolist(), user_codes.tolist(), (buckets + first).tolist()),
+                calls.tolist(),
+                answered.tolist(),
+                talk.tolist(),
+                duration.tolist(),
+            )
+        )
+
+    def _group_python(self, batch: CDRBatch) -> list:
+        window = self.window
+        groups: Dict[Tuple[int, int, int], List[float]] = {}
+        for domain, user, start, answered, talk, duration in zip(
+            batch.domain,
+            batch.user,
+            batch.start,
+            batch.answered,
+            batch.talk,
+            batch.duration,
+        ):
+            key = (domain, user, int(start // window))
+            totals = groups.get(key)
+            if totals is None:
+                groups[key] = [1, answered, talk, duration]
+            else:
+                totals[0] += 1
+                totals[1] += answered
+                totals[2] += talk
+                totals[3] += duration
+        return [(key, *totals) for key, totals in groups.items()]
+
+    def _expire(self):
+        if self.retention is None or self._newest_bucket is None:
+            return
+        oldest = self._newest_bucket - int(self.retention // self.window)
+        for bucket in [bucket for bucket in self._bucket_keys if bucket < oldest]:
+            for key in self._bucket_keys.pop(bucket):
+                values = self._buckets.pop(key)
+                for running in self._rolling.values():
+                    if running.covers(bucket):
+                        running.add(key, values, -1)
+
+    def totals(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        by: Optional[Sequence[str]] = None,
+        per_window: bool = True,
+    ) -> List[dict]:
+        """
+        Return aggregates for the windows between `start` and `end`.
+
+        Buffered records are flushed first. Each row holds the group's dimensions,
+        "window_start" (epoch seconds, unless per_window is False), "calls", "answered",
+        "talk_seconds", "minutes", "asr" (answered / calls) and "acd" (average talk
+        seconds of answered calls).
+
+        :param start: Optional epoch seconds; windows starting before it are excluded.
+        :param end: Optional epoch seconds; windows starting at or after it are excluded.
+        :param by: Dimensions to group by, a subset of the aggregator's `by`. Defaults
+                   to all of them; () gives one total per window.
+        :param per_window: If False, add the windows together into one row per group.
+        """
+        self.flush()
+        by = self._check_by(by)
+        first = None if start is None else int(start // self.window)
+        last = None if end is None else -(-end // self.window)
+        keep_domain = "domain" in by
+        keep_user = "user" in by
+
+        groups: Dict[tuple, List[float]] = {}
+        for (domain, user, bucket), values in self._buckets.items():
+            if first is not None and bucket < first:
+                continue
+            if last is not None and bucket >= last:
+                continue
+            key = (
+                domain if keep_domain else None,
+                user if keep_user else None,
+                bucket if per_window else None,
+            )
+            totals = groups.get(key)
+            if totals is None:
+                groups[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    totals[i] += value
+        return self._rows(groups, by, per_window)
+
+    def rolling(
+        self,
+        span: float,
+        by: Optional[Sequence[str]] = None,
+        now: Optional[float] = None,
+    ) -> List[dict]:
+        """
+        Return one row per group covering the last `span` seconds, e.g. the last 15
+        minutes with 60-second windows.
+
+        :param span: Length of the rolling window in seconds, rounded up to whole windows.
+        :param by: Dimensions to group by, as in totals().
+        :param now: Epoch seconds the window ends at. Defaults to the newest data.
+        """
+        self.flush()
+        by = self._check_by(by)
+        if now is None:
+            if self._newest_bucket is None:
+                return []
+            end = self._newest_bucket + 1
+        else:
+            end = int(now // self.window) + 1
+        windows = max(1, int(-(-span // self.window)))
+
+        running = self._rolling.pop(windows, None)
+        if running is None:
+            running = _RollingTotals(windows)
+            if len(self._rolling) >= MAX_ROLLING_SPANS:
+                del self._rolling[next(iter(self._rolling))]
+        self._rolling[windows] = running
+        self._advance(running, end)
+
+        keep_domain = "domain" in by
+        keep_user = "user" in by
+        groups: Dict[tuple, List[float]] = {}
+        for (domain, user), values in running.groups.items():
+            key = (domain if keep_domain else None, user if keep_user else None, None)
+            totals = groups.get(key)
+            if totals is None:
+                groups[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    totals[i] += value
+        return self._rows(groups, by, per_window=False)
+
+    def _advance(self, running: _RollingTotals, end: int):
+        """
+        Move running totals to end at bucket `end`, adding the buckets that enter the
+        span and removing the ones that leave it.
+        """
+        windows = running.windows
+        if running.end == end:
+            return
+        if running.end is None or abs(end - running.end) >= windows:
+            running.groups = {}
+            entering, leaving = (end - windows, end), None
+        elif end > running.end:
+            entering = (running.end, end)
+            leaving = (running.end - windows, end - windows)
+        else:
+            entering = (end - windows, running.end - windows)
+            leaving = (end, running.end)
+        if leaving is not None:
+            for key in self._keys_between(*leaving):
+                running.add(key, self._buckets[key], -1)
+        for key in self._keys_between(*entering):
+            running.add(key, self._buckets[key])
+        running.end = end
+
+    def _keys_between(self, first: int, last: int) -> List[Tuple[int, int, int]]:
+        if last - first > len(self._bucket_keys):
+            buckets = [bucket for bucket in self._bucket_keys if first <= bucket < last]
+        else:
+            buckets = [
+                bucket for bucket in range(first, last) if bucket in self._bucket_keys
+            ]
+        return [key for bucket in buckets for key in self._bucket_keys[bucket]]
+
+    def _check_by(self, by: Optional[Sequence[str]]) -> tuple:
+        by = self.by if by is None else tuple(by)
+        missing = [dimension for dimension in by if dimension not in self.by]
+        if missing:
+            raise ValueError(
+                f"Cannot group by {', '.join(missing)}: not kept by this aggregator."
+            )
+        return by
+
+    def _rows(
+        self, groups: Dict[tuple, List[float]], by: tuple, per_window: bool
+    ) -> List[dict]:
+        rows = [self._row(key, totals) for key, totals in groups.items()]
+        rows.sort(key=lambda row: tuple(str(row.get(name, "")) for name in by))
+        if per_window:
+            rows.sort(key=lambda row: row["window_start"])
+        return rows
+
+    def _row(self, key: tuple, totals: List[float]) -> dict:
+        domain, user, bucket = key
+        calls, answered, talk, duration = totals
+        row = {}
+        if domain is not None:
+            row["domain"] = self.domains.values[domain] if self.domains else ""
+        if user is not None:
+            row["user"] = self.users.values[user] if self.users else ""
+        if bucket is not None:
+            row["window_start"] = bucket * self.window
+        row.update(
+            {
+                "calls": int(calls),
+                "answered": int(answered),
+                "talk_seconds": talk,
+                "duration_seconds": duration,
+                "minutes": talk / 60,
+                "asr": answered / calls if calls else 0.0,
+                "acd": talk / answered if answered else 0.0,
+            }
+        )
+        return row
+
+    def write_csv(self, file: TextIO, rows: Optional[List[dict]] = None):
+        """
+        Write aggregate rows (default: totals()) to an open text file as CSV.
+        """
+        rows = self.totals() if rows is None else rows
+        if not rows:
+            return
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    def stats(self) -> dict:
+        """
+        Return ingest counters, buffer and bucket sizes and time spent aggregating.
+        """
+        return {
+            "ingested": self.ingested,
+            "skipped": self.skipped,
+            "buffered": len(self.batch),
+            "buckets": len(self._buckets),
+            "domains": len(self.domains),
+            "users": len(self.users),
+            "flush_time": self.flush_time,
+            "numpy": self.use_numpy,
+        }
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class RequestCoalescer:
+    def __init__(self):
+        """
+        Share one in-flight request between concurrent callers asking for the same key.
+
+        The first caller for a key starts the request; callers arriving while it is in
+        flight await the same task and receive the same result or exception. The key is
+        forgotten as soon as the request completes, so a later caller always starts a
+        fresh request. If every caller is cancelled, the request is cancelled too.
+        """
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def run(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Await the in-flight request for `key`, starting it with `factory()` if there is none.
+
+        :param key: Identifies identical requests.
+        :param factory: Called without arguments to start the request.
+        :param timeout: Optional seconds this caller is willing to wait. Expiry raises
+                        asyncio.TimeoutError for this caller only.
+        :return: The result of the shared request.
+        """
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        self._waiters[key] += 1
+        try:
+            if timeout is None:
+                return await asyncio.shield(task)
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if not self._waiters[key] and not task.done():
+                    # Nobody is left to receive the result
+                    task.cancel()
+
+    def stats(self) -> dict:
+        """
+        Return how many requests were sent and how many callers shared one.
+        """
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._inflight),
+        }
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        # Mark the exception as retrieved in case every caller has gone
+        if not task.cancelled():
+            task.exception()
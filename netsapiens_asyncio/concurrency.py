@@ -0,0 +1,156 @@
+import asyncio
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Optional,
+    Union,
+)
+
+
+class TaskOutcome:
+    __slots__ = ("index", "item", "result", "error", "latency")
+
+    def __init__(
+        self,
+        index: int,
+        item: Any,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+        latency: float = 0.0,
+    ):
+        """
+        The outcome of running one item through run_bounded().
+
+        :param index: Position of the item in the input stream.
+        :param item: The input item.
+        :param result: The value returned for the item, if it succeeded.
+        :param error: The exception raised for the item, if it failed.
+        :param latency: Seconds spent processing the item.
+        """
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+        self.latency = latency
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"TaskOutcome(index={self.index}, {status}, latency={self.latency:.3f})"
+
+
+class Pacer:
+    def __init__(self, rate: float):
+        """
+        Space out events so that at most `rate` start per second.
+
+        :param rate: Maximum number of events per second.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0.")
+        self.interval = 1.0 / rate
+        self._next_start = 0.0
+
+    async def wait(self):
+        """
+        Wait until the next event is allowed to start.
+        """
+        now = time.monotonic()
+        if self._next_start > now:
+            await asyncio.sleep(self._next_start - now)
+            now = self._next_start
+        self._next_start = now + self.interval
+
+
+async def aiterate(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    """
+    Iterate over a regular or asynchronous iterable with `async for`.
+
+    :param items: An iterable or async iterable.
+    """
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_bounded(
+    items: Union[Iterable, AsyncIterable],
+    func: Callable[[Any], Awaitable],
+    concurrency: int,
+    rate: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[TaskOutcome]:
+    """
+    Run `func` over a stream of items with bounded concurrency, yielding outcomes as they complete.
+
+    Items are pulled from the input lazily, so at most `concurrency` items are held in
+    memory at once regardless of the size of the input. Exceptions raised by `func` are
+    captured in the outcome rather than stopping the run. Pending work is cancelled if
+    the caller stops iterating early.
+
+    :param items: An iterable or async iterable of items.
+    :param func: Coroutine function called with each item.
+    :param concurrency: Maximum number of items processed at the same time.
+    :param rate: Optional maximum number of items started per second.
+    :param timeout: Optional per-item timeout in seconds.
+    :return: An async iterator of TaskOutcome objects in completion order.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1.")
+
+    pacer = Pacer(rate) if rate else None
+    iterator = aiterate(items).__aiter__()
+    pending = set()
+    index = 0
+    exhausted = False
+
+    async def run_one(position: int, item: Any) -> TaskOutcome:
+        started = time.monotonic()
+        try:
+            if timeout is not None:
+                result = await asyncio.wait_for(func(item), timeout)
+            else:
+                result = await func(item)
+        except Exception as e:
+            return TaskOutcome(
+                position, item, error=e, latency=time.monotonic() - started
+            )
+        return TaskOutcome(
+            position, item, result=result, latency=time.monotonic() - started
+        )
+
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                if pacer is not None:
+                    await pacer.wait()
+                pending.add(asyncio.ensure_future(run_one(index, item)))
+                index += 1
+
+            if not pending:
+                return
+
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,457 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from .callcache import ActiveCallStore
+from .calls import CallsAPI, make_call_id
+from .concurrency import aiterate
+from .exceptions import RetryableError
+from .log import get_logger
+
+# new_call arguments a call request may set besides domain, user and destination
+CALL_OPTIONS = (
+    "synchronous",
+    "call_id",
+    "dial_rule_application",
+    "call_orig_user",
+    "auto_answer_enabled",
+    "caller_id_number",
+    "callback_caller_id_number",
+)
+
+
+class DialOutcome:
+    __slots__ = (
+        "index",
+        "request",
+        "call_id",
+        "result",
+        "error",
+        "attempts",
+        "latency",
+        "queued",
+    )
+
+    def __init__(self, index: int, request, call_id: str):
+        """
+        The outcome of one call request run through CampaignDialer.dial().
+
+        :param index: Position of the request in the input stream.
+        :param request: The request as given by the caller.
+        :param call_id: The call ID used for every attempt of this call.
+        """
+        self.index = index
+        self.request = request
+        self.call_id = call_id
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.attempts = 0
+        # Seconds spent in new_call requests, and waiting for capacity before that
+        self.latency = 0.0
+        self.queued = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return (
+            f"DialOutcome(index={self.index}, call_id={self.call_id!r}, {status}, "
+            f"attempts={self.attempts})"
+        )
+
+
+class _Job:
+    __slots__ = ("outcome", "key", "domain", "user", "destination", "options")
+
+    def __init__(self, outcome, key, domain, user, destination, options):
+        self.outcome = outcome
+        self.key = key
+        self.domain = domain
+        self.user = user
+        self.destination = destination
+        self.options = options
+
+
+class _Load:
+    __slots__ = (
+        "observed",
+        "observed_at",
+        "polled_at",
+        "placed",
+        "in_flight",
+        "poll",
+        "poll_failures",
+        "poll_error",
+    )
+
+    def __init__(self):
+        # Active calls last reported for the key, and the time the report reflects
+        self.observed: Optional[int] = None
+        self.observed_at = 0.0
+        self.polled_at = float("-inf")
+        # Times at which calls were placed; those after observed_at are not yet counted
+        self.placed: Deque[float] = deque()
+        self.in_flight = 0
+        self.poll: Optional[asyncio.Task] = None
+        # Consecutive failed polls and the last error
+        self.poll_failures = 0
+        self.poll_error: Optional[BaseException] = None
+
+    def estimate(self) -> int:
+        while self.placed and self.placed[0] <= self.observed_at:
+            self.placed.popleft()
+        return (self.observed or 0) + len(self.placed) + self.in_flight
+
+
+class CampaignDialer:
+    def __init__(
+        self,
+        calls_api: CallsAPI,
+        target_active: int = 10,
+        per: str = "domain",
+        targets: Optional[Dict[Union[str, Tuple[str, str]], int]] = None,
+        call_store: Optional[ActiveCallStore] = None,
+        concurrency: int = 10,
+        rate: Optional[float] = None,
+        poll_interval: float = 2.0,
+        settle_time: float = 2.0,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+        backlog: int = 1000,
+        max_poll_failures: int = 3,
+        log_level=logging.INFO,
+    ):
+        """
+        Place a stream of calls through CallsAPI.new_call, keeping the number of active
+        calls per domain (or per user) at a target level.
+
+        A new call is started only while the estimated active calls for its domain or
+        user are below the target. The estimate is the last observed count plus the
+        calls placed since that observation plus the new_call requests in flight. So
+        throughput follows the capacity that is actually free: when calls end, new
+        ones are placed; when the trunks are full, dialing waits.
+
+        The active count comes from `call_store` when given (kept current from call
+        events, no API traffic), otherwise from polling read_calls every
+        `poll_interval` seconds for each domain or user that has calls waiting.
+
+        :param calls_api: CallsAPI used to place calls and, without a call_store, to
+                          read the active call count.
+        :param target_active: Default target of concurrent active calls per domain or user.
+        :param per: "domain" or "user": the level at which the target applies.
+        :param targets: Optional per-domain (or per (domain, user)) targets overriding
+                        target_active.
+        :param call_store: Optional ActiveCallStore used to read the active call count.
+        :param concurrency: Maximum number of new_call requests in flight at once.
+        :param rate: Optional maximum number of calls started per second overall.
+        :param poll_interval: Seconds between active call count polls per domain or user.
+        :param settle_time: Seconds a placed call is assumed to take to appear in
+                            call_store; it is counted separately until then.
+        :param max_attempts: Attempts per call for retryable failures (e.g. the API
+                             timing out or throttling past the client's own retries).
+        :param retry_delay: Seconds before a failed call is attempted again.
+        :param backlog: Maximum number of call requests read ahead of dialing.
+        :param max_poll_failures: Without a call_store, a domain or user is not dialed
+                                  until its active call count has been read once. After
+                                  this many failed reads in a row, its waiting calls
+                                  fail with the read error instead of waiting forever.
+        :param log_level: Logging level (default is INFO).
+        """
+        if per not in ("domain", "user"):
+            raise ValueError("'per' must be 'domain' or 'user'.")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        self.calls_api = calls_api
+        self.target_active = target_active
+        self.per = per
+        self.targets = dict(targets or {})
+        self.call_store = call_store
+        self.concurrency = concurrency
+        self.rate = rate
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.backlog = backlog
+        self.max_poll_failures = max_poll_failures
+
+        self._loads: Dict[tuple, _Load] = {}
+        self.submitted = 0
+        self.placed = 0
+        self.failed = 0
+        self.retried = 0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("CampaignDialer initialized")
+
+    def target_for(self, key: tuple) -> int:
+        """
+        Return the target active call level for a (domain, user) key. `user` is None
+        when pacing per domain.
+        """
+        domain, user = key
+        if user is None:
+            return self.targets.get(domain, self.target_active)
+        return self.targets.get(key, self.targets.get(domain, self.target_active))
+
+    async def dial(
+        self, requests: Union[Iterable, AsyncIterable]
+    ) -> AsyncIterator[DialOutcome]:
+        """
+        Place a stream of calls and yield each call's outcome once it is final.
+
+        Each request is a tuple of (domain, user, destination) or a dictionary with
+        those keys plus any of the optional new_call arguments ("caller_id_number",
+        "call_id", ...). Requests are read lazily, up to `backlog` ahead. A domain or
+        user at its target does not hold up requests for others.
+
+        Each call keeps one call ID across attempts, so a retried request cannot place
+        the call twice. Failures are reported in the outcome's `error` attribute and do
+        not stop the campaign.
+
+        :param requests: An iterable or async iterable of call requests.
+        :return: An async iterator of DialOutcome objects in completion order.
+        """
+        queues: Dict[tuple, Deque[_Job]] = {}
+        delayed: List[tuple] = []
+        completed: Deque[DialOutcome] = deque()
+        in_flight = set()
+        wakeup = asyncio.Event()
+        room = asyncio.Semaphore(self.backlog)
+        sequence = 0
+        next_start = 0.0
+
+        async def feed():
+            index = 0
+            async for request in aiterate(requests):
+                await room.acquire()
+                job = self._make_job(index, request)
+                index += 1
+                self.submitted += 1
+                queues.setdefault(job.key, deque()).append(job)
+                wakeup.set()
+
+        async def attempt(job: _Job):
+            nonlocal sequence
+            load = self._load(job.key)
+            outcome = job.outcome
+            outcome.attempts += 1
+            started = time.monotonic()
+            try:
+                outcome.result = await self.calls_api.new_call(
+                    job.domain,
+                    job.user,
+                    job.options.get("synchronous", "no"),
+                    job.destination,
+                    call_id=outcome.call_id,
+                    **{
+                        name: value
+                        for name, value in job.options.items()
+                        if name not in ("synchronous", "call_id")
+                    },
+                )
+                outcome.error = None
+            except Exception as e:
+                outcome.error = e
+            finally:
+                outcome.latency += time.monotonic() - started
+                load.in_flight -= 1
+
+            if outcome.ok:
+                load.placed.append(time.monotonic())
+                self.placed += 1
+                finish(job)
+            elif (
+                isinstance(outcome.error, RetryableError)
+                and outcome.attempts < self.max_attempts
+            ):
+                self.retried += 1
+                self.logger.debug(
+                    "Call %s failed (%s), retrying in %ss",
+                    outcome.call_id,
+                    outcome.error,
+                    self.retry_delay,
+                )
+                sequence += 1
+                heapq.heappush(
+                    delayed, (time.monotonic() + self.retry_delay, sequence, job)
+                )
+            else:
+                self.failed += 1
+                self.logger.warning(
+                    f"Failed to place call {outcome.call_id} to {job.destination}: "
+                    f"{outcome.error}"
+                )
+                finish(job)
+
+        def finish(job: _Job):
+            completed.append(job.outcome)
+            room.release()
+
+        def launched(task: asyncio.Task):
+            in_flight.discard(task)
+            wakeup.set()
+
+        feeder = asyncio.ensure_future(feed())
+        feeder.add_done_callback(lambda task: wakeup.set())
+        dial_started = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    job = heapq.heappop(delayed)[2]
+                    queues.setdefault(job.key, deque()).appendleft(job)
+
+                # Start calls wherever there is capacity
+                for key in [key for key, queue in queues.items() if queue]:
+                    queue = queues[key]
+                    load = self._load(key)
+                    if not self._observe(key, load, now, wakeup):
+                        if load.poll_failures >= self.max_poll_failures:
+                            # The count cannot be read, so nothing can be paced here
+                            while queue:
+                                job = queue.popleft()
+                                job.outcome.error = load.poll_error
+                                self.failed += 1
+                                finish(job)
+                            del queues[key]
+                        continue
+                    free = self.target_for(key) - load.estimate()
+                    while free > 0 and queue and len(in_flight) < self.concurrency:
+                        if self.rate:
+                            if next_start > now:
+                                break
+                            next_start = max(next_start, now) + 1.0 / self.rate
+                        job = queue.popleft()
+                        if job.outcome.attempts == 0:
+                            job.outcome.queued = now - dial_started
+                        load.in_flight += 1
+                        free -= 1
+                        task = asyncio.ensure_future(attempt(job))
+                        in_flight.add(task)
+                        task.add_done_callback(launched)
+                    if not queue:
+                        del queues[key]
+
+                while completed:
+                    yield completed.popleft()
+
+                if feeder.done() and not queues and not delayed and not in_flight:
+                    if not feeder.cancelled() and feeder.exception() is not None:
+                        raise feeder.exception()
+                    return
+
+                # Sleep until a call finishes, a request or a count arrives, or the
+                # next poll, retry or rate slot is due
+                timeout = self.poll_interval
+                if delayed:
+                    timeout = min(timeout, delayed[0][0] - now)
+                if self.rate and next_start > now:
+                    timeout = min(timeout, next_start - now)
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), max(timeout, 0.001))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            feeder.cancel()
+            for task in in_flight:
+                task.cancel()
+            for load in self._loads.values():
+                if load.poll is not None:
+                    load.poll.cancel()
+                    load.poll = None
+
+    def stats(self) -> dict:
+        """
+        Return campaign counters and the estimated active calls per domain or user.
+        """
+        return {
+            "submitted": self.submitted,
+            "placed": self.placed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "active": {
+                key if key[1] is not None else key[0]: load.estimate()
+                for key, load in self._loads.items()
+            },
+        }
+
+    def _make_job(self, index: int, request) -> _Job:
+        if isinstance(request, dict):
+            fields = dict(request)
+            domain = fields.pop("domain")
+            user = fields.pop("user")
+            destination = fields.pop("destination")
+            unknown = set(fields) - set(CALL_OPTIONS)
+            if unknown:
+                raise ValueError(
+                    f"Unknown call request fields: {', '.join(sorted(unknown))}"
+                )
+        else:
+            domain, user, destination = request
+            fields = {}
+        key = (domain, user if self.per == "user" else None)
+        outcome = DialOutcome(index, request, fields.get("call_id") or make_call_id())
+        return _Job(outcome, key, domain, user, destination, fields)
+
+    def _load(self, key: tuple) -> _Load:
+        load = self._loads.get(key)
+        if load is None:
+            load = self._loads[key] = _Load()
+        return load
+
+    def _observe(self, key: tuple, load: _Load, now: float, wakeup) -> bool:
+        """
+        Refresh the observed active call count of a key if it is due. Returns False
+        while the count is not known yet.
+        """
+        domain, user = key
+        if self.call_store is not None:
+            load.observed = self.call_store.count(domain, user)
+            # Calls placed within settle_time may not have been seen as events yet
+            load.observed_at = now - self.settle_time
+            return True
+
+        if load.poll is None and now - load.polled_at >= self.poll_interval:
+            load.poll = asyncio.ensure_future(self._poll(key, load))
+            load.poll.add_done_callback(lambda task: wakeup.set())
+        return load.observed is not None
+
+    async def _poll(self, key: tuple, load: _Load):
+        domain, user = key
+        started = time.monotonic()
+        try:
+            if user is None:
+                result = await self.calls_api.read_calls(domain, count=True)
+                active = int(result.get("total", 0))
+            else:
+                active = len(await self.calls_api.read_calls(domain, user=user) or ())
+        except Exception as e:
+            load.poll_failures += 1
+            load.poll_error = e
+            self.logger.warning(f"Failed to read active calls for {domain}: {e}")
+        else:
+            load.observed = active
+            load.observed_at = started
+            load.poll_failures = 0
+            load.poll_error = None
+        finally:
+            load.polled_at = time.monotonic()
+            load.poll = None
@@ -0,0 +1,92 @@
+from typing import Optional
+
+
+class NetsapiensError(Exception):
+    """
+    Base class for all errors raised by netsapiens_asyncio.
+
+    `retryable` tells whether repeating the same request may succeed.
+    """
+
+    retryable = False
+
+
+class RetryableError(NetsapiensError):
+    """
+    Base class for transient errors where repeating the request may succeed.
+    """
+
+    retryable = True
+
+
+class AuthenticationError(NetsapiensError):
+    def __init__(self, message: str, status: Optional[int] = None):
+        """
+        Raised when the token endpoint rejects a password or refresh token grant.
+
+        :param message: Description of the failure.
+        :param status: HTTP status returned by the token endpoint, if any.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class NetsapiensAPIError(NetsapiensError):
+    def __init__(self, message: str, status: int, body: Optional[str] = None):
+        """
+        Raised when the API responds with an unexpected HTTP status.
+
+        Raised directly for fatal statuses (e.g. 400, 403, 404) that will fail
+        again if retried.
+
+        :param message: Description of the failure.
+        :param status: HTTP status of the response.
+        :param body: Response body, if it could be read.
+        """
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class ServerError(NetsapiensAPIError, RetryableError):
+    """
+    Raised for transient HTTP statuses such as 408, 500, 502 and 504.
+    """
+
+
+class RateLimitError(ServerError):
+    def __init__(
+        self,
+        message: str,
+        status: int,
+        body: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """
+        Raised when the API throttles a request (HTTP 429 or 503).
+
+        :param message: Description of the failure.
+        :param status: HTTP status of the response.
+        :param body: Response body, if it could be read.
+        :param retry_after: Seconds the server asked the client to wait, if given.
+        """
+        super().__init__(message, status, body)
+        self.retry_after = retry_after
+
+
+class NetworkError(RetryableError):
+    """
+    Raised when a request fails before a response is received.
+    """
+
+
+class DeadlineExceededError(NetsapiensError):
+    """
+    Raised when a request's deadline passes before it could complete.
+    """
+
+
+class SpoolError(NetsapiensError):
+    """
+    Raised when the event spool cannot be written or a stored record is corrupt.
+    """
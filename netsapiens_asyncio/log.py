@@ -0,0 +1,263 @@
+import json
+import logging
+import re
+import weakref
+from typing import Any, Optional
+
+REDACTED = "[redacted]"
+# Keys whose values are never logged. Compared lower-case with "-" read as "_".
+SECRET_KEYS = {
+    "access_token",
+    "refresh_token",
+    "id_token",
+    "client_secret",
+    "password",
+    "authorization",
+    "token",
+    "secret",
+}
+# Credentials that may appear in already formatted text
+_SECRET_TEXT = re.compile(
+    r"(?i)(bearer\s+)[a-z0-9._~+/=-]+"
+    r"|(['\"]?(?:access_token|refresh_token|id_token|client_secret|password)['\"]?"
+    r"\s*[:=]\s*['\"]?)[^'\",\s}]+"
+)
+
+# Attributes present on every LogRecord; anything else came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None)).keys()) | {
+    "message",
+    "asctime",
+    "sampled",
+}
+
+_config = {
+    "payload_limit": 200,
+    "sample_rate": 1.0,
+    "structured": False,
+    "redact": True,
+}
+_handlers: "weakref.WeakSet[logging.Handler]" = weakref.WeakSet()
+
+# Pass as `extra` to mark a high-rate success message that may be sampled
+SAMPLED = {"sampled": True}
+
+
+def _is_secret(key: Any) -> bool:
+    if not isinstance(key, str):
+        return False
+    key = key.lower().replace("-", "_")
+    return (
+        key in SECRET_KEYS
+        or key.endswith("_token")
+        or "secret" in key
+        or "password" in key
+    )
+
+
+def redact(value: Any) -> Any:
+    """
+    Return a copy of a payload with the values of secret keys (tokens, passwords,
+    client secrets) replaced by "[redacted]".
+
+    :param value: A dict, list or scalar.
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if _is_secret(key) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def redact_text(text: str) -> str:
+    """
+    Mask bearer tokens and credential fields in already formatted text.
+    """
+    return _SECRET_TEXT.sub(
+        lambda m: (m.group(1) or m.group(2)) + REDACTED,
+        text,
+    )
+
+
+def _render(value: Any, budget: int) -> str:
+    """
+    repr() a payload with secrets redacted, giving up after about `budget` characters.
+    Large lists and long strings are never rendered in full.
+    """
+    if isinstance(value, dict):
+        parts = []
+        used = 2
+        for key, item in value.items():
+            if used >= budget:
+                parts.append(f"... ({len(value)} keys)")
+                break
+            rendered = REDACTED if _is_secret(key) else _render(item, budget - used)
+            part = f"{key!r}: {rendered}"
+            parts.append(part)
+            used += len(part) + 2
+        return "{" + ", ".join(parts) + "}"
+    if isinstance(value, (list, tuple)):
+        parts = []
+        used = 2
+        for item in value:
+            if used >= budget:
+                parts.append(f"... ({len(value)} items)")
+                break
+            part = _render(item, budget - used)
+            parts.append(part)
+            used += len(part) + 2
+        return "[" + ", ".join(parts) + "]"
+    if isinstance(value, (str, bytes)) and len(value) > budget:
+        return f"{value[:budget]!r}... ({len(value)} chars)"
+    return repr(value)
+
+
+class PayloadSummary:
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload: Any, limit: Optional[int] = None):
+        """
+        Lazily rendered, size-capped and redacted view of a payload for log messages.
+
+        Nothing is rendered unless the log record is actually emitted, so passing a
+        summary to a disabled log level costs one object allocation.
+
+        :param payload: The request or response payload.
+        :param limit: Approximate maximum length in characters. Defaults to the value
+                      set with configure_logging() (200).
+        """
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self):
+        limit = self.limit if self.limit is not None else _config["payload_limit"]
+        return _render(self.payload, limit)
+
+    __repr__ = __str__
+
+
+def summarize(payload: Any, limit: Optional[int] = None) -> PayloadSummary:
+    """
+    Wrap a payload for logging with %s; see PayloadSummary.
+    """
+    return PayloadSummary(payload, limit)
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Masks bearer tokens and credential fields in emitted log messages.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if _config["redact"]:
+            message = record.getMessage()
+            redacted = redact_text(message)
+            if redacted != message:
+                record.msg = redacted
+                record.args = ()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through a sample_rate fraction of the records marked with `extra=SAMPLED`.
+    Unmarked records, e.g. warnings and errors, are never dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._credit = 0.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = _config["sample_rate"]
+        if rate >= 1.0 or not getattr(record, "sampled", False):
+            return True
+        if rate <= 0:
+            return False
+        # Accumulate the rate so fractional rates such as 0.3 are kept exactly
+        self._credit += rate
+        if self._credit >= 1.0:
+            self._credit -= 1.0
+            return True
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, including fields passed with
+    `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _formatter() -> logging.Formatter:
+    if _config["structured"]:
+        return JSONFormatter()
+    return logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+
+def get_logger(name: str, log_level=logging.INFO) -> logging.Logger:
+    """
+    Return the dedicated logger used by a client class, set to `log_level`.
+
+    A stream handler is added if the logger has none (to avoid duplicate logs), and
+    the redaction and sampling filters are installed once.
+
+    :param name: Logger name, by convention the class name.
+    :param log_level: Logging level (default is INFO).
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(log_level)
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(_formatter())
+        logger.addHandler(handler)
+        _handlers.add(handler)
+
+    if not any(isinstance(f, RedactingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter())
+        logger.addFilter(RedactingFilter())
+    return logger
+
+
+def configure_logging(
+    structured: Optional[bool] = None,
+    sample_rate: Optional[float] = None,
+    payload_limit: Optional[int] = None,
+    redact_secrets: Optional[bool] = None,
+):
+    """
+    Adjust logging for every client class. Arguments left as None keep their setting.
+
+    :param structured: If True, the handlers added by this library emit JSON lines.
+    :param sample_rate: Fraction (0..1) of high-rate success messages that are logged,
+                        e.g. 0.01 logs one "Message sent successfully" in a hundred.
+    :param payload_limit: Approximate maximum characters of a payload in a log message.
+    :param redact_secrets: If False, tokens and secrets are no longer masked.
+    """
+    if sample_rate is not None:
+        _config["sample_rate"] = sample_rate
+    if payload_limit is not None:
+        _config["payload_limit"] = payload_limit
+    if redact_secrets is not None:
+        _config["redact"] = redact_secrets
+    if structured is not None:
+        _config["structured"] = structured
+        for handler in list(_handlers):
+            handler.setFormatter(_formatter())
@@ -0,0 +1,365 @@
+import asyncio
+import base64
+import mimetypes
+import os
+import tempfile
+from typing import AsyncIterable, AsyncIterator, List, Optional, Union
+
+# Raw bytes encoded per chunk. A multiple of 3, so the base64 of consecutive chunks
+# concatenates into the base64 of the whole file with no padding in between.
+CHUNK_SIZE = 3 * 21845
+# Prepared media larger than this is kept in a temporary file instead of memory
+SPOOL_SIZE = 8 * 1024 * 1024
+
+# (offset, magic bytes, MIME type) checked against the start of the media
+SIGNATURES = (
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"#!AMR", "audio/amr"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"\xff\xfb", "audio/mpeg"),
+    (0, b"BEGIN:VCARD", "text/vcard"),
+    (4, b"ftyp3g", "video/3gpp"),
+    (4, b"ftyp", "video/mp4"),
+)
+RIFF_TYPES = {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}
+
+MediaSource = Union[str, os.PathLike, bytes, bytearray, memoryview, AsyncIterable]
+
+
+def detect_mime_type(head: bytes, filename: Optional[str] = None) -> str:
+    """
+    Guess a MIME type from the first bytes of a file, falling back to the file name.
+
+    :param head: At least the first 16 bytes of the media, when it has that many.
+    :param filename: Optional file name used if the content is not recognised.
+    :return: The MIME type, "application/octet-stream" if unknown.
+    """
+    if head[:4] == b"RIFF" and head[8:12] in RIFF_TYPES:
+        return RIFF_TYPES[head[8:12]]
+    for offset, magic, mime_type in SIGNATURES:
+        if head[offset : offset + len(magic)] == magic:
+            return mime_type
+    if filename:
+        guessed, _ = mimetypes.guess_type(filename)
+        if guessed:
+            return guessed
+    return "application/octet-stream"
+
+
+def encoded_length(size: int) -> int:
+    """
+    Return the length of the base64 encoding of `size` bytes.
+    """
+    return 4 * ((size + 2) // 3)
+
+
+class _Encoder:
+    def __init__(self):
+        """
+        Base64-encode a byte stream chunk by chunk, carrying over the bytes that do not
+        fill a 3-byte group, and record its size and first bytes.
+        """
+        self.size = 0
+        self.head = b""
+        self._carry = b""
+
+    def feed(self, chunk: Union[bytes, memoryview]) -> bytes:
+        if not chunk:
+            return b""
+        self.size += len(chunk)
+        if len(self.head) < 16:
+            self.head += bytes(chunk[: 16 - len(self.head)])
+        if self._carry:
+            chunk = self._carry + bytes(chunk)
+        usable = len(chunk) - len(chunk) % 3
+        self._carry = bytes(chunk[usable:])
+        return base64.b64encode(chunk[:usable])
+
+    def finish(self) -> bytes:
+        carry, self._carry = self._carry, b""
+        return base64.b64encode(carry)
+
+
+async def _read_chunks(source: MediaSource) -> AsyncIterator[Union[bytes, memoryview]]:
+    """
+    Yield the raw bytes of a path, a bytes-like object or an async iterator of bytes.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source).cast("B")
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield view[start : start + CHUNK_SIZE]
+    elif isinstance(source, (str, os.PathLike)):
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, open, source, "rb")
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, file.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            file.close()
+    elif hasattr(source, "__aiter__"):
+        async for chunk in source:
+            yield chunk
+    else:
+        raise TypeError(
+            "Media must be a file path, a bytes-like object or an async iterator of bytes."
+        )
+
+
+async def _read_head(path) -> bytes:
+    def read():
+        with open(path, "rb") as file:
+            return file.read(16)
+
+    return await asyncio.get_running_loop().run_in_executor(None, read)
+
+
+def _known_size(source: MediaSource) -> Optional[int]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return None
+
+
+class PreparedMedia:
+    def __init__(self, mime_type: str, size: int):
+        """
+        Media encoded to base64 once and reusable for any number of messages.
+
+        Create it with prepare_media(). The encoding is held in memory, or in a
+        temporary file once it is larger than the spool size, and is streamed from
+        there into each request body. Close it to release the memory or file.
+
+        :param mime_type: The media's MIME type.
+        :param size: Size of the raw media in bytes.
+        """
+        self.mime_type = mime_type
+        self.size = size
+        self.path: Optional[str] = None
+        self._chunks: List[bytes] = []
+        self._closed = False
+
+    @property
+    def encoded_size(self) -> int:
+        return encoded_length(self.size)
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """
+        Yield the base64 encoding in chunks.
+        """
+        if self._closed:
+            raise ValueError("The PreparedMedia has been closed.")
+        if self.path is None:
+            for chunk in self._chunks:
+                yield chunk
+            return
+        # Each reader opens its own handle, so concurrent sends do not share a position
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, open, self.path, "rb")
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, file.read, 4 * CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            file.close()
+
+    def close(self):
+        """
+        Release the encoded media.
+        """
+        self._closed = True
+        self._chunks = []
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"PreparedMedia(mime_type={self.mime_type!r}, size={self.size})"
+
+
+async def prepare_media(
+    source: MediaSource,
+    mime_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    spool_size: int = SPOOL_SIZE,
+) -> PreparedMedia:
+    """
+    Encode media once so it can be sent to many recipients without encoding it again.
+
+    :param source: A file path, a bytes-like object or an async iterator of bytes.
+    :param mime_type: Optional MIME type. Detected from the content if omitted.
+    :param filename: Optional file name used to guess the MIME type when the content
+                     is not recognised. Defaults to the path of a path source.
+    :param spool_size: Encoded size above which the encoding moves to a temporary file.
+    :return: A PreparedMedia to pass as `media` to MessageAPI.send_message.
+    """
+    if filename is None and isinstance(source, (str, os.PathLike)):
+        filename = os.fspath(source)
+    media = PreparedMedia("", 0)
+    encoder = _Encoder()
+    loop = asyncio.get_running_loop()
+    file = None
+    buffered = 0
+    try:
+        async for chunk in _read_chunks(source):
+            encoded = encoder.feed(chunk)
+            if file is None and buffered + len(encoded) > spool_size:
+                descriptor, media.path = tempfile.mkstemp(suffix=".b64")
+                file = os.fdopen(descriptor, "wb")
+                await loop.run_in_executor(None, file.writelines, media._chunks)
+                media._chunks = []
+            if file is not None:
+                await loop.run_in_executor(None, file.write, encoded)
+            else:
+                media._chunks.append(encoded)
+                buffered += len(encoded)
+        if file is not None:
+            await loop.run_in_executor(None, file.write, encoder.finish())
+            file.close()
+        else:
+            media._chunks.append(encoder.finish())
+    except BaseException:
+        if file is not None:
+            file.close()
+        media.close()
+        raise
+    media.size = encoder.size
+    media.mime_type = mime_type or detect_mime_type(encoder.head, filename)
+    return media
+
+
+class MessageBody:
+    def __init__(
+        self,
+        fields: dict,
+        media: Union[MediaSource, PreparedMedia],
+        mime_type: Optional[str],
+        dumps,
+    ):
+        """
+        Streamed JSON body of a message with media.
+
+        The body is written as the other message fields, then the base64 media as the
+        "data" field, then "mime-type" and "size". The media is encoded while the body
+        is sent, so neither the encoding nor the body is ever held in memory whole;
+        size and MIME type are worked out on the way.
+
+        :param fields: The other fields of the message.
+        :param media: A PreparedMedia, a file path, a bytes-like object or an async
+                      iterator of bytes.
+        :param mime_type: Optional MIME type overriding the detected one.
+        :param dumps: JSON encoder returning bytes.
+        """
+        # Each field is encoded on its own, so the object's braces and separators do
+        # not depend on how the encoder lays out a whole object
+        self.prefix = (
+            b"{"
+            + b"".join(
+                dumps(key) + b":" + dumps(value) + b"," for key, value in fields.items()
+            )
+            + b'"data":"'
+        )
+        self.media = media
+        self.mime_type = mime_type
+        self.dumps = dumps
+        self.length: Optional[int] = None
+        self._opened = False
+
+    async def resolve(self):
+        """
+        Work out the media's MIME type and the body length ahead of sending, when the
+        media is not an async iterator. A known length is sent as Content-Length
+        instead of a chunked body.
+        """
+        media = self.media
+        if isinstance(media, PreparedMedia):
+            size = media.size
+            self.mime_type = self.mime_type or media.mime_type
+        else:
+            size = _known_size(media)
+            if size is not None and self.mime_type is None:
+                if isinstance(media, (str, os.PathLike)):
+                    head = await _read_head(media)
+                    filename = os.fspath(media)
+                else:
+                    head, filename = bytes(memoryview(media).cast("B")[:16]), None
+                self.mime_type = detect_mime_type(head, filename)
+        if size is not None:
+            self.length = (
+                len(self.prefix)
+                + encoded_length(size)
+                + len(self._suffix(self.mime_type, size))
+            )
+
+    def _suffix(self, mime_type: str, size: int) -> bytes:
+        return (
+            b'","mime-type":'
+            + self.dumps(mime_type)
+            + b',"size":'
+            + self.dumps(str(size))
+            + b"}"
+        )
+
+    @property
+    def replayable(self) -> bool:
+        """
+        Whether the body can be sent again, i.e. its media is not an async iterator.
+        """
+        return not hasattr(self.media, "__aiter__")
+
+    def open(self) -> AsyncIterator[bytes]:
+        """
+        Return a new iterator over the body. Each request attempt opens the body again;
+        media read from an async iterator can only be sent once.
+        """
+        if self._opened and not self.replayable:
+            raise ValueError(
+                "Media from an async iterator can only be sent once. "
+                "Use prepare_media() to send it more than once."
+            )
+        self._opened = True
+        return self._generate()
+
+    async def _generate(self) -> AsyncIterator[bytes]:
+        yield self.prefix
+        if isinstance(self.media, PreparedMedia):
+            async for chunk in self.media.chunks():
+                yield chunk
+            size = self.media.size
+            mime_type = self.mime_type
+        else:
+            encoder = _Encoder()
+            async for chunk in _read_chunks(self.media):
+                encoded = encoder.feed(chunk)
+                if encoded:
+                    yield encoded
+            yield encoder.finish()
+            size = encoder.size
+            mime_type = self.mime_type or detect_mime_type(
+                encoder.head,
+                (
+                    os.fspath(self.media)
+                    if isinstance(self.media, (str, os.PathLike))
+                    else None
+                ),
+            )
+        yield self._suffix(mime_type, size)
@@ -1,8 +1,11 @@
-import aiohttp
 import logging
 import re
-from typing import Optional, Union
+from typing import AsyncIterator, Optional, Union
 from .auth import NetsapiensAPI
+from .log import SAMPLED, get_logger, summarize
+from .media import MessageBody
+from .models import MessageRecord
+from .pagination import Paginator
 
 
 class MessageAPI:
@@ -20,17 +23,7 @@ class MessageAPI:
         self.user = "~"
 
         # Create a dedicated logger for this class
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(log_level)
-
-        # Add a handler if the logger has no handlers (to avoid duplicate logs)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
+        self.logger = get_logger(self.__class__.__name__, log_level)
 
         self.logger.debug("MessageAPI initialized with auth client")
 
@@ -44,6 +37,8 @@ class MessageAPI:
         data: Optional[str] = None,
         mime_type: Optional[str] = None,
         size: Optional[int] = None,
+        deadline: Optional[float] = None,
+        media=None,
     ):
         """
         Send a message via the API, either to a new session or an existing session.
@@ -57,8 +52,17 @@ class MessageAPI:
         :param data: Base64-encoded data for MMS or media chat.
         :param mime_type: Mime type of the media file for MMS or media chat.
         :param size: Size of the media file in bytes for MMS or media chat.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
+        :param media: Optional media for MMS or media chat, used instead of `data` and
+                      `size`: a file path, a bytes-like object, an async iterator of
+                      bytes or a PreparedMedia. It is base64-encoded while the request
+                      is sent, and its size and MIME type (unless `mime_type` is given)
+                      are detected.
         :return: API response as a dictionary.
         """
+        if media is not None and (data or size):
+            raise ValueError("'media' cannot be used with 'data' or 'size'.")
+
         # Check and refresh token if necessary
         self.auth_data = await self.auth_client.check_token_expiry()
         self.base_url = self.auth_data.get("api_url")
@@ -87,27 +91,43 @@ class MessageAPI:
         }
 
         # Add optional parameters if applicable
-        if data:
-            payload["data"] = data
-        if mime_type:
-            payload["mime-type"] = mime_type
-        if size:
-            payload["size"] = str(size)
+        body = None
+        if media is not None:
+            # The body is streamed: the fields above, then the encoded media
+            codec = self.auth_client.codec
+            body = MessageBody(payload, media, mime_type, codec.dumps)
+            await body.resolve()
+        else:
+            if data:
+                payload["data"] = data
+            if mime_type:
+                payload["mime-type"] = mime_type
+            if size:
+                payload["size"] = str(size)
 
-        self.logger.debug(f"Sending message with payload: {payload}")
+        self.logger.debug("Sending message with payload: %s", summarize(payload))
 
         # Make the POST request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    self.logger.info(f"Message sent successfully: {result}")
-                    return result
-                else:
-                    error_message = await response.text()
-                    self.logger.error(f"Failed to send message: {error_message}")
-                    raise Exception(f"Failed to send message: {error_message}")
+        try:
+            result = await self.auth_client.request(
+                "POST",
+                url,
+                group="messages",
+                action="send message",
+                json=payload,
+                deadline=deadline,
+                body=body,
+            )
+        finally:
+            # A new message changes the session listings. The message is sent as "~",
+            # so the affected domain and user are unknown; evict every session listing
+            self.auth_client.invalidate_cache(
+                f"{self.base_url}/ns-api/v2/domains/", contains="/messagesessions"
+            )
+        self.logger.info(
+            "Message sent successfully: %s", summarize(result), extra=SAMPLED
+        )
+        return result
 
     async def get_messages(
         self,
@@ -115,6 +135,10 @@ class MessageAPI:
         domain: str = "~",
         user: Optional[str] = None,
         limit: Optional[int] = None,
+        start: Optional[int] = None,
+        deadline: Optional[float] = None,
+        typed: bool = False,
+        raw: bool = False,
     ):
         """
         Retrieve message sessions or messages for a specific session.
@@ -123,8 +147,82 @@ class MessageAPI:
         :param domain: Domain to retrieve messages from. Defaults to "~" (current domain).
         :param user: Optional user to retrieve messages for. If None, retrieves all sessions for the domain.
         :param limit: Optional limit on the number of items to retrieve.
+        :param start: Optional offset of the first item to retrieve, used for paging.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
+        :param typed: If True, return MessageRecord objects instead of dictionaries.
+        :param raw: If True, return the undecoded JSON response body as bytes.
         :return: A list of dictionaries representing message sessions or messages.
         """
+        url = await self._messages_url(messagesession, domain, user)
+
+        # Prepare query parameters
+        params = {}
+        if limit:
+            params["limit"] = str(limit)
+        if start:
+            params["start"] = str(start)
+
+        self.logger.debug("Retrieving messages from %s with params: %s", url, params)
+
+        # Make the GET request
+        result = await self.auth_client.request(
+            "GET",
+            url,
+            group="messages",
+            action="retrieve messages",
+            params=params,
+            deadline=deadline,
+            # Only the session listing is cached; messages in a session change often
+            cache=not messagesession,
+            raw=raw,
+        )
+        self.logger.info("Messages retrieved successfully from %s.", url, extra=SAMPLED)
+        if typed and not raw:
+            return MessageRecord.decode(result)
+        return result
+
+    async def stream_messages(
+        self,
+        messagesession: Optional[str] = None,
+        domain: str = "~",
+        user: Optional[str] = None,
+        limit: Optional[int] = None,
+        typed: bool = False,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Stream message sessions, or messages for a specific session, one item at a time.
+
+        The response is decoded incrementally as it arrives instead of being buffered.
+
+        :param messagesession: Optional session ID to retrieve messages for. If None, streams all message sessions.
+        :param domain: Domain to retrieve messages from. Defaults to "~" (current domain).
+        :param user: Optional user to retrieve messages for. If None, streams all sessions for the domain.
+        :param limit: Optional limit on the number of items to retrieve.
+        :param typed: If True, yield MessageRecord objects instead of dictionaries.
+        :param deadline: Optional. Total time budget in seconds for the whole stream.
+        :return: An async iterator of message session or message dictionaries.
+        """
+        url = await self._messages_url(messagesession, domain, user)
+        params = {"limit": str(limit)} if limit else {}
+        self.logger.debug("Streaming messages from %s with params: %s", url, params)
+
+        async for item in self.auth_client.stream_request(
+            "GET",
+            url,
+            group="messages",
+            action="retrieve messages",
+            params=params,
+            deadline=deadline,
+        ):
+            yield MessageRecord(item) if typed else item
+
+    async def _messages_url(
+        self, messagesession: Optional[str], domain: str, user: Optional[str]
+    ) -> str:
+        """
+        Build the URL for listing message sessions or the messages of one session.
+        """
         # Check and refresh token if necessary
         self.auth_data = await self.auth_client.check_token_expiry()
         self.base_url = self.auth_data.get("api_url")
@@ -139,35 +237,64 @@ class MessageAPI:
                 url = f"{self.base_url}/ns-api/v2/domains/{domain}/users/{user}/messagesessions"
             else:
                 url = f"{self.base_url}/ns-api/v2/domains/{domain}/messagesessions"
+        return url
 
-        # Prepare query parameters
-        params = {}
-        if limit:
-            params["limit"] = str(limit)
+    def iter_sessions(
+        self,
+        domain: str = "~",
+        user: Optional[str] = None,
+        page_size: int = 100,
+        prefetch: int = 2,
+        max_items: Optional[int] = None,
+    ) -> Paginator:
+        """
+        Iterate over all message sessions with `async for`, one page at a time.
 
-        self.logger.debug(f"Retrieving messages from {url} with params: {params}")
+        The next pages are fetched in the background while the current one is consumed.
 
-        # Make the GET request
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-                async with session.get(url, headers=headers, params=params) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        self.logger.info(f"Messages retrieved successfully from {url}.")
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to retrieve messages from {url}. "
-                            f"Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(
-                            f"Failed to retrieve messages. Status: {response.status}, Error: {error_message}"
-                        )
-        except aiohttp.ClientError as e:
-            self.logger.error(f"Network error while retrieving messages: {e}")
-            raise Exception("Network error occurred while retrieving messages.") from e
-        except Exception as e:
-            self.logger.error(f"Unexpected error while retrieving messages: {e}")
-            raise Exception("An unexpected error occurred.") from e
+        :param domain: Domain to retrieve sessions from. Defaults to "~" (current domain).
+        :param user: Optional user to retrieve sessions for. If None, iterates all sessions in the domain.
+        :param page_size: Number of sessions requested per page.
+        :param prefetch: Number of pages fetched ahead of the caller.
+        :param max_items: Optional maximum number of sessions to yield.
+        :return: A Paginator yielding message session dictionaries.
+        """
+
+        async def fetch_page(offset: int, limit: int):
+            return await self.get_messages(
+                domain=domain, user=user, limit=limit, start=offset
+            )
+
+        return Paginator(fetch_page, page_size, prefetch, max_items)
+
+    def iter_messages(
+        self,
+        messagesession: str,
+        domain: str = "~",
+        user: Optional[str] = None,
+        page_size: int = 100,
+        prefetch: int = 2,
+        max_items: Optional[int] = None,
+    ) -> Paginator:
+        """
+        Iterate over all messages in a session with `async for`, one page at a time.
+
+        :param messagesession: Session ID to retrieve messages for.
+        :param domain: Domain of the session. Defaults to "~" (current domain).
+        :param user: Optional user owning the session. Defaults to "~".
+        :param page_size: Number of messages requested per page.
+        :param prefetch: Number of pages fetched ahead of the caller.
+        :param max_items: Optional maximum number of messages to yield.
+        :return: A Paginator yielding message dictionaries.
+        """
+
+        async def fetch_page(offset: int, limit: int):
+            return await self.get_messages(
+                messagesession=messagesession,
+                domain=domain,
+                user=user,
+                limit=limit,
+                start=offset,
+            )
+
+        return Paginator(fetch_page, page_size, prefetch, max_items)
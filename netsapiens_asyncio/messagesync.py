@@ -0,0 +1,674 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .codec import JSONCodec, default_codec
+from .concurrency import run_bounded
+from .log import get_logger
+from .messages import MessageAPI
+from .models import parse_datetime
+from .webhook import WebhookEvent, WebhookServer
+
+SESSION_FIELDS = ("messagesession", "session", "messagesession-id")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    messagesession TEXT PRIMARY KEY,
+    domain TEXT NOT NULL,
+    user TEXT NOT NULL,
+    last_timestamp REAL,
+    last_message_id TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    dirty INTEGER NOT NULL DEFAULT 1,
+    dirtied_at REAL,
+    synced_at REAL,
+    record BLOB
+);
+CREATE INDEX IF NOT EXISTS sessions_dirty ON sessions (dirty) WHERE dirty = 1;
+CREATE TABLE IF NOT EXISTS messages (
+    messagesession TEXT NOT NULL,
+    id TEXT NOT NULL,
+    timestamp REAL,
+    record BLOB NOT NULL,
+    PRIMARY KEY (messagesession, id)
+);
+"""
+
+
+def _epoch(value: Any) -> Optional[float]:
+    parsed = parse_datetime(value)
+    return parsed.timestamp() if hasattr(parsed, "timestamp") else None
+
+
+class SessionWatermark:
+    __slots__ = (
+        "messagesession",
+        "domain",
+        "user",
+        "last_timestamp",
+        "last_message_id",
+        "message_count",
+        "dirty",
+    )
+
+    def __init__(
+        self,
+        messagesession: str,
+        domain: str,
+        user: str,
+        last_timestamp: Optional[float] = None,
+        last_message_id: Optional[str] = None,
+        message_count: int = 0,
+        dirty: bool = True,
+    ):
+        """
+        How far a session has been synced.
+
+        :param messagesession: The session ID.
+        :param domain: The session's domain.
+        :param user: The user owning the session.
+        :param last_timestamp: Epoch seconds of the newest synced message.
+        :param last_message_id: ID of the newest synced message.
+        :param message_count: Number of messages stored for the session.
+        :param dirty: True if an event reported a change since the last sync.
+        """
+        self.messagesession = messagesession
+        self.domain = domain
+        self.user = user
+        self.last_timestamp = last_timestamp
+        self.last_message_id = last_message_id
+        self.message_count = message_count
+        self.dirty = dirty
+
+    def __repr__(self):
+        return (
+            f"SessionWatermark({self.messagesession!r}, count={self.message_count}, "
+            f"last_timestamp={self.last_timestamp}, dirty={self.dirty})"
+        )
+
+
+class MessageStore:
+    def __init__(
+        self,
+        path: str,
+        codec: Optional[JSONCodec] = None,
+        log_level=logging.INFO,
+    ):
+        """
+        SQLite store of message sessions, their messages and sync watermarks.
+
+        All database work runs on one dedicated thread, so the event loop never blocks
+        on disk I/O and the connection is never shared between threads.
+
+        :param path: Path of the SQLite database file (created if missing).
+        :param codec: Optional JSONCodec for the stored records. Defaults to
+                      default_codec().
+        :param log_level: Logging level (default is INFO).
+        """
+        self.path = path
+        self.codec = codec or default_codec()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("MessageStore initialized")
+
+    async def open(self):
+        """
+        Open the database and create the tables if needed.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="MessageStore"
+            )
+            await self._run(self._open_sync)
+
+    async def close(self):
+        """
+        Close the database.
+        """
+        if self._executor is not None:
+            await self._run(self._close_sync)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _run(self, function, *args):
+        if self._executor is None:
+            raise RuntimeError("The MessageStore is not open.")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    def _open_sync(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _close_sync(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def watermarks(
+        self, sessions: Optional[Iterable[str]] = None
+    ) -> Dict[str, SessionWatermark]:
+        """
+        Return the watermarks of the given sessions, or of every session.
+        """
+        return await self._run(
+            self._watermarks_sync, None if sessions is None else list(sessions)
+        )
+
+    def _watermarks_sync(self, sessions: Optional[List[str]]):
+        query = (
+            "SELECT messagesession, domain, user, last_timestamp, last_message_id,"
+            " message_count, dirty FROM sessions"
+        )
+        if sessions is None:
+            rows = self._db.execute(query).fetchall()
+        else:
+            rows = []
+            # Stay below SQLite's limit on query parameters
+            for i in range(0, len(sessions), 500):
+                chunk = sessions[i : i + 500]
+                rows.extend(
+                    self._db.execute(
+                        f"{query} WHERE messagesession IN"
+                        f" ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        return {row[0]: SessionWatermark(*row[:6], dirty=bool(row[6])) for row in rows}
+
+    async def dirty_sessions(self) -> List[SessionWatermark]:
+        """
+        Return the watermarks of the sessions marked dirty.
+        """
+        return await self._run(self._dirty_sync)
+
+    def _dirty_sync(self):
+        rows = self._db.execute(
+            "SELECT messagesession, domain, user, last_timestamp, last_message_id,"
+            " message_count FROM sessions WHERE dirty = 1"
+        ).fetchall()
+        return [SessionWatermark(*row) for row in rows]
+
+    async def mark_dirty(self, sessions: Iterable[Tuple[str, str, str]]):
+        """
+        Flag sessions as changed. Unknown sessions are added.
+
+        :param sessions: (messagesession, domain, user) tuples.
+        """
+        await self._run(self._mark_dirty_sync, list(sessions))
+
+    def _mark_dirty_sync(self, sessions: List[Tuple[str, str, str]]):
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO sessions (messagesession, domain, user, dirty, dirtied_at)"
+                " VALUES (?, ?, ?, 1, ?)"
+                " ON CONFLICT (messagesession) DO UPDATE SET"
+                " dirty = 1, dirtied_at = excluded.dirtied_at",
+                [session + (now,) for session in sessions],
+            )
+
+    async def save(
+        self,
+        watermark: SessionWatermark,
+        session: Optional[dict],
+        messages: List[dict],
+        started: float,
+    ) -> int:
+        """
+        Store new messages of a session and advance its watermark in one transaction.
+
+        The dirty flag is only cleared if the session was not marked dirty again after
+        `started`, so an event that arrives during the fetch is not lost.
+
+        :param watermark: The session's watermark, already advanced by the caller.
+        :param session: Optional session record from the session listing.
+        :param messages: Messages fetched since the previous watermark.
+        :param started: time.time() when the fetch started.
+        :return: The number of messages that were not already stored.
+        """
+        return await self._run(self._save_sync, watermark, session, messages, started)
+
+    def _save_sync(self, watermark, session, messages, started) -> int:
+        dumps = self.codec.dumps
+        rows = [
+            (
+                watermark.messagesession,
+                self.message_id(message),
+                _epoch(message.get("timestamp")),
+                dumps(message),
+            )
+            for message in messages
+        ]
+        with self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO messages (messagesession, id, timestamp, record)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            added = self._db.total_changes - before
+            watermark.message_count += added
+            self._db.execute(
+                "INSERT INTO sessions (messagesession, domain, user, last_timestamp,"
+                " last_message_id, message_count, dirty, synced_at, record)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)"
+                " ON CONFLICT (messagesession) DO UPDATE SET"
+                " last_timestamp = excluded.last_timestamp,"
+                " last_message_id = excluded.last_message_id,"
+                " message_count = excluded.message_count,"
+                " dirty = CASE WHEN sessions.dirtied_at IS NULL"
+                "   OR sessions.dirtied_at < ? THEN 0 ELSE sessions.dirty END,"
+                " synced_at = excluded.synced_at,"
+                " record = coalesce(excluded.record, sessions.record)",
+                (
+                    watermark.messagesession,
+                    watermark.domain,
+                    watermark.user,
+                    watermark.last_timestamp,
+                    watermark.last_message_id,
+                    watermark.message_count,
+                    started,
+                    None if session is None else dumps(session),
+                    started,
+                ),
+            )
+        return added
+
+    async def messages(
+        self, messagesession: str, limit: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Return the stored messages of a session, oldest first.
+
+        :param messagesession: The session ID.
+        :param limit: Optional. Return only the newest `limit` messages.
+        """
+        return await self._run(self._messages_sync, messagesession, limit)
+
+    def _messages_sync(self, messagesession, limit):
+        query = "SELECT record FROM messages WHERE messagesession = ?"
+        if limit is None:
+            rows = self._db.execute(
+                query + " ORDER BY timestamp, rowid", (messagesession,)
+            )
+        else:
+            rows = self._db.execute(
+                f"SELECT record FROM ({query} ORDER BY timestamp DESC, rowid DESC"
+                " LIMIT ?) ORDER BY rowid",
+                (messagesession, limit),
+            )
+        loads = self.codec.loads
+        return [loads(row[0]) for row in rows]
+
+    async def sessions(
+        self, domain: Optional[str] = None, user: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Return the stored session records, optionally for one domain or user.
+        """
+        return await self._run(self._sessions_sync, domain, user)
+
+    def _sessions_sync(self, domain, user):
+        query = "SELECT record FROM sessions WHERE record IS NOT NULL"
+        params = []
+        if domain is not None:
+            query += " AND domain = ?"
+            params.append(domain)
+        if user is not None:
+            query += " AND user = ?"
+            params.append(user)
+        loads = self.codec.loads
+        return [loads(row[0]) for row in self._db.execute(query, params)]
+
+    def message_id(self, message: dict) -> str:
+        """
+        Return a message's ID, or a digest of its content if it has none.
+        """
+        message_id = message.get("id")
+        if message_id not in (None, ""):
+            return str(message_id)
+        return hashlib.sha1(self.codec.dumps(message)).hexdigest()
+
+
+class MessageSync:
+    def __init__(
+        self,
+        message_api: MessageAPI,
+        store: MessageStore,
+        domain: str = "~",
+        user: Optional[str] = None,
+        concurrency: int = 10,
+        page_size: int = 100,
+        newest_first: bool = False,
+        log_level=logging.INFO,
+    ):
+        """
+        Mirror message sessions and their messages into a MessageStore, fetching only
+        what changed since the previous sync.
+
+        sync() pages through the session listing and compares each session's
+        "last-timestamp" with its stored watermark. Only new or changed sessions, and
+        sessions marked dirty by "message"/"messagesession" events, have their messages
+        fetched, and only the messages past the watermark are requested. sync_dirty()
+        skips the listing and syncs just the dirty sessions.
+
+        :param message_api: The MessageAPI used to list sessions and messages.
+        :param store: An open MessageStore.
+        :param domain: Domain to sync. Defaults to "~" (current domain).
+        :param user: Optional user to sync. If None, syncs every session in the domain.
+        :param concurrency: Maximum number of sessions fetched at once.
+        :param page_size: Number of sessions or messages requested per page.
+        :param newest_first: Set to True if the API lists a session's messages newest
+                             first. New messages are then read from the start until a
+                             synced one is reached, instead of from the stored count.
+        :param log_level: Logging level (default is INFO).
+        """
+        self.message_api = message_api
+        self.store = store
+        self.domain = domain
+        self.user = user
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.newest_first = newest_first
+        self._task: Optional[asyncio.Task] = None
+
+        self.passes = 0
+        self.sessions_listed = 0
+        self.sessions_synced = 0
+        self.sessions_skipped = 0
+        self.sessions_failed = 0
+        self.messages_fetched = 0
+        self.messages_added = 0
+        self.events_applied = 0
+        self.last_sync: Optional[float] = None
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("MessageSync initialized")
+
+    def attach(self, server: WebhookServer):
+        """
+        Mark sessions dirty from the "message" and "messagesession" deliveries of a
+        webhook server.
+
+        :param server: The WebhookServer receiving the subscription posts.
+        """
+        server.add_handler("message", self.handle_event)
+        server.add_handler("messagesession", self.handle_event)
+
+    async def handle_event(self, event: WebhookEvent):
+        """
+        Webhook handler that marks the event's session dirty.
+
+        :param event: The delivered event.
+        """
+        await self.mark_dirty([event.payload])
+
+    async def mark_dirty(self, records: Iterable[dict]):
+        """
+        Mark the sessions of message or session records dirty, so the next sync fetches
+        them even if the session listing has not changed.
+
+        :param records: Event payloads or API records naming a messagesession.
+        """
+        sessions = []
+        for record in records:
+            session_id = next(
+                (record[field] for field in SESSION_FIELDS if record.get(field)), None
+            )
+            if session_id is None:
+                self.logger.debug("Ignoring message event without a messagesession")
+                continue
+            sessions.append(
+                (
+                    str(session_id),
+                    str(record.get("domain") or self.domain),
+                    str(record.get("user") or self.user or "~"),
+                )
+            )
+        if sessions:
+            self.events_applied += len(sessions)
+            await self.store.mark_dirty(sessions)
+
+    async def sync(self) -> dict:
+        """
+        List the sessions and sync every one that is new, changed or dirty.
+
+        :return: Counters for this pass: listed, synced, skipped, failed and added.
+        """
+        started = time.monotonic()
+        listed = []
+        async for session in self.message_api.iter_sessions(
+            domain=self.domain, user=self.user, page_size=self.page_size
+        ):
+            if session.get("messagesession"):
+                listed.append(session)
+        watermarks = await self.store.watermarks(s["messagesession"] for s in listed)
+
+        work = []
+        for session in listed:
+            session_id = session["messagesession"]
+            watermark = watermarks.get(session_id)
+            if watermark is None:
+                watermark = SessionWatermark(
+                    session_id,
+                    str(session.get("domain") or self.domain),
+                    str(session.get("user") or self.user or "~"),
+                )
+            listed_at = _epoch(session.get("last-timestamp"))
+            if (
+                watermark.dirty
+                or listed_at is None
+                or watermark.last_timestamp is None
+                or listed_at > watermark.last_timestamp
+            ):
+                work.append((watermark, session))
+        self.sessions_listed += len(listed)
+        self.sessions_skipped += len(listed) - len(work)
+        result = await self._sync_all(work)
+        result["listed"] = len(listed)
+        result["skipped"] = len(listed) - len(work)
+        self.logger.info(
+            "Synced %d of %d message session(s), %d new message(s) in %.2fs",
+            result["synced"],
+            len(listed),
+            result["added"],
+            time.monotonic() - started,
+        )
+        return result
+
+    async def sync_dirty(self) -> dict:
+        """
+        Sync only the sessions marked dirty, without listing sessions.
+
+        :return: Counters for this pass: synced, failed and added.
+        """
+        dirty = await self.store.dirty_sessions()
+        result = await self._sync_all([(watermark, None) for watermark in dirty])
+        if dirty:
+            self.logger.info(
+                "Synced %d dirty message session(s), %d new message(s)",
+                result["synced"],
+                result["added"],
+            )
+        return result
+
+    async def sync_session(
+        self, watermark: SessionWatermark, session: Optional[dict] = None
+    ) -> int:
+        """
+        Fetch the messages of one session past its watermark and store them.
+
+        :param watermark: The session's current watermark.
+        :param session: Optional session record from the listing, stored with it.
+        :return: The number of new messages stored.
+        """
+        started = time.time()
+        if self.newest_first:
+            messages = await self._fetch_newest_first(watermark)
+        else:
+            messages = await self._fetch_from(watermark, watermark.message_count)
+            listed_at = (
+                None if session is None else _epoch(session.get("last-timestamp"))
+            )
+            if (
+                not messages
+                and watermark.message_count
+                and listed_at is not None
+                and (watermark.last_timestamp or 0) < listed_at
+            ):
+                # The session changed but nothing was found past the stored count, so
+                # messages were removed; read it again from the start
+                messages = await self._fetch_from(watermark, 0)
+        self.messages_fetched += len(messages)
+
+        for message in messages:
+            stamp = _epoch(message.get("timestamp"))
+            if stamp is not None and (
+                watermark.last_timestamp is None or stamp >= watermark.last_timestamp
+            ):
+                watermark.last_timestamp = stamp
+                watermark.last_message_id = self.store.message_id(message)
+        if session is not None:
+            listed_at = _epoch(session.get("last-timestamp"))
+            if listed_at is not None and (
+                watermark.last_timestamp is None or listed_at > watermark.last_timestamp
+            ):
+                watermark.last_timestamp = listed_at
+        added = await self.store.save(watermark, session, messages, started)
+        self.messages_added += added
+        return added
+
+    async def _fetch_from(self, watermark: SessionWatermark, offset: int) -> List[dict]:
+        messages = []
+        async for message in self._iter_messages(watermark, offset):
+            messages.append(message)
+        return messages
+
+    async def _fetch_newest_first(self, watermark: SessionWatermark) -> List[dict]:
+        messages = []
+        async for message in self._iter_messages(watermark, 0):
+            if watermark.last_message_id is not None and (
+                self.store.message_id(message) == watermark.last_message_id
+            ):
+                break
+            stamp = _epoch(message.get("timestamp"))
+            if (
+                stamp is not None
+                and watermark.last_timestamp is not None
+                and stamp < watermark.last_timestamp
+            ):
+                break
+            messages.append(message)
+        messages.reverse()
+        return messages
+
+    async def _iter_messages(self, watermark: SessionWatermark, offset: int):
+        while True:
+            page = await self.message_api.get_messages(
+                messagesession=watermark.messagesession,
+                domain=watermark.domain,
+                user=watermark.user,
+                limit=self.page_size,
+                start=offset,
+            )
+            for message in page or ():
+                yield message
+            if not page or len(page) < self.page_size:
+                return
+            offset += len(page)
+
+    async def _sync_all(self, work: List[Tuple[SessionWatermark, Optional[dict]]]):
+        result = {"synced": 0, "failed": 0, "added": 0}
+
+        async def sync_one(item):
+            return await self.sync_session(*item)
+
+        async for outcome in run_bounded(work, sync_one, self.concurrency):
+            if outcome.ok:
+                result["synced"] += 1
+                result["added"] += outcome.result
+            else:
+                result["failed"] += 1
+                self.logger.warning(
+                    f"Failed to sync message session "
+                    f"{outcome.item[0].messagesession}: {outcome.error}"
+                )
+        self.sessions_synced += result["synced"]
+        self.sessions_failed += result["failed"]
+        self.passes += 1
+        self.last_sync = time.time()
+        return result
+
+    def start(self, interval: float = 5.0, full_interval: float = 3600.0):
+        """
+        Start a background task that syncs dirty sessions every `interval` seconds and
+        runs a full sync() every `full_interval` seconds.
+
+        :param interval: Seconds between dirty-session passes.
+        :param full_interval: Seconds between full passes, which also catch sessions
+                              whose events were missed.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop(interval, full_interval))
+
+    async def stop(self):
+        """
+        Stop the background sync task.
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self, interval: float, full_interval: float):
+        next_full = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() >= next_full:
+                    next_full = time.monotonic() + full_interval
+                    await self.sync()
+                else:
+                    await self.sync_dirty()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Failed to sync message sessions: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        """
+        Return sync counters.
+        """
+        return {
+            "passes": self.passes,
+            "sessions_listed": self.sessions_listed,
+            "sessions_synced": self.sessions_synced,
+            "sessions_skipped": self.sessions_skipped,
+            "sessions_failed": self.sessions_failed,
+            "messages_fetched": self.messages_fetched,
+            "messages_added": self.messages_added,
+            "events_applied": self.events_applied,
+            "last_sync": self.last_sync,
+        }
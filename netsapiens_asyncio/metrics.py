@@ -0,0 +1,499 @@
+import bisect
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+import aiohttp
+from aiohttp import web
+
+# Path segments followed by an identifier, and the placeholder used for it
+_COLLECTIONS = {
+    "domains": "{domain}",
+    "users": "{user}",
+    "messagesessions": "{messagesession}",
+    "calls": "{callid}",
+    "subscriptions": "{id}",
+}
+# Segments that follow a collection but are not identifiers
+_STATIC_SEGMENTS = {"count", "messages", "calls", "messagesessions", "users"}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@lru_cache(maxsize=4096)
+def endpoint_template(url: str) -> str:
+    """
+    Reduce a request URL to its endpoint template, e.g.
+    "https://api.example.com/ns-api/v2/domains/acme/users/100/calls" becomes
+    "/ns-api/v2/domains/{domain}/users/{user}/calls". Keeps metric label cardinality
+    independent of the number of domains, users and IDs.
+    """
+    segments = urlsplit(url).path.split("/")
+    for i in range(1, len(segments)):
+        placeholder = _COLLECTIONS.get(segments[i - 1])
+        if placeholder and segments[i] and segments[i] not in _STATIC_SEGMENTS:
+            segments[i] = placeholder
+    return "/".join(segments)
+
+
+class RequestEvent:
+    __slots__ = (
+        "method",
+        "url",
+        "endpoint",
+        "group",
+        "action",
+        "attempt",
+        "started",
+        "status",
+        "latency",
+        "bytes_sent",
+        "bytes_received",
+        "limiter_wait",
+        "connection_reused",
+        "error",
+        "streamed",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        group: str,
+        action: str,
+        attempt: int = 1,
+        streamed: bool = False,
+    ):
+        """
+        Describes one HTTP request attempt. Passed to hooks at start and at end; the
+        response fields are filled in by the time on_request_end() is called.
+
+        :param method: HTTP method.
+        :param url: Full request URL.
+        :param group: Endpoint group used for rate limiting.
+        :param action: Short description of the operation.
+        :param attempt: 1 for the first attempt, incremented on each retry.
+        :param streamed: True for requests made through stream_request().
+        """
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.group = group
+        self.action = action
+        self.attempt = attempt
+        self.streamed = streamed
+        self.started = time.perf_counter()
+        self.status: Optional[int] = None
+        self.latency: Optional[float] = None
+        self.bytes_sent: Optional[int] = None
+        self.bytes_received: Optional[int] = None
+        self.limiter_wait = 0.0
+        self.connection_reused: Optional[bool] = None
+        self.error: Optional[BaseException] = None
+
+    def __repr__(self):
+        return (
+            f"RequestEvent({self.method} {self.endpoint}, status={self.status}, "
+            f"latency={self.latency}, attempt={self.attempt})"
+        )
+
+
+class TokenEvent:
+    __slots__ = ("grant", "status", "latency", "error")
+
+    def __init__(
+        self,
+        grant: str,
+        status: Optional[int],
+        latency: float,
+        error: Optional[BaseException] = None,
+    ):
+        """
+        Describes one request to the token endpoint.
+
+        :param grant: "password" or "refresh_token".
+        :param status: HTTP status, or None if no response was received.
+        :param latency: Seconds the request took.
+        :param error: The exception raised, if the request failed.
+        """
+        self.grant = grant
+        self.status = status
+        self.latency = latency
+        self.error = error
+
+
+class MetricsHook:
+    """
+    Base class for instrumentation hooks. Override the methods you need; the defaults
+    do nothing. Hooks are called synchronously on the event loop and must not block.
+    """
+
+    def on_request_start(self, event: RequestEvent):
+        pass
+
+    def on_request_end(self, event: RequestEvent):
+        pass
+
+    def on_retry(self, event: RequestEvent, delay: float):
+        pass
+
+    def on_token(self, event: TokenEvent):
+        pass
+
+    def on_connection(self, reused: bool):
+        pass
+
+
+class Instrumentation:
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        """
+        Dispatches request, retry, connection and token events to registered hooks.
+
+        Callers check `hooks` before building an event, so with no hooks registered the
+        cost is a single attribute test per request. A hook that raises is logged and
+        does not affect the request.
+
+        :param logger: Logger used to report failing hooks.
+        """
+        self.hooks: List[MetricsHook] = []
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+
+    def add_hook(self, hook: MetricsHook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: MetricsHook):
+        self.hooks.remove(hook)
+
+    def request_start(self, event: RequestEvent):
+        for hook in self.hooks:
+            try:
+                hook.on_request_start(event)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook {hook!r} failed: {e}")
+
+    def request_end(self, event: RequestEvent, error: Optional[BaseException]):
+        event.latency = time.perf_counter() - event.started
+        event.error = error
+        for hook in self.hooks:
+            try:
+                hook.on_request_end(event)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook {hook!r} failed: {e}")
+
+    def retry(self, event: RequestEvent, delay: float):
+        for hook in self.hooks:
+            try:
+                hook.on_retry(event, delay)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook {hook!r} failed: {e}")
+
+    def token(self, event: TokenEvent):
+        for hook in self.hooks:
+            try:
+                hook.on_token(event)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook {hook!r} failed: {e}")
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Return an aiohttp TraceConfig reporting whether each request reused a pooled
+        connection. Requests carry their RequestEvent as trace_request_ctx.
+        """
+        trace = aiohttp.TraceConfig()
+
+        async def created(session, context, params):
+            self._connection(context.trace_request_ctx, False)
+
+        async def reused(session, context, params):
+            self._connection(context.trace_request_ctx, True)
+
+        trace.on_connection_create_end.append(created)
+        trace.on_connection_reuseconn.append(reused)
+        return trace
+
+    def _connection(self, event: Optional[RequestEvent], reused: bool):
+        if event is None or not self.hooks:
+            return
+        event.connection_reused = reused
+        for hook in self.hooks:
+            try:
+                hook.on_connection(reused)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook {hook!r} failed: {e}")
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Fixed-bucket histogram of observed values.
+
+        :param buckets: Sorted upper bounds of the buckets; an overflow bucket is added.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """
+        Estimate a percentile by linear interpolation within its bucket.
+
+        :param fraction: The percentile as a fraction, e.g. 0.99.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    # Overflow bucket has no upper bound
+                    return lower
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Return (upper bound, cumulative count) pairs, ending with "+Inf".
+        """
+        total = 0
+        pairs = []
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            total += bucket_count
+            pairs.append((_format_value(bound), total))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+
+class MetricsAggregator(MetricsHook):
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        In-memory metrics hook: latency histograms per method, endpoint and status, and
+        counters for retries, errors, bytes, connections, token requests and limiter waits.
+
+        :param buckets: Histogram bucket upper bounds in seconds.
+        """
+        self.buckets = tuple(buckets)
+        self.requests: Dict[Tuple[str, str, str], Histogram] = {}
+        self.errors: Dict[Tuple[str, str, str], int] = {}
+        self.retries: Dict[Tuple[str, str], int] = {}
+        self.bytes_sent: Dict[Tuple[str, str], int] = {}
+        self.bytes_received: Dict[Tuple[str, str], int] = {}
+        self.limiter_wait: Dict[str, Histogram] = {}
+        self.tokens: Dict[Tuple[str, str], Histogram] = {}
+        self.connections = {"new": 0, "reused": 0}
+        self.in_flight = 0
+
+    def on_request_start(self, event: RequestEvent):
+        self.in_flight += 1
+
+    def on_request_end(self, event: RequestEvent):
+        self.in_flight -= 1
+        route = (event.method, event.endpoint)
+        status = str(event.status) if event.status is not None else "none"
+        key = (event.method, event.endpoint, status)
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram(self.buckets)
+        histogram.observe(event.latency)
+
+        if event.error is not None:
+            error_key = route + (type(event.error).__name__,)
+            self.errors[error_key] = self.errors.get(error_key, 0) + 1
+        if event.bytes_sent:
+            self.bytes_sent[route] = self.bytes_sent.get(route, 0) + event.bytes_sent
+        if event.bytes_received:
+            self.bytes_received[route] = (
+                self.bytes_received.get(route, 0) + event.bytes_received
+            )
+        wait = self.limiter_wait.get(event.group)
+        if wait is None:
+            wait = self.limiter_wait[event.group] = Histogram(self.buckets)
+        wait.observe(event.limiter_wait)
+
+    def on_retry(self, event: RequestEvent, delay: float):
+        route = (event.method, event.endpoint)
+        self.retries[route] = self.retries.get(route, 0) + 1
+
+    def on_token(self, event: TokenEvent):
+        key = (event.grant, "error" if event.error is not None else "ok")
+        histogram = self.tokens.get(key)
+        if histogram is None:
+            histogram = self.tokens[key] = Histogram(self.buckets)
+        histogram.observe(event.latency)
+
+    def on_connection(self, reused: bool):
+        self.connections["reused" if reused else "new"] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Return a JSON-serialisable summary with request counts and p50/p99 latency per
+        method, endpoint and status.
+        """
+        return {
+            "requests": [
+                {
+                    "method": method,
+                    "endpoint": endpoint,
+                    "status": status,
+                    "count": histogram.count,
+                    "mean": histogram.mean,
+                    "p50": histogram.percentile(0.50),
+                    "p99": histogram.percentile(0.99),
+                }
+                for (method, endpoint, status), histogram in self.requests.items()
+            ],
+            "errors": [
+                {"method": m, "endpoint": e, "type": t, "count": n}
+                for (m, e, t), n in self.errors.items()
+            ],
+            "retries": sum(self.retries.values()),
+            "bytes_sent": sum(self.bytes_sent.values()),
+            "bytes_received": sum(self.bytes_received.values()),
+            "connections": dict(self.connections),
+            "in_flight": self.in_flight,
+            "limiter_wait_p99": {
+                group: histogram.percentile(0.99)
+                for group, histogram in self.limiter_wait.items()
+            },
+            "token_requests": {
+                f"{grant}:{result}": histogram.count
+                for (grant, result), histogram in self.tokens.items()
+            },
+        }
+
+
+_LABEL_ESCAPE = re.compile(r'[\\"\n]')
+
+
+def _escape(value: str) -> str:
+    return _LABEL_ESCAPE.sub(
+        lambda m: {"\\": "\\\\", '"': '\\"', "\n": "\\n"}[m.group()], value
+    )
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+def _format_value(value: float) -> str:
+    return f"{value:g}"
+
+
+def render_prometheus(aggregator: MetricsAggregator, prefix: str = "netsapiens") -> str:
+    """
+    Render the aggregator in the Prometheus text exposition format (version 0.0.4).
+
+    :param aggregator: The MetricsAggregator to export.
+    :param prefix: Prefix for every metric name.
+    :return: The exposition text.
+    """
+    lines = []
+
+    def histogram_lines(name: str, help_text: str, series):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} histogram")
+        for labels, histogram in series:
+            for bound, count in histogram.cumulative():
+                lines.append(
+                    f"{prefix}_{name}_bucket{{{_labels(**labels, le=bound)}}} {count}"
+                )
+            lines.append(f"{prefix}_{name}_sum{{{_labels(**labels)}}} {histogram.sum}")
+            lines.append(
+                f"{prefix}_{name}_count{{{_labels(**labels)}}} {histogram.count}"
+            )
+
+    def counter_lines(name: str, help_text: str, series):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        for labels, value in series:
+            lines.append(f"{prefix}_{name}{{{_labels(**labels)}}} {value}")
+
+    histogram_lines(
+        "request_duration_seconds",
+        "Duration of API requests.",
+        (
+            ({"method": m, "endpoint": e, "status": s}, h)
+            for (m, e, s), h in aggregator.requests.items()
+        ),
+    )
+    counter_lines(
+        "request_errors_total",
+        "API requests that raised an error.",
+        (
+            ({"method": m, "endpoint": e, "type": t}, n)
+            for (m, e, t), n in aggregator.errors.items()
+        ),
+    )
+    counter_lines(
+        "request_retries_total",
+        "API requests retried.",
+        (({"method": m, "endpoint": e}, n) for (m, e), n in aggregator.retries.items()),
+    )
+    counter_lines(
+        "request_bytes_sent_total",
+        "Request body bytes sent.",
+        (
+            ({"method": m, "endpoint": e}, n)
+            for (m, e), n in aggregator.bytes_sent.items()
+        ),
+    )
+    counter_lines(
+        "response_bytes_received_total",
+        "Response body bytes received.",
+        (
+            ({"method": m, "endpoint": e}, n)
+            for (m, e), n in aggregator.bytes_received.items()
+        ),
+    )
+    counter_lines(
+        "connections_total",
+        "Connections used by requests, new or reused from the pool.",
+        (({"kind": kind}, n) for kind, n in aggregator.connections.items()),
+    )
+    histogram_lines(
+        "limiter_wait_seconds",
+        "Time requests waited for the rate limiter.",
+        (({"group": g}, h) for g, h in aggregator.limiter_wait.items()),
+    )
+    histogram_lines(
+        "token_request_duration_seconds",
+        "Duration of token endpoint requests.",
+        (({"grant": g, "result": r}, h) for (g, r), h in aggregator.tokens.items()),
+    )
+    lines.append(f"# HELP {prefix}_requests_in_flight API requests in progress.")
+    lines.append(f"# TYPE {prefix}_requests_in_flight gauge")
+    lines.append(f"{prefix}_requests_in_flight {aggregator.in_flight}")
+    return "\n".join(lines) + "\n"
+
+
+def prometheus_handler(aggregator: MetricsAggregator, prefix: str = "netsapiens"):
+    """
+    Return an aiohttp.web handler serving the aggregator as Prometheus text, e.g.
+    `app.router.add_get("/metrics", prometheus_handler(aggregator))`.
+    """
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(
+            text=render_prometheus(aggregator, prefix),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+    return handler
@@ -0,0 +1,240 @@
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+
+def parse_datetime(value: Any) -> Any:
+    """
+    Parse an API timestamp such as "2024-12-09T21:27:11+00:00" or "2024-12-09 21:27:11".
+
+    Naive timestamps are assumed to be UTC. Values that cannot be parsed are returned
+    unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_int(value: Any) -> Any:
+    """
+    Convert a numeric string to int. Values that cannot be converted are returned unchanged.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class _FieldAccessor:
+    __slots__ = ("slot", "convert")
+
+    def __init__(self, slot: str, convert: Optional[Callable[[Any], Any]]):
+        self.slot = slot
+        self.convert = convert
+
+    def __get__(self, record, owner):
+        if record is None:
+            return self
+        value = getattr(record, self.slot, None)
+        if value is None or self.convert is None:
+            return value
+        return self.convert(value)
+
+
+class Record(Mapping):
+    """
+    Base class for compact, read-only API records.
+
+    Subclasses declare FIELDS, a mapping of attribute name to (API key, converter), and
+    `__slots__ = tuple("_" + name for name in FIELDS)`. Known fields are stored in
+    slots holding the raw API values, so records carry no per-instance dict and no
+    copies of the hyphenated key strings. Converters (e.g. timestamp parsing) run lazily
+    on attribute access. Keys not listed in FIELDS are kept in a small overflow dict.
+
+    Records are Mappings keyed by the original API keys, so `record["call-id"]`,
+    `record.get(...)`, `dict(record)` and iteration keep working.
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS: Dict[str, tuple] = {}
+    # Attribute names whose string values are interned, for low-cardinality fields
+    INTERN: tuple = ()
+    _KEY_TO_SLOT: Dict[str, str] = {}
+    _SLOT_TO_KEY: Dict[str, str] = {}
+    _INTERN_SLOTS: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._KEY_TO_SLOT = {}
+        cls._SLOT_TO_KEY = {}
+        for name, (key, convert) in cls.FIELDS.items():
+            slot = "_" + name
+            cls._KEY_TO_SLOT[sys.intern(key)] = slot
+            cls._SLOT_TO_KEY[slot] = key
+            setattr(cls, name, _FieldAccessor(slot, convert))
+        cls._INTERN_SLOTS = frozenset("_" + name for name in cls.INTERN)
+
+    def __init__(self, data: Optional[dict] = None):
+        """
+        Build a record from an API dictionary.
+
+        :param data: The decoded API object.
+        """
+        self._extra = None
+        if data:
+            self._load(data)
+
+    def _load(self, data: dict):
+        key_to_slot = self._KEY_TO_SLOT
+        intern_slots = self._INTERN_SLOTS
+        extra = None
+        for key, value in data.items():
+            slot = key_to_slot.get(key)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[sys.intern(key)] = value
+                continue
+            if slot in intern_slots and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, slot, value)
+        self._extra = extra
+
+    @classmethod
+    def from_list(cls, items: Iterable[dict]) -> List["Record"]:
+        """
+        Decode a list of API dictionaries into records.
+
+        :param items: The decoded API objects.
+        :return: A list of records.
+        """
+        new = object.__new__
+        records = []
+        append = records.append
+        for item in items:
+            record = new(cls)
+            record._load(item)
+            append(record)
+        return records
+
+    @classmethod
+    def decode(cls, result: Union[dict, list, None]):
+        """
+        Decode an API result that is either a single object or a list of objects.
+
+        :param result: The decoded API response.
+        :return: A record, a list of records, or the input unchanged if it is neither.
+        """
+        if isinstance(result, list):
+            return cls.from_list(result)
+        if isinstance(result, dict):
+            return cls(result)
+        return result
+
+    def __getitem__(self, key: str) -> Any:
+        slot = self._KEY_TO_SLOT.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for slot, key in self._SLOT_TO_KEY.items():
+            if hasattr(self, slot):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> dict:
+        """
+        Return the record as a plain dictionary with the original API keys and values.
+        """
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._extra = None
+        self._load(state)
+
+
+class CallRecord(Record):
+    FIELDS = {
+        "call_id": ("call-id", None),
+        "orig_call_id": ("call-orig-call-id", None),
+        "term_call_id": ("call-term-call-id", None),
+        "orig_domain": ("call-orig-domain", None),
+        "orig_user": ("call-orig-user", None),
+        "orig_caller_id": ("call-orig-caller-id", None),
+        "term_domain": ("call-term-domain", None),
+        "term_user": ("call-term-user", None),
+        "term_caller_id": ("call-term-caller-id", None),
+        "dial_rule_application": ("dial-rule-application", None),
+        "status": ("call-status", None),
+        "start_datetime": ("call-start-datetime", parse_datetime),
+        "answer_datetime": ("call-answer-datetime", parse_datetime),
+        "domain": ("domain", None),
+        "user": ("user", None),
+    }
+    INTERN = ("orig_domain", "term_domain", "status", "domain", "dial_rule_application")
+    __slots__ = tuple("_" + name for name in FIELDS)
+
+
+class MessageRecord(Record):
+    FIELDS = {
+        "id": ("id", None),
+        "messagesession": ("messagesession", None),
+        "domain": ("domain", None),
+        "user": ("user", None),
+        "type": ("type", None),
+        "direction": ("direction", None),
+        "message": ("message", None),
+        "from_number": ("from-number", None),
+        "destination": ("destination", None),
+        "mime_type": ("mime-type", None),
+        "size": ("size", parse_int),
+        "status": ("status", None),
+        "timestamp": ("timestamp", parse_datetime),
+        "last_message": ("last-message", None),
+        "last_timestamp": ("last-timestamp", parse_datetime),
+    }
+    INTERN = ("domain", "type", "direction", "mime_type", "status")
+    __slots__ = tuple("_" + name for name in FIELDS)
+
+
+class SubscriptionRecord(Record):
+    FIELDS = {
+        "id": ("id", None),
+        "model": ("model", None),
+        "post_url": ("post-url", None),
+        "subscription_geo_support": ("subscription-geo-support", None),
+        "reseller": ("reseller", None),
+        "domain": ("domain", None),
+        "user": ("user", None),
+        "preferred_server": ("preferred-server", None),
+        "status": ("status", None),
+        "error_count": ("error-count", parse_int),
+        "posts_count": ("posts-count", parse_int),
+        "created_datetime": ("subscription-creation-datetime", parse_datetime),
+        "expires_datetime": ("subscription-expires-datetime", parse_datetime),
+    }
+    INTERN = ("model", "reseller", "domain", "status", "subscription_geo_support")
+    __slots__ = tuple("_" + name for name in FIELDS)
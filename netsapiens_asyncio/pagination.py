@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+_DONE = object()
+
+
+class Paginator:
+    def __init__(
+        self,
+        fetch_page: Callable[[int, int], Awaitable[List[Any]]],
+        page_size: int = 100,
+        prefetch: int = 2,
+        max_items: Optional[int] = None,
+    ):
+        """
+        Iterate over an offset/limit paginated endpoint with `async for`.
+
+        Pages are fetched by a background task while the caller consumes the current
+        page. At most `prefetch` pages are buffered ahead of the caller, so memory use
+        stays bounded no matter how large the result set is. Iteration ends at the
+        first page shorter than `page_size`.
+
+        :param fetch_page: Coroutine function called as fetch_page(offset, limit) that
+                           returns one page as a list.
+        :param page_size: Number of items requested per page.
+        :param prefetch: Number of pages fetched ahead of the caller.
+        :param max_items: Optional maximum number of items to yield in total.
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1.")
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1.")
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.max_items = max_items
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self.items()
+
+    async def items(self) -> AsyncIterator[Any]:
+        """
+        Yield items one at a time across all pages.
+        """
+        async for page in self.pages():
+            for item in page:
+                yield item
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        """
+        Yield each page as a list.
+        """
+        await self.close()
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        self._task = asyncio.ensure_future(self._produce(queue))
+        try:
+            while True:
+                page = await queue.get()
+                if page is _DONE:
+                    return
+                if isinstance(page, BaseException):
+                    raise page
+                yield page
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        Stop the background fetch task, if it is running.
+        """
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _produce(self, queue: asyncio.Queue):
+        offset = 0
+        try:
+            while True:
+                limit = self.page_size
+                if self.max_items is not None:
+                    limit = min(limit, self.max_items - offset)
+                    if limit <= 0:
+                        break
+                page = await self.fetch_page(offset, limit)
+                if page:
+                    await queue.put(page)
+                if not page or len(page) < limit:
+                    break
+                offset += len(page)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(_DONE)
@@ -0,0 +1,579 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from .callcache import REMOVE_VALUES
+from .log import get_logger
+from .webhook import WebhookEvent, WebhookServer
+
+# Field names tried, in order, for each part of a presence or agent record. Pass
+# overrides to PresenceIndex if your events use other names.
+PRESENCE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "domain": ("domain", "presence-domain", "callqueue-agent-domain"),
+    "user": ("user", "presence-user", "callqueue-agent-user", "agent"),
+    "queue": ("callqueue", "queue", "queue_name", "callqueue-name"),
+    "agent_state": (
+        "callqueue-agent-status",
+        "agent-status",
+        "entry_status",
+        "status",
+        "state",
+    ),
+    "presence_state": ("presence", "presence-status", "status", "state"),
+}
+MODELS = ("presence", "agent")
+
+EntityKey = Tuple[str, str, str, str]
+
+
+def _first(record: dict, fields: Tuple[str, ...]) -> Optional[str]:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+class PresenceEntry:
+    __slots__ = ("model", "domain", "user", "queue", "state", "version", "record")
+
+    def __init__(
+        self,
+        model: str,
+        domain: str,
+        user: str,
+        queue: str,
+        state: Optional[str],
+        version: int,
+        record: dict,
+    ):
+        """
+        Current state of one user ("presence") or one queue agent ("agent").
+
+        :param model: "presence" or "agent".
+        :param domain: The user's domain.
+        :param user: The user (extension).
+        :param queue: The call queue for agent entries, "" for presence.
+        :param state: The presence or agent status, e.g. "available".
+        :param version: Number of changes applied to this entity so far.
+        :param record: The latest event payload.
+        """
+        self.model = model
+        self.domain = domain
+        self.user = user
+        self.queue = queue
+        self.state = state
+        self.version = version
+        self.record = record
+
+    @property
+    def key(self) -> EntityKey:
+        return (self.model, self.domain, self.user, self.queue)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (
+            f"PresenceEntry(model={self.model!r}, domain={self.domain!r}, "
+            f"user={self.user!r}, queue={self.queue!r}, state={self.state!r}, "
+            f"version={self.version})"
+        )
+
+
+class PresenceChange:
+    __slots__ = (
+        "sequence",
+        "action",
+        "model",
+        "domain",
+        "user",
+        "queue",
+        "state",
+        "previous_state",
+        "version",
+        "changes",
+    )
+
+    def __init__(
+        self,
+        sequence: int,
+        action: str,
+        entry: PresenceEntry,
+        previous_state: Optional[str],
+        changes: Dict[str, tuple],
+    ):
+        """
+        One diff published on the change feed.
+
+        :param sequence: Index-wide change number. A gap means a feed dropped changes.
+        :param action: "added", "updated" or "removed".
+        :param entry: The entity after the change.
+        :param previous_state: The state before the change (None when added).
+        :param changes: {field: (old value, new value)} for the fields that changed.
+        """
+        self.sequence = sequence
+        self.action = action
+        self.model = entry.model
+        self.domain = entry.domain
+        self.user = entry.user
+        self.queue = entry.queue
+        self.state = entry.state
+        self.previous_state = previous_state
+        self.version = entry.version
+        self.changes = changes
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        queue = f" in {self.queue}" if self.queue else ""
+        return (
+            f"PresenceChange({self.action} {self.model} {self.user}@{self.domain}"
+            f"{queue}: {self.previous_state!r} -> {self.state!r}, "
+            f"version={self.version})"
+        )
+
+
+class PresenceFeed:
+    def __init__(
+        self,
+        index: "PresenceIndex",
+        model: Optional[str],
+        domain: Optional[str],
+        queue: Optional[str],
+        max_pending: int,
+    ):
+        """
+        Change feed of a PresenceIndex. Use PresenceIndex.subscribe() to create one.
+
+        Changes wait in a bounded buffer until the subscriber reads them. When the
+        buffer is full the oldest change is dropped and counted in `dropped`, so a slow
+        subscriber never holds up the index or the other subscribers. After drops, call
+        PresenceIndex.snapshot() to resynchronise.
+        """
+        self.index = index
+        self.model = model
+        self.domain = domain
+        self.queue = queue
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.closed = False
+        self._pending: Deque[PresenceChange] = deque()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def matches(self, change: PresenceChange) -> bool:
+        return (self.model is None or change.model == self.model) and (
+            self.queue is None or change.queue == self.queue
+        )
+
+    def _push(self, change: PresenceChange):
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(change)
+        self._wakeup.set()
+
+    async def get(self) -> PresenceChange:
+        """
+        Wait for and return the next change. Raises StopAsyncIteration once closed
+        and drained.
+        """
+        while not self._pending:
+            if self.closed:
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return self._pending.popleft()
+
+    def get_nowait(self) -> List[PresenceChange]:
+        """
+        Return all pending changes without waiting.
+        """
+        changes = list(self._pending)
+        self._pending.clear()
+        return changes
+
+    def close(self):
+        """
+        Unsubscribe. Changes already pending can still be read.
+        """
+        if not self.closed:
+            self.closed = True
+            self.index._unsubscribe(self)
+            self._wakeup.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> PresenceChange:
+        return await self.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PresenceIndex:
+    def __init__(
+        self,
+        field_map: Optional[Dict[str, Tuple[str, ...]]] = None,
+        ignore_fields: Iterable[str] = (),
+        removed_versions: int = 10000,
+        log_level=logging.INFO,
+    ):
+        """
+        In-memory index of user presence and call queue agent state kept current from
+        "presence" and "agent" subscription events.
+
+        Entities are kept by (model, domain, user, queue) with secondary indexes by
+        domain, user, state and queue, so questions such as "who is available in queue
+        X" are set lookups instead of API requests. Every entity has a version that
+        increases with each change. Events that change nothing do not bump the version
+        and are not published, so change feeds only carry diffs.
+
+        :param field_map: Optional overrides of PRESENCE_FIELDS.
+        :param ignore_fields: Payload fields left out of diffs, e.g. timestamps that
+                              change on every event.
+        :param removed_versions: Number of removed entities whose last version is
+                                 remembered, so one that comes back keeps counting up.
+                                 The oldest are forgotten first.
+        :param log_level: Logging level (default is INFO).
+        """
+        self.fields = dict(PRESENCE_FIELDS)
+        self.fields.update(field_map or {})
+        self.ignore_fields = set(ignore_fields)
+        self.removed_versions = removed_versions
+
+        self._entries: Dict[EntityKey, PresenceEntry] = {}
+        self._index: Dict[tuple, Set[EntityKey]] = {}
+        # Last versions of removed entities, so a returning entity keeps counting up
+        self._versions: "OrderedDict[EntityKey, int]" = OrderedDict()
+        # Feeds by domain filter; None holds the feeds watching every domain
+        self._feeds: Dict[Optional[str], Set[PresenceFeed]] = {}
+        self.sequence = 0
+
+        self.events_applied = 0
+        self.unchanged = 0
+        self.ignored = 0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("PresenceIndex initialized")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def attach(self, server: WebhookServer):
+        """
+        Feed the index from the "presence" and "agent" deliveries of a webhook server.
+
+        :param server: The WebhookServer receiving the subscription posts.
+        """
+        for model in MODELS:
+            server.add_handler(model, self.handle_event)
+
+    async def handle_event(self, event: WebhookEvent):
+        """
+        Webhook handler that applies a presence or agent event.
+
+        :param event: The delivered event.
+        """
+        self.apply(event.model, event.payload)
+
+    def apply(self, model: str, record: dict) -> Optional[PresenceChange]:
+        """
+        Insert, update or remove an entity from an event or API record.
+
+        :param model: "presence" or "agent".
+        :param record: The event payload. A record with "remove" set to "yes" removes
+                       the entity.
+        :return: The published change, or None if nothing changed.
+        """
+        if model not in MODELS:
+            raise ValueError(
+                f"Invalid model '{model}'. Must be one of: {', '.join(MODELS)}"
+            )
+        domain = _first(record, self.fields["domain"])
+        user = _first(record, self.fields["user"])
+        if user is not None and domain is None and "@" in user:
+            user, domain = user.split("@", 1)
+        if domain is None or user is None:
+            self.ignored += 1
+            self.logger.debug(f"Ignoring {model} event without a domain and user")
+            return None
+        queue = ""
+        if model == "agent":
+            queue = _first(record, self.fields["queue"]) or ""
+        key = (model, domain, user, queue)
+        self.events_applied += 1
+
+        if str(record.get("remove", "")).lower() in REMOVE_VALUES:
+            return self._remove(key)
+        state = _first(record, self.fields[f"{model}_state"])
+        return self._upsert(key, state, record)
+
+    def get(
+        self, model: str, domain: str, user: str, queue: str = ""
+    ) -> Optional[PresenceEntry]:
+        """
+        Return one entity, or None if it is unknown.
+        """
+        return self._entries.get((model, domain, user, queue))
+
+    def find(
+        self,
+        model: Optional[str] = None,
+        domain: Optional[str] = None,
+        user: Optional[str] = None,
+        state: Optional[str] = None,
+        queue: Optional[str] = None,
+    ) -> List[PresenceEntry]:
+        """
+        Return the entities matching every given filter.
+
+        The most specific secondary index for the filters is read directly, so e.g.
+        find("agent", domain="example.com", queue="sales", state="available") costs
+        the size of the answer, not the size of the index.
+
+        :param model: Optional "presence" or "agent".
+        :param domain: Optional domain.
+        :param user: Optional user (requires domain).
+        :param state: Optional presence or agent status.
+        :param queue: Optional call queue (requires domain; implies model "agent").
+        """
+        keys = self._lookup(model, domain, user, state, queue)
+        return [self._entries[key] for key in keys]
+
+    def count(
+        self,
+        model: Optional[str] = None,
+        domain: Optional[str] = None,
+        user: Optional[str] = None,
+        state: Optional[str] = None,
+        queue: Optional[str] = None,
+    ) -> int:
+        """
+        Return the number of entities find() would return with the same filters.
+        """
+        return len(self._lookup(model, domain, user, state, queue))
+
+    def snapshot(
+        self,
+        model: Optional[str] = None,
+        domain: Optional[str] = None,
+        queue: Optional[str] = None,
+    ) -> dict:
+        """
+        Return the matching entities as dicts with the current change sequence.
+
+        Subscribe first and then take the snapshot: changes on the feed with a
+        sequence above the snapshot's are newer than it.
+        """
+        entries = self.find(model, domain, queue=queue)
+        return {
+            "sequence": self.sequence,
+            "entries": [entry.to_dict() for entry in entries],
+        }
+
+    def subscribe(
+        self,
+        model: Optional[str] = None,
+        domain: Optional[str] = None,
+        queue: Optional[str] = None,
+        max_pending: int = 1000,
+    ) -> PresenceFeed:
+        """
+        Open a change feed, optionally limited to a model, domain or queue.
+
+        :param model: Optional "presence" or "agent".
+        :param domain: Optional domain.
+        :param queue: Optional call queue.
+        :param max_pending: Changes buffered for the subscriber before the oldest are
+                            dropped.
+        :return: A PresenceFeed to iterate with `async for`. Close it when done.
+        """
+        if model is not None and model not in MODELS:
+            raise ValueError(
+                f"Invalid model '{model}'. Must be one of: {', '.join(MODELS)}"
+            )
+        feed = PresenceFeed(self, model, domain, queue, max_pending)
+        self._feeds.setdefault(domain, set()).add(feed)
+        return feed
+
+    def stats(self) -> dict:
+        """
+        Return entity, event, feed and drop counters.
+        """
+        feeds = [feed for group in self._feeds.values() for feed in group]
+        return {
+            "entities": len(self._entries),
+            "presence": len(self._members(("model", "presence"))),
+            "agents": len(self._members(("model", "agent"))),
+            "sequence": self.sequence,
+            "events_applied": self.events_applied,
+            "unchanged": self.unchanged,
+            "ignored": self.ignored,
+            "feeds": len(feeds),
+            "pending": sum(len(feed) for feed in feeds),
+            "dropped": sum(feed.dropped for feed in feeds),
+        }
+
+    def _lookup(
+        self,
+        model: Optional[str],
+        domain: Optional[str],
+        user: Optional[str],
+        state: Optional[str],
+        queue: Optional[str],
+    ) -> Set[EntityKey]:
+        if (user is not None or queue is not None) and domain is None:
+            raise ValueError("'user' and 'queue' require 'domain' to be set.")
+        if model is None and queue is None and user is None:
+            return set().union(
+                *(self._lookup(name, domain, None, state, None) for name in MODELS)
+            )
+        # Pick the narrowest index; filters it already covers are cleared
+        if queue is not None:
+            if model not in (None, "agent"):
+                return set()
+            model = None
+            if state is not None:
+                candidates = self._members(("queue_state", domain, queue, state))
+                state = None
+            else:
+                candidates = self._members(("queue", domain, queue))
+        elif user is not None:
+            candidates = self._members(("user", domain, user))
+            user = None
+        elif domain is not None and state is not None:
+            candidates = self._members(("domain_state", model, domain, state))
+            model = state = None
+        elif domain is not None:
+            candidates = self._members(("domain", model, domain))
+            model = None
+        elif state is not None:
+            candidates = self._members(("state", model, state))
+            model = state = None
+        else:
+            candidates = self._members(("model", model))
+            model = None
+
+        if model is None and state is None and user is None:
+            return candidates
+        entries = self._entries
+        return {
+            key
+            for key in candidates
+            if (model is None or key[0] == model)
+            and (user is None or key[2] == user)
+            and (state is None or entries[key].state == state)
+        }
+
+    def _members(self, index_key: tuple) -> Set[EntityKey]:
+        return self._index.get(index_key, set())
+
+    def _index_keys(self, entry: PresenceEntry) -> List[tuple]:
+        model, domain, user, queue = entry.key
+        keys = [
+            ("model", model),
+            ("domain", model, domain),
+            ("user", domain, user),
+            ("state", model, entry.state),
+            ("domain_state", model, domain, entry.state),
+        ]
+        if queue:
+            keys.append(("queue", domain, queue))
+            keys.append(("queue_state", domain, queue, entry.state))
+        return keys
+
+    def _add_to_index(self, entry: PresenceEntry):
+        key = entry.key
+        for index_key in self._index_keys(entry):
+            self._index.setdefault(index_key, set()).add(key)
+
+    def _remove_from_index(self, entry: PresenceEntry):
+        key = entry.key
+        for index_key in self._index_keys(entry):
+            members = self._index.get(index_key)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._index[index_key]
+
+    def _diff(self, old: dict, new: dict) -> Dict[str, tuple]:
+        ignore = self.ignore_fields
+        changes = {
+            field: (old.get(field), value)
+            for field, value in new.items()
+            if field not in ignore and old.get(field) != value
+        }
+        for field in old.keys() - new.keys():
+            if field not in ignore:
+                changes[field] = (old[field], None)
+        return changes
+
+    def _upsert(
+        self, key: EntityKey, state: Optional[str], record: dict
+    ) -> Optional[PresenceChange]:
+        entry = self._entries.get(key)
+        if entry is None:
+            version = self._versions.pop(key, 0) + 1
+            entry = PresenceEntry(*key, state, version, record)
+            self._entries[key] = entry
+            self._add_to_index(entry)
+            return self._publish("added", entry, None, self._diff({}, record))
+
+        changes = self._diff(entry.record, record)
+        entry.record = record
+        if not changes and entry.state == state:
+            self.unchanged += 1
+            return None
+        previous_state = entry.state
+        if state != previous_state:
+            self._remove_from_index(entry)
+            entry.state = state
+            self._add_to_index(entry)
+        entry.version += 1
+        return self._publish("updated", entry, previous_state, changes)
+
+    def _remove(self, key: EntityKey) -> Optional[PresenceChange]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._remove_from_index(entry)
+        previous_state, entry.state = entry.state, None
+        entry.version += 1
+        self._versions[key] = entry.version
+        if len(self._versions) > self.removed_versions:
+            self._versions.popitem(last=False)
+        changes = self._diff(entry.record, {})
+        return self._publish("removed", entry, previous_state, changes)
+
+    def _publish(
+        self,
+        action: str,
+        entry: PresenceEntry,
+        previous_state: Optional[str],
+        changes: Dict[str, tuple],
+    ) -> PresenceChange:
+        self.sequence += 1
+        change = PresenceChange(self.sequence, action, entry, previous_state, changes)
+        for domain in (None, entry.domain):
+            for feed in self._feeds.get(domain, ()):
+                if feed.matches(change):
+                    feed._push(change)
+        return change
+
+    def _unsubscribe(self, feed: PresenceFeed):
+        feeds = self._feeds.get(feed.domain)
+        if feeds is not None:
+            feeds.discard(feed)
+            if not feeds:
+                del self._feeds[feed.domain]
@@ -0,0 +1,270 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value into a number of seconds.
+
+    :param value: Header value, either delta-seconds or an HTTP date.
+    :return: Seconds to wait, or None if the value is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, rate: Optional[float] = None, burst: Optional[int] = None):
+        """
+        A token bucket that allows `rate` requests per second with bursts of up to `burst`.
+
+        :param rate: Sustained requests per second, or None for no rate limit.
+        :param burst: Bucket capacity. Defaults to one second worth of tokens.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def block_for(self, seconds: float):
+        """
+        Stop handing out tokens for the given number of seconds (e.g. from Retry-After).
+
+        :param seconds: Seconds to block.
+        """
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            if self.rate is None:
+                return
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: int = 1,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        A concurrency limit that adapts AIMD-style to throttling responses.
+
+        The limit grows by roughly one slot for every `limit` successful responses and
+        is multiplied by `decrease_factor` whenever the server throttles.
+
+        :param max_concurrency: Upper bound and starting value for the limit. None (the
+                                default) means no cap until the server throttles; the
+                                first throttle then limits concurrency to a fraction of
+                                the requests in flight at that moment.
+        :param min_concurrency: Lower bound for the limit.
+        :param decrease_factor: Multiplier applied to the limit on throttling.
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.limit = float("inf") if max_concurrency is None else float(max_concurrency)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        """
+        Wait for a free slot and take it.
+        """
+        if self.in_flight < self._capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just before cancellation; pass it on
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        """
+        Return a slot and wake waiters if the limit allows.
+        """
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self._capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _capacity(self) -> float:
+        return self.limit if self.limit == float("inf") else int(self.limit)
+
+    def on_success(self):
+        if self.max_concurrency is None:
+            if self.limit != float("inf"):
+                self.limit += 1.0 / self.limit
+                self._wake()
+        elif self.limit < self.max_concurrency:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_throttle(self):
+        # Decrease at most once per second so one burst of 429s counts as one signal
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        # Uncapped, start adapting from the concurrency that drew the throttle
+        current = self.limit if self.limit != float("inf") else self.in_flight
+        self.limit = max(self.min_concurrency, current * self.decrease_factor)
+
+
+class EndpointLimiter:
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: int = 1,
+    ):
+        """
+        Rate and concurrency limits for one endpoint group.
+
+        :param name: Name of the endpoint group.
+        :param rate: Sustained requests per second, or None for no rate limit.
+        :param burst: Maximum burst size for the token bucket.
+        :param max_concurrency: Maximum concurrent requests, or None (the default) for
+                                no cap until the server throttles.
+        :param min_concurrency: Minimum concurrency the adaptive limit can fall to.
+        """
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency)
+        self.throttled = 0
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Wait for a concurrency slot and a rate token.
+
+        :param timeout: Optional maximum number of seconds to wait. If it passes,
+                        asyncio.TimeoutError is raised and nothing is held.
+        :return: Seconds spent waiting.
+        """
+        started = time.monotonic()
+        if timeout is None:
+            await self._acquire()
+        else:
+            await asyncio.wait_for(self._acquire(), max(timeout, 0.0))
+        return time.monotonic() - started
+
+    async def _acquire(self):
+        await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self):
+        self.concurrency.release()
+
+    def observe(self, status: int, retry_after: Optional[str] = None):
+        """
+        Feed a response status back into the limiter.
+
+        :param status: HTTP status of the response.
+        :param retry_after: Value of the Retry-After header, if present.
+        """
+        if status in THROTTLE_STATUSES:
+            self.throttled += 1
+            self.concurrency.on_throttle()
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self.bucket.block_for(delay)
+        else:
+            self.concurrency.on_success()
+
+
+class RateLimiter:
+    GROUPS = ["messages", "calls", "subscriptions", "tokens"]
+
+    def __init__(self, limits: Optional[Dict[str, dict]] = None):
+        """
+        Client-side limits shared by all API classes, keyed by endpoint group.
+
+        :param limits: Optional mapping of group name to EndpointLimiter keyword arguments,
+                       e.g. {"messages": {"rate": 10, "max_concurrency": 5}}. Groups that
+                       are not listed use the defaults: no rate limit and no concurrency
+                       cap until the server throttles.
+        """
+        self.limits = dict(limits or {})
+        self._groups: Dict[str, EndpointLimiter] = {}
+
+    def group(self, name: str) -> EndpointLimiter:
+        """
+        Return the limiter for an endpoint group, creating it on first use.
+
+        :param name: Name of the endpoint group.
+        """
+        limiter = self._groups.get(name)
+        if limiter is None:
+            limiter = EndpointLimiter(name, **self.limits.get(name, {}))
+            self._groups[name] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Return the current limit, in-flight count and throttle count for each group.
+        """
+        return {
+            name: {
+                "limit": (
+                    None
+                    if limiter.concurrency.limit == float("inf")
+                    else limiter.concurrency.limit
+                ),
+                "in_flight": limiter.concurrency.in_flight,
+                "throttled": limiter.throttled,
+            }
+            for name, limiter in self._groups.items()
+        }
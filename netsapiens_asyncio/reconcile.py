@@ -0,0 +1,424 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .concurrency import TaskOutcome, run_bounded
+from .log import get_logger
+from .models import SubscriptionRecord
+from .subscribe import SubscriptionAPI
+
+EXPIRES_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class DesiredSubscription:
+    __slots__ = (
+        "model",
+        "post_url",
+        "subscription_geo_support",
+        "reseller",
+        "domain",
+        "user",
+        "preferred_server",
+    )
+
+    def __init__(
+        self,
+        model: str,
+        post_url: str,
+        subscription_geo_support: str = "yes",
+        reseller: str = "*",
+        domain: str = "*",
+        user: str = "*",
+        preferred_server: Optional[str] = None,
+    ):
+        """
+        A subscription that should exist, as passed to create_subscription.
+
+        Two subscriptions are the same if they have the same model, post URL, reseller,
+        domain and user.
+
+        :param model: The type of data the subscription sends (e.g., call, cdr, message).
+        :param post_url: The URL where the API posts data.
+        :param subscription_geo_support: "yes" or "no". Defaults to "yes".
+        :param reseller: Defaults to "*".
+        :param domain: Defaults to "*".
+        :param user: Defaults to "*".
+        :param preferred_server: Optional preferred server hostname.
+        """
+        if model not in SubscriptionAPI.VALID_MODELS:
+            raise ValueError(
+                f"Invalid model '{model}'. Must be one of: "
+                f"{', '.join(SubscriptionAPI.VALID_MODELS)}"
+            )
+        self.model = model
+        self.post_url = post_url
+        self.subscription_geo_support = subscription_geo_support
+        self.reseller = reseller
+        self.domain = domain
+        self.user = user
+        self.preferred_server = preferred_server
+
+    @property
+    def key(self) -> Tuple[str, str, str, str, str]:
+        return (self.model, self.post_url, self.reseller, self.domain, self.user)
+
+    @property
+    def scope(self) -> Tuple[str, str, str]:
+        return (self.reseller, self.domain, self.user)
+
+    def __repr__(self):
+        return f"DesiredSubscription({self.model!r}, {self.post_url!r})"
+
+
+class SubscriptionChange:
+    __slots__ = ("action", "subscription_id", "desired", "changes", "reasons")
+
+    def __init__(
+        self,
+        action: str,
+        subscription_id: Optional[str] = None,
+        desired: Optional[DesiredSubscription] = None,
+        changes: Optional[dict] = None,
+        reasons: Tuple[str, ...] = (),
+    ):
+        """
+        One request planned by SubscriptionReconciler.
+
+        :param action: "create", "update" or "delete".
+        :param subscription_id: The subscription updated or deleted.
+        :param desired: The subscription to create, or the one an update converges to.
+        :param changes: Keyword arguments for update_subscription.
+        :param reasons: Why the change is needed, e.g. ("renew",) or ("duplicate",).
+        """
+        self.action = action
+        self.subscription_id = subscription_id
+        self.desired = desired
+        self.changes = changes or {}
+        self.reasons = reasons
+
+    def __repr__(self):
+        target = self.subscription_id or self.desired
+        return f"SubscriptionChange({self.action} {target}, {', '.join(self.reasons)})"
+
+
+def _record_key(record: SubscriptionRecord) -> tuple:
+    return (record.model, record.post_url, record.reseller, record.domain, record.user)
+
+
+def _expires(record: SubscriptionRecord) -> Optional[datetime]:
+    expires = record.expires_datetime
+    return expires if isinstance(expires, datetime) else None
+
+
+class SubscriptionReconciler:
+    def __init__(
+        self,
+        subscription_api: SubscriptionAPI,
+        desired: Iterable[DesiredSubscription] = (),
+        prune: bool = False,
+        manage: Optional[Callable[[SubscriptionRecord], bool]] = None,
+        renew_before: float = 3600,
+        lifetime: float = 7 * 86400,
+        reset_error_count: Optional[int] = None,
+        reset_posts_count: Optional[int] = None,
+        concurrency: int = 10,
+        log_level=logging.INFO,
+    ):
+        """
+        Keep the subscriptions on the PBX equal to a desired set.
+
+        Each pass reads the subscriptions once, works out the smallest set of creates,
+        updates and deletes that makes them match the desired set, and applies those
+        concurrently. Subscriptions that already match cost no requests. With `prune`,
+        a subscription whose post URL or model changed is updated in place when an
+        unwanted one with the same reseller, domain and user exists, instead of deleted
+        and recreated.
+
+        The same pass renews subscriptions that expire within `renew_before` seconds and
+        resets error and post counters above the configured thresholds, folded into the
+        one update per subscription.
+
+        :param subscription_api: SubscriptionAPI used to read and change subscriptions.
+        :param desired: The subscriptions that should exist.
+        :param prune: If True, delete or retarget managed subscriptions that are not
+                      desired, and delete duplicates of desired ones. Off by default:
+                      every subscription posting to the same host counts as managed,
+                      so only enable it when no other deployment shares that host, or
+                      pass `manage` to pick out this reconciler's subscriptions.
+        :param manage: Optional predicate selecting the subscriptions this reconciler
+                       owns. Others are never updated or deleted. By default a
+                       subscription is managed if its post URL has the same host as a
+                       desired subscription's post URL.
+        :param renew_before: Renew subscriptions expiring within this many seconds.
+        :param lifetime: Seconds from now that a renewed subscription expires.
+        :param reset_error_count: Reset error-count to 0 once it reaches this value.
+        :param reset_posts_count: Reset posts-count to 0 once it reaches this value.
+        :param concurrency: Maximum number of requests in flight when applying changes.
+        :param log_level: Logging level (default is INFO).
+        """
+        self.subscription_api = subscription_api
+        self.desired: Dict[tuple, DesiredSubscription] = {}
+        self.set_desired(desired)
+        self.prune = prune
+        self.manage = manage
+        self.renew_before = renew_before
+        self.lifetime = lifetime
+        self.reset_error_count = reset_error_count
+        self.reset_posts_count = reset_posts_count
+        self.concurrency = concurrency
+
+        self._task: Optional[asyncio.Task] = None
+        # Monotonic time at which the earliest managed subscription needs renewing
+        self._renew_due: Optional[float] = None
+        self.passes = 0
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.failed = 0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("SubscriptionReconciler initialized")
+
+    def set_desired(self, desired: Iterable[DesiredSubscription]):
+        """
+        Replace the desired set. Takes effect on the next pass.
+        """
+        self.desired = {subscription.key: subscription for subscription in desired}
+        self._hosts = {urlsplit(d.post_url).netloc for d in self.desired.values()}
+
+    def is_managed(self, record: SubscriptionRecord) -> bool:
+        if self.manage is not None:
+            return self.manage(record)
+        return urlsplit(record.post_url or "").netloc in self._hosts
+
+    def plan(self, existing: Iterable[SubscriptionRecord]) -> List[SubscriptionChange]:
+        """
+        Work out the changes that make `existing` match the desired set.
+
+        :param existing: The subscriptions currently on the PBX.
+        :return: A list of SubscriptionChange, empty if nothing needs to change.
+        """
+        now = datetime.now(timezone.utc)
+        by_key: Dict[tuple, List[SubscriptionRecord]] = {}
+        for record in existing:
+            if self.is_managed(record):
+                by_key.setdefault(_record_key(record), []).append(record)
+
+        changes = []
+        renew_at: List[datetime] = []
+        unmatched = []
+        for key, desired in self.desired.items():
+            matches = by_key.pop(key, None)
+            if not matches:
+                unmatched.append(desired)
+                continue
+            # Keep the subscription that lives longest; the rest are duplicates
+            matches.sort(key=lambda r: _expires(r) or now, reverse=True)
+            keep = matches[0]
+            if self.prune:
+                for duplicate in matches[1:]:
+                    changes.append(
+                        SubscriptionChange(
+                            "delete", duplicate.id, reasons=("duplicate",)
+                        )
+                    )
+            change = self._update(desired, keep, now, renew_at)
+            if change is not None:
+                changes.append(change)
+
+        # Retarget leftover subscriptions in the same scope rather than replacing them
+        leftovers: Dict[tuple, List[SubscriptionRecord]] = {}
+        for records in by_key.values():
+            for record in records:
+                scope = (record.reseller, record.domain, record.user)
+                leftovers.setdefault(scope, []).append(record)
+        for desired in unmatched:
+            candidates = leftovers.get(desired.scope) if self.prune else None
+            if candidates:
+                change = self._update(
+                    desired, candidates.pop(), now, renew_at, retarget=True
+                )
+                changes.append(change)
+            else:
+                changes.append(
+                    SubscriptionChange("create", desired=desired, reasons=("missing",))
+                )
+        if self.prune:
+            for records in leftovers.values():
+                for record in records:
+                    changes.append(
+                        SubscriptionChange("delete", record.id, reasons=("unwanted",))
+                    )
+
+        if renew_at:
+            seconds = (min(renew_at) - now).total_seconds()
+            self._renew_due = time.monotonic() + max(seconds, 0)
+        else:
+            self._renew_due = None
+        return changes
+
+    def _update(
+        self,
+        desired: DesiredSubscription,
+        record: SubscriptionRecord,
+        now: datetime,
+        renew_at: List[datetime],
+        retarget: bool = False,
+    ) -> Optional[SubscriptionChange]:
+        """
+        Return the update that makes `record` match `desired`, or None if it does.
+        """
+        fields = {}
+        reasons = []
+        if retarget:
+            if record.model != desired.model:
+                fields["model"] = desired.model
+            if record.post_url != desired.post_url:
+                fields["post_url"] = desired.post_url
+            reasons.append("retarget")
+        if (
+            desired.subscription_geo_support
+            and record.subscription_geo_support != desired.subscription_geo_support
+        ):
+            fields["subscription_geo_support"] = desired.subscription_geo_support
+        if desired.preferred_server and (
+            record.preferred_server != desired.preferred_server
+        ):
+            fields["preferred_server"] = desired.preferred_server
+        if fields and not retarget:
+            reasons.append("drift")
+
+        expires = _expires(record)
+        if expires is not None:
+            if (expires - now).total_seconds() <= self.renew_before:
+                renewed = now + timedelta(seconds=self.lifetime)
+                fields["subscription_expires_datetime"] = renewed.strftime(
+                    EXPIRES_FORMAT
+                )
+                reasons.append("renew")
+                expires = renewed
+            renew_at.append(expires - timedelta(seconds=self.renew_before))
+
+        for name, threshold, count in (
+            ("error_count", self.reset_error_count, record.error_count),
+            ("posts_count", self.reset_posts_count, record.posts_count),
+        ):
+            if threshold is not None and isinstance(count, int) and count >= threshold:
+                fields[f"reset_{name}"] = True
+                reasons.append(f"reset {name.replace('_', ' ')}")
+
+        if not fields:
+            return None
+        return SubscriptionChange(
+            "update", record.id, desired, fields, reasons=tuple(reasons)
+        )
+
+    async def apply(self, changes: List[SubscriptionChange]) -> List[TaskOutcome]:
+        """
+        Apply planned changes concurrently.
+
+        :param changes: Changes returned by plan().
+        :return: One TaskOutcome per change, in completion order. Failures are reported
+                 in the outcome's `error` attribute.
+        """
+        outcomes = []
+        async for outcome in run_bounded(changes, self._apply_one, self.concurrency):
+            change = outcome.item
+            if outcome.ok:
+                if change.action == "create":
+                    self.created += 1
+                elif change.action == "update":
+                    self.updated += 1
+                else:
+                    self.deleted += 1
+                self.logger.info("Applied %s", change)
+            else:
+                self.failed += 1
+                self.logger.error(f"Failed to apply {change}: {outcome.error}")
+            outcomes.append(outcome)
+        return outcomes
+
+    async def _apply_one(self, change: SubscriptionChange):
+        api = self.subscription_api
+        if change.action == "create":
+            desired = change.desired
+            return await api.create_subscription(
+                desired.model,
+                desired.post_url,
+                subscription_geo_support=desired.subscription_geo_support,
+                reseller=desired.reseller,
+                domain=desired.domain,
+                user=desired.user,
+                preferred_server=desired.preferred_server,
+            )
+        if change.action == "update":
+            return await api.update_subscription(
+                change.subscription_id, **change.changes
+            )
+        return await api.delete_subscription(change.subscription_id)
+
+    async def reconcile(self) -> List[TaskOutcome]:
+        """
+        Run one pass: read the subscriptions, plan the changes and apply them.
+
+        :return: The outcomes of the applied changes; empty when everything matched.
+        """
+        existing = await self.subscription_api.read_subscription(typed=True)
+        if isinstance(existing, SubscriptionRecord):
+            existing = [existing]
+        changes = self.plan(existing or [])
+        self.passes += 1
+        if not changes:
+            self.logger.debug("Subscriptions match the desired set")
+            return []
+        return await self.apply(changes)
+
+    def start(self, interval: float = 300):
+        """
+        Start a background task that reconciles every `interval` seconds, and sooner
+        when a subscription is due for renewal.
+
+        :param interval: Maximum seconds between passes.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop(interval))
+
+    async def stop(self):
+        """
+        Stop the background task.
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self, interval: float):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                self.logger.error(f"Failed to reconcile subscriptions: {e}")
+            delay = interval
+            if self._renew_due is not None:
+                delay = min(delay, max(self._renew_due - time.monotonic(), 1.0))
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """
+        Return the number of passes and of changes applied and failed.
+        """
+        return {
+            "desired": len(self.desired),
+            "passes": self.passes,
+            "created": self.created,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "failed": self.failed,
+        }
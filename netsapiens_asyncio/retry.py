@@ -0,0 +1,73 @@
+import random
+from typing import Optional
+from .exceptions import NetsapiensError, RateLimitError
+
+# Methods that are safe to repeat by HTTP semantics
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Statuses worth retrying; 429 and 503 are handled as RateLimitError
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.25,
+        max_delay: float = 10.0,
+        deadline: Optional[float] = None,
+    ):
+        """
+        Retry transient failures with exponential backoff and full jitter.
+
+        Requests using an idempotent method (GET, PUT, DELETE, ...) or explicitly
+        marked idempotent are retried on any retryable error. Other requests are only
+        retried when the server throttled them with 429, since the request was not
+        processed.
+
+        :param max_attempts: Maximum number of attempts, including the first.
+        :param base_delay: Delay in seconds before the first retry, doubled on each retry.
+        :param max_delay: Upper bound for the delay between attempts.
+        :param deadline: Default total time budget in seconds for a call, including
+                         retries. None for no deadline.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def should_retry(
+        self, error: NetsapiensError, attempt: int, idempotent: bool
+    ) -> bool:
+        """
+        Decide whether a failed attempt should be retried.
+
+        :param error: The error raised by the attempt.
+        :param attempt: Number of attempts made so far.
+        :param idempotent: Whether the request is safe to repeat.
+        :return: True if the request should be retried.
+        """
+        if attempt >= self.max_attempts or not error.retryable:
+            return False
+        if idempotent:
+            return True
+        return isinstance(error, RateLimitError) and error.status == 429
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Return the delay before the next attempt.
+
+        :param attempt: Number of attempts made so far.
+        :param retry_after: Delay requested by the server, which is never undercut.
+        :return: Delay in seconds.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
@@ -0,0 +1,660 @@
+import asyncio
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from .codec import JSONCodec, default_codec
+from .exceptions import SpoolError
+from .log import get_logger
+from .webhook import WebhookEvent
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Each record is stored as <length><crc32 of data><data>
+_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".seg"
+OFFSETS_FILE = "offsets.json"
+
+Record = Tuple[int, bytes]
+
+
+def _segment_name(base: int) -> str:
+    return f"{base:020d}{SEGMENT_SUFFIX}"
+
+
+class _Segment:
+    __slots__ = ("base", "path", "size", "count", "index", "_map", "_mapped")
+
+    def __init__(self, base: int, path: str):
+        """
+        One segment file holding the records from offset `base` onwards.
+
+        `size` and `count` only cover durable records. `index` is a sparse list of
+        (offset, file position) pairs used to seek without scanning the whole file.
+        """
+        self.base = base
+        self.path = path
+        self.size = 0
+        self.count = 0
+        self.index: List[Tuple[int, int]] = []
+        self._map: Optional[mmap.mmap] = None
+        self._mapped = 0
+
+    @property
+    def end(self) -> int:
+        return self.base + self.count
+
+    def view(self) -> Optional[mmap.mmap]:
+        """
+        Return a read-only map of the durable part of the file, remapping it if the
+        segment has grown since it was last mapped.
+        """
+        if self.size == 0:
+            return None
+        if self._map is None or self._mapped < self.size:
+            self.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+            self._mapped = self.size
+        return self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._mapped = 0
+
+
+def _scan(path: str, base: int, index_interval: int) -> Tuple[int, int, list]:
+    """
+    Read a segment file and return (valid size, record count, sparse index). Scanning
+    stops at the first truncated or corrupt record.
+    """
+    size = 0
+    count = 0
+    index = []
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        return 0, 0, index
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), file_size, access=mmap.ACCESS_READ) as view:
+            while size + _HEADER.size <= file_size:
+                length, crc = _HEADER.unpack_from(view, size)
+                end = size + _HEADER.size + length
+                if end > file_size:
+                    break
+                if zlib.crc32(view[size + _HEADER.size : end]) != crc:
+                    break
+                if count % index_interval == 0:
+                    index.append((base + count, size))
+                size = end
+                count += 1
+    return size, count, index
+
+
+class EventSpool:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = True,
+        linger: float = 0.0,
+        index_interval: int = 256,
+        codec: Optional[JSONCodec] = None,
+        log_level=logging.INFO,
+    ):
+        """
+        Durable, append-only log of records on local disk, split into segment files.
+
+        Appends are group-committed: while one batch is being written and fsynced (in
+        an executor thread), new appends collect into the next batch, so a burst of
+        deliveries costs one fsync instead of one per delivery. An append returns once
+        its records are on disk. Every record gets a sequential offset.
+
+        Records are read back through memory-mapped segments. Readers can start at any
+        offset still on disk, and named consumers commit the offset they have processed
+        up to. compact() deletes segments that every consumer has moved past.
+
+        On open, a record cut short by a crash at the end of the last segment is
+        discarded. One process at a time may open a spool directory.
+
+        :param directory: Directory holding the segment files and consumer offsets.
+        :param segment_bytes: Size at which a new segment is started.
+        :param fsync: If False, skip fsync. Faster, but a power loss may lose the
+                      most recent records.
+        :param linger: Seconds to wait before writing a batch to collect more appends.
+        :param index_interval: Every nth record is indexed for seeking.
+        :param codec: JSONCodec used by append_events() and iterate_events().
+        :param log_level: Logging level (default is INFO).
+        """
+        self.directory = os.path.expanduser(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.linger = linger
+        self.index_interval = index_interval
+        self.codec = codec or default_codec()
+
+        self._segments: List[_Segment] = []
+        self._bases: List[int] = []
+        self._offsets: Dict[str, int] = {}
+        self._next_offset = 0
+        self._lock_fd: Optional[int] = None
+        self._opened = False
+
+        # Writer state, only touched by the flush task's executor thread
+        self._fd: Optional[int] = None
+        self._write_base = 0
+        self._write_size = 0
+        self._write_count = 0
+
+        self._pending: List[Tuple[List[bytes], asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._failure: Optional[BaseException] = None
+        self._appended: Optional[asyncio.Event] = None
+        self._offsets_lock: Optional[asyncio.Lock] = None
+
+        self.appended = 0
+        self.commits = 0
+        self.compacted = 0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("EventSpool initialized")
+
+    async def open(self):
+        """
+        Open the spool, recovering the segments and consumer offsets on disk.
+        """
+        if self._opened:
+            return
+        self._appended = asyncio.Event()
+        self._offsets_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._open_sync)
+        self._opened = True
+        self.logger.info(
+            "Opened spool %s: offsets %d to %d in %d segment(s)",
+            self.directory,
+            self.first_offset,
+            self._next_offset,
+            len(self._segments),
+        )
+
+    def _open_sync(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._lock_fd = os.open(
+            os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o600
+        )
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+                raise SpoolError(
+                    f"Failed to open spool: {self.directory} is in use"
+                ) from e
+
+        bases = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        )
+        for position, base in enumerate(bases):
+            segment = _Segment(base, os.path.join(self.directory, _segment_name(base)))
+            last = position == len(bases) - 1
+            if last:
+                segment.size, segment.count, segment.index = _scan(
+                    segment.path, base, self.index_interval
+                )
+                if segment.size != os.path.getsize(segment.path):
+                    self.logger.warning(
+                        f"Discarding a partial record at the end of {segment.path}"
+                    )
+                    os.truncate(segment.path, segment.size)
+            else:
+                # Sealed segments are indexed when first read
+                segment.size = os.path.getsize(segment.path)
+                segment.count = bases[position + 1] - base
+                segment.index = None
+            self._segments.append(segment)
+        self._bases = [segment.base for segment in self._segments]
+
+        if self._segments:
+            active = self._segments[-1]
+            self._next_offset = active.end
+            self._write_base = active.base
+            self._write_size = active.size
+            self._write_count = active.count
+        else:
+            self._start_segment_sync(0)
+            self._segments.append(_Segment(0, self._segment_path(0)))
+            self._bases = [0]
+        self._fd = os.open(self._segment_path(self._write_base), os.O_WRONLY)
+        os.lseek(self._fd, self._write_size, os.SEEK_SET)
+
+        try:
+            with open(os.path.join(self.directory, OFFSETS_FILE)) as f:
+                offsets = json.load(f)
+            self._offsets = {name: int(value) for name, value in offsets.items()}
+        except FileNotFoundError:
+            self._offsets = {}
+
+    def _segment_path(self, base: int) -> str:
+        return os.path.join(self.directory, _segment_name(base))
+
+    def _start_segment_sync(self, base: int):
+        fd = os.open(self._segment_path(base), os.O_WRONLY | os.O_CREAT, 0o600)
+        os.close(fd)
+        if self.fsync:
+            self._fsync_directory()
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    async def close(self):
+        """
+        Wait for pending appends, then close the segment files.
+        """
+        if not self._opened:
+            return
+        if self._flusher is not None:
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        self._opened = False
+        for segment in self._segments:
+            segment.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def first_offset(self) -> int:
+        """
+        The oldest offset still on disk.
+        """
+        return self._segments[0].base if self._segments else 0
+
+    @property
+    def next_offset(self) -> int:
+        """
+        The offset the next appended record will get.
+        """
+        return self._next_offset
+
+    async def append(self, record: bytes) -> int:
+        """
+        Append one record and return its offset once it is durable.
+        """
+        return await self.append_many([record])
+
+    async def append_many(self, records: List[bytes]) -> int:
+        """
+        Append records and return the offset of the first once all are durable.
+
+        :param records: The records, as bytes.
+        :return: The offset of the first record; the rest follow sequentially.
+        """
+        if not self._opened:
+            raise SpoolError("Failed to append: the spool is not open")
+        if self._failure is not None:
+            raise SpoolError(
+                f"Failed to append: an earlier write failed ({self._failure})"
+            )
+        first = self._next_offset
+        if not records:
+            return first
+        self._next_offset += len(records)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((records, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+        await future
+        return first
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if self.linger:
+                await asyncio.sleep(self.linger)
+            batch, self._pending = self._pending, []
+            try:
+                updates = await loop.run_in_executor(
+                    None, self._write_sync, [records for records, _ in batch]
+                )
+            except Exception as e:
+                # Offsets were handed out for records that may be missing. Refuse
+                # further appends; reopening the spool recovers a consistent log.
+                self._failure = e
+                self.logger.error(f"Failed to write to spool: {e}")
+                error = SpoolError(f"Failed to append: {e}")
+                for _, future in batch + self._pending:
+                    if not future.done():
+                        future.set_exception(error)
+                self._pending = []
+                return
+            self._apply(updates)
+            for records, future in batch:
+                self.appended += len(records)
+                if not future.done():
+                    future.set_result(None)
+            self._appended.set()
+            self._appended = asyncio.Event()
+
+    def _write_sync(self, batch: List[List[bytes]]) -> list:
+        """
+        Write a batch of appends and fsync. Runs in an executor thread and returns the
+        new (base, size, count, index entries) of every segment it wrote to.
+        """
+        updates = []
+        chunks = []
+        index = []
+
+        def flush_segment():
+            if chunks:
+                data = b"".join(chunks)
+                written = 0
+                while written < len(data):
+                    written += os.write(self._fd, data[written:])
+                chunks.clear()
+            if self.fsync:
+                os.fsync(self._fd)
+            updates.append(
+                (self._write_base, self._write_size, self._write_count, list(index))
+            )
+            index.clear()
+
+        for records in batch:
+            for record in records:
+                if self._write_size >= self.segment_bytes and self._write_count:
+                    flush_segment()
+                    os.close(self._fd)
+                    self._fd = None
+                    self._write_base += self._write_count
+                    self._write_size = 0
+                    self._write_count = 0
+                    self._start_segment_sync(self._write_base)
+                    self._fd = os.open(
+                        self._segment_path(self._write_base), os.O_WRONLY
+                    )
+                if self._write_count % self.index_interval == 0:
+                    index.append(
+                        (self._write_base + self._write_count, self._write_size)
+                    )
+                chunks.append(_HEADER.pack(len(record), zlib.crc32(record)))
+                chunks.append(record)
+                self._write_size += _HEADER.size + len(record)
+                self._write_count += 1
+        flush_segment()
+        return updates
+
+    def _apply(self, updates: list):
+        for base, size, count, index in updates:
+            if base != self._segments[-1].base:
+                self._segments.append(_Segment(base, self._segment_path(base)))
+                self._bases.append(base)
+            segment = self._segments[-1]
+            segment.size = size
+            segment.count = count
+            segment.index.extend(index)
+
+    def read(self, offset: int, max_records: int = 1000) -> List[Record]:
+        """
+        Return up to `max_records` durable records starting at `offset`.
+
+        :param offset: The first offset to read.
+        :param max_records: Maximum number of records returned.
+        :return: A list of (offset, record) pairs, empty if `offset` is at the end.
+        """
+        if offset < self.first_offset:
+            raise SpoolError(
+                f"Failed to read: offset {offset} was compacted "
+                f"(oldest is {self.first_offset})"
+            )
+        records = []
+        position = bisect.bisect_right(self._bases, offset) - 1
+        while position < len(self._segments) and len(records) < max_records:
+            segment = self._segments[position]
+            if offset >= segment.end:
+                if position == len(self._segments) - 1:
+                    break
+                position += 1
+                continue
+            self._read_segment(segment, offset, max_records - len(records), records)
+            offset = records[-1][0] + 1
+            position += 1
+        return records
+
+    def _read_segment(
+        self, segment: _Segment, offset: int, limit: int, records: List[Record]
+    ):
+        view = segment.view()
+        if segment.index is None:
+            segment.index = _scan(segment.path, segment.base, self.index_interval)[2]
+        # Seek to the closest indexed record, then step over the rest
+        slot = bisect.bisect_right(segment.index, (offset, float("inf"))) - 1
+        current, pos = segment.index[slot] if slot >= 0 else (segment.base, 0)
+        end = segment.size
+        while pos < end and limit:
+            length, crc = _HEADER.unpack_from(view, pos)
+            start = pos + _HEADER.size
+            pos = start + length
+            if current >= offset:
+                data = view[start:pos]
+                if zlib.crc32(data) != crc:
+                    raise SpoolError(
+                        f"Failed to read: record {current} in {segment.path} is corrupt"
+                    )
+                records.append((current, data))
+                limit -= 1
+            current += 1
+
+    async def iterate(
+        self,
+        offset: Optional[int] = None,
+        consumer: Optional[str] = None,
+        follow: bool = False,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Record]:
+        """
+        Yield (offset, record) pairs from an offset onwards.
+
+        :param offset: Where to start. Defaults to the consumer's committed position,
+                       or the oldest record.
+        :param consumer: Optional consumer name whose position is the default start.
+        :param follow: If True, wait for new records at the end instead of stopping.
+        :param batch_size: Number of records read from the segments at a time.
+        """
+        if offset is None:
+            offset = self.position(consumer) if consumer else self.first_offset
+        while True:
+            records = self.read(offset, batch_size)
+            if records:
+                for record in records:
+                    yield record
+                offset = records[-1][0] + 1
+                continue
+            if not follow:
+                return
+            await self._appended.wait()
+
+    async def consume(
+        self,
+        consumer: str,
+        handler: Callable[[List[Record]], Awaitable[None]],
+        batch_size: int = 1000,
+        follow: bool = True,
+    ):
+        """
+        Feed records to `handler` in batches, committing the consumer's position after
+        each batch the handler completes. Restarts resume after the last committed
+        batch, so records are processed at least once.
+
+        :param consumer: Consumer name.
+        :param handler: Coroutine function called with each list of (offset, record).
+        :param batch_size: Maximum number of records per batch.
+        :param follow: If True, keep waiting for new records; otherwise stop at the end.
+        """
+        offset = self.position(consumer)
+        while True:
+            records = self.read(offset, batch_size)
+            if records:
+                await handler(records)
+                offset = records[-1][0] + 1
+                await self.commit(consumer, offset)
+                continue
+            if not follow:
+                return
+            await self._appended.wait()
+
+    def position(self, consumer: str) -> int:
+        """
+        Return the next offset a consumer will read: its committed position, or the
+        oldest record if it has never committed.
+        """
+        return max(self._offsets.get(consumer, 0), self.first_offset)
+
+    async def commit(self, consumer: str, offset: int):
+        """
+        Record that a consumer has processed everything before `offset`.
+
+        :param consumer: Consumer name.
+        :param offset: The next offset the consumer will read.
+        """
+        async with self._offsets_lock:
+            self._offsets[consumer] = offset
+            offsets = dict(self._offsets)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_offsets_sync, offsets)
+        self.commits += 1
+
+    def remove_consumer(self, consumer: str):
+        """
+        Forget a consumer, so it no longer holds back compaction. Takes effect on disk
+        with the next commit.
+        """
+        self._offsets.pop(consumer, None)
+
+    def _write_offsets_sync(self, offsets: Dict[str, int]):
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(offsets, f)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    async def compact(self, before: Optional[int] = None) -> int:
+        """
+        Delete segments whose records all precede `before`. The active segment is
+        never deleted.
+
+        :param before: Offset to compact up to. Defaults to the lowest position of the
+                       known consumers; with no consumers nothing is deleted.
+        :return: The number of segments deleted.
+        """
+        if before is None:
+            if not self._offsets:
+                return 0
+            before = min(self._offsets.values())
+        removable = []
+        for segment in self._segments[:-1]:
+            if segment.end > before:
+                break
+            removable.append(segment)
+        if not removable:
+            return 0
+
+        self._segments = self._segments[len(removable) :]
+        self._bases = self._bases[len(removable) :]
+        for segment in removable:
+            segment.close()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, lambda: [os.unlink(segment.path) for segment in removable]
+        )
+        self.compacted += len(removable)
+        self.logger.info(
+            "Compacted %d segment(s); oldest offset is now %d",
+            len(removable),
+            self.first_offset,
+        )
+        return len(removable)
+
+    def encode_event(self, event: WebhookEvent) -> bytes:
+        return self.codec.dumps(
+            {
+                "model": event.model,
+                "payload": event.payload,
+                "received_at": event.received_at,
+            }
+        )
+
+    def decode_event(self, record: bytes) -> WebhookEvent:
+        data = self.codec.loads(record)
+        return WebhookEvent(data["model"], data["payload"], data["received_at"])
+
+    async def append_events(self, events: List[WebhookEvent]) -> int:
+        """
+        Append subscription events and return the offset of the first.
+        """
+        return await self.append_many([self.encode_event(event) for event in events])
+
+    async def iterate_events(
+        self,
+        offset: Optional[int] = None,
+        consumer: Optional[str] = None,
+        follow: bool = False,
+    ) -> AsyncIterator[Tuple[int, WebhookEvent]]:
+        """
+        Like iterate(), yielding (offset, WebhookEvent) pairs.
+        """
+        async for position, record in self.iterate(offset, consumer, follow):
+            yield position, self.decode_event(record)
+
+    def stats(self) -> dict:
+        """
+        Return the offset range on disk, segment count, size and consumer lag.
+        """
+        return {
+            "first_offset": self.first_offset,
+            "next_offset": self._next_offset,
+            "segments": len(self._segments),
+            "bytes": sum(segment.size for segment in self._segments),
+            "appended": self.appended,
+            "compacted": self.compacted,
+            "consumers": {
+                name: self._next_offset - max(offset, self.first_offset)
+                for name, offset in self._offsets.items()
+            },
+        }
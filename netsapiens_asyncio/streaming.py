@@ -0,0 +1,130 @@
+import json
+import re
+from typing import Any, Callable, List
+
+# Characters that matter outside and inside JSON strings
+_STRUCTURAL = re.compile(rb'[\[\]{}",]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_WHITESPACE = b" \t\r\n"
+
+
+class JSONArrayDecoder:
+    def __init__(self, loads: Callable[[bytes], Any] = json.loads):
+        """
+        Incrementally decode a JSON array, returning each element as soon as it is complete.
+
+        Feed the response body in chunks of any size. Only the element currently being
+        received is buffered, so peak memory depends on the largest element rather than
+        the whole document. If the document is not an array (e.g. a single object), it
+        is buffered and returned as one element when the input ends.
+
+        :param loads: Function used to decode each element from bytes.
+        """
+        self.loads = loads
+        self._buffer = bytearray()
+        self._pos = 0
+        self._start = 0
+        self._depth = 0
+        self._in_string = False
+        # "start", "array", "single" or "end"
+        self._state = "start"
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Add a chunk of the document and return the elements completed by it.
+
+        :param chunk: The next bytes of the document.
+        :return: A list of decoded elements, possibly empty.
+        """
+        if self._state == "end":
+            if chunk.strip(_WHITESPACE):
+                raise ValueError("Unexpected data after the end of the JSON array.")
+            return []
+
+        self._buffer += chunk
+        if self._state == "start":
+            stripped = self._buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                self._buffer.clear()
+                return []
+            if stripped[:1] == b"[":
+                self._state = "array"
+                self._buffer = bytearray(stripped[1:])
+            else:
+                self._state = "single"
+                self._buffer = bytearray(stripped)
+        if self._state == "single":
+            return []
+
+        elements = self._scan()
+        # Drop the bytes of elements that have already been returned
+        if self._start:
+            del self._buffer[: self._start]
+            self._pos -= self._start
+            self._start = 0
+        return elements
+
+    def close(self) -> List[Any]:
+        """
+        Signal the end of the document and return any remaining element.
+
+        :return: A list of decoded elements, possibly empty.
+        """
+        if self._state == "single":
+            self._state = "end"
+            return [self.loads(bytes(self._buffer))]
+        if self._state == "array":
+            raise ValueError("Incomplete JSON array: the document ended early.")
+        return []
+
+    def _scan(self) -> List[Any]:
+        buffer = self._buffer
+        elements = []
+        pos = self._pos
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if buffer[match.start()] == 0x5C:  # backslash
+                    if match.end() >= len(buffer):
+                        # The escaped character has not arrived yet
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = buffer[match.start()]
+            pos = match.end()
+            if char == 0x22:  # quote
+                self._in_string = True
+            elif char in (0x7B, 0x5B):  # { [
+                self._depth += 1
+            elif char == 0x7D or (char == 0x5D and self._depth > 0):  # } ]
+                self._depth -= 1
+            elif self._depth == 0:
+                # A comma or the closing bracket of the top-level array
+                self._emit(buffer[self._start : match.start()], elements)
+                self._start = pos
+                if char == 0x5D:
+                    self._state = "end"
+                    if buffer[pos:].strip(_WHITESPACE):
+                        raise ValueError(
+                            "Unexpected data after the end of the JSON array."
+                        )
+                    break
+        self._pos = pos
+        return elements
+
+    def _emit(self, raw: bytearray, elements: List[Any]):
+        raw = bytes(raw).strip(_WHITESPACE)
+        if raw:
+            elements.append(self.loads(raw))
@@ -1,8 +1,9 @@
-import aiohttp
 from datetime import datetime
 import logging
-from typing import Optional, Dict, Union
+from typing import AsyncIterator, Optional, Dict, Union
 from .auth import NetsapiensAPI
+from .log import SAMPLED, get_logger, summarize
+from .models import SubscriptionRecord
 
 
 class SubscriptionAPI:
@@ -34,17 +35,7 @@ class SubscriptionAPI:
         self.user = "~"
 
         # Create a dedicated logger for this class
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(log_level)
-
-        # Add a handler if the logger has no handlers (to avoid duplicate logs)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
+        self.logger = get_logger(self.__class__.__name__, log_level)
 
         self.logger.debug("SubscriptionAPI initialized with auth client")
 
@@ -57,6 +48,7 @@ class SubscriptionAPI:
         domain: Optional[str] = "*",
         user: Optional[str] = "*",
         preferred_server: Optional[str] = None,
+        deadline: Optional[float] = None,
     ) -> Dict:
         """
         Create a new event subscription.
@@ -68,6 +60,7 @@ class SubscriptionAPI:
         :param domain: Optional. Defaults to "*", indicating all domains (requires Super User scope).
         :param user: Optional. Defaults to "*", indicating all users.
         :param preferred_server: Optional. A specific server hostname to use as the preferred server.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
         :return: A dictionary containing the subscription details.
         """
 
@@ -98,45 +91,41 @@ class SubscriptionAPI:
         if preferred_server:
             payload["preferred-server"] = preferred_server
 
-        self.logger.debug(f"Creating subscription with payload: {payload}")
+        self.logger.debug("Creating subscription with payload: %s", summarize(payload))
 
         # Make POST request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            try:
-                async with session.post(url, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        self.logger.info(f"Subscription created successfully: {result}")
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to create subscription. "
-                            f"Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(
-                            f"Failed to create subscription: {error_message}"
-                        )
-            except aiohttp.ClientError as e:
-                self.logger.error(f"Network error while creating subscription: {e}")
-                raise Exception(
-                    "Network error occurred while creating subscription."
-                ) from e
-            except Exception as e:
-                self.logger.error(f"Unexpected error while creating subscription: {e}")
-                raise Exception(
-                    "An unexpected error occurred while creating subscription."
-                ) from e
+        try:
+            result = await self.auth_client.request(
+                "POST",
+                url,
+                group="subscriptions",
+                action="create subscription",
+                json=payload,
+                deadline=deadline,
+            )
+        finally:
+            # Evict cached subscription reads, even if the outcome of the write is unknown
+            self.auth_client.invalidate_cache(
+                f"{self.base_url}/ns-api/v2/subscriptions"
+            )
+        self.logger.info("Subscription created successfully: %s", summarize(result))
+        return result
 
     async def read_subscription(
-        self, subscription_id: Optional[str] = None
-    ) -> Union[dict, list[dict]]:
+        self,
+        subscription_id: Optional[str] = None,
+        deadline: Optional[float] = None,
+        typed: bool = False,
+        raw: bool = False,
+    ) -> Union[dict, list[dict], bytes]:
         """
         Retrieve event subscriptions. If subscription_id is provided, fetches the details for that specific subscription.
         If no subscription_id is provided, retrieves all subscriptions.
 
         :param subscription_id: Optional. The ID of the subscription to retrieve.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
+        :param typed: If True, return SubscriptionRecord objects instead of dictionaries.
+        :param raw: If True, return the undecoded JSON response body as bytes.
         :return: A dictionary for a specific subscription or a list of dictionaries for all subscriptions.
         """
         # Check and refresh token if necessary
@@ -149,47 +138,68 @@ class SubscriptionAPI:
         else:
             url = f"{self.base_url}/ns-api/v2/subscriptions"
 
-        self.logger.debug(f"Retrieving subscription(s) from {url}")
+        self.logger.debug("Retrieving subscription(s) from %s", url)
 
         # Make GET request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            try:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if subscription_id:
-                            self.logger.info(
-                                f"Subscription {subscription_id} retrieved successfully."
-                            )
-                        else:
-                            self.logger.info(
-                                f"Subscriptions retrieved successfully: {len(result)} items found."
-                            )
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to retrieve subscription(s). "
-                            f"Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(
-                            f"Failed to retrieve subscription(s): {error_message}"
-                        )
-            except aiohttp.ClientError as e:
-                self.logger.error(
-                    f"Network error while retrieving subscription(s): {e}"
-                )
-                raise Exception(
-                    "Network error occurred while retrieving subscription(s)."
-                ) from e
-            except Exception as e:
-                self.logger.error(
-                    f"Unexpected error while retrieving subscription(s): {e}"
-                )
-                raise Exception(
-                    "An unexpected error occurred while retrieving subscription(s)."
-                ) from e
+        result = await self.auth_client.request(
+            "GET",
+            url,
+            group="subscriptions",
+            action="retrieve subscription(s)",
+            deadline=deadline,
+            cache=True,
+            raw=raw,
+        )
+        if raw:
+            self.logger.info(
+                "Subscription(s) retrieved successfully: %d bytes.",
+                len(result),
+                extra=SAMPLED,
+            )
+            return result
+        if subscription_id:
+            self.logger.info(
+                "Subscription %s retrieved successfully.",
+                subscription_id,
+                extra=SAMPLED,
+            )
+        else:
+            self.logger.info(
+                "Subscriptions retrieved successfully: %d items found.",
+                len(result),
+                extra=SAMPLED,
+            )
+        if typed:
+            return SubscriptionRecord.decode(result)
+        return result
+
+    async def stream_subscriptions(
+        self, typed: bool = False, deadline: Optional[float] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Stream all event subscriptions one at a time.
+
+        The response is decoded incrementally as it arrives instead of being buffered.
+
+        :param typed: If True, yield SubscriptionRecord objects instead of dictionaries.
+        :param deadline: Optional. Total time budget in seconds for the whole stream.
+        :return: An async iterator of subscription dictionaries.
+        """
+        # Check and refresh token if necessary
+        self.auth_data = await self.auth_client.check_token_expiry()
+        self.base_url = self.auth_data.get("api_url")
+
+        url = f"{self.base_url}/ns-api/v2/subscriptions"
+        self.logger.debug("Streaming subscriptions from %s", url)
+
+        async for subscription in self.auth_client.stream_request(
+            "GET",
+            url,
+            group="subscriptions",
+            action="retrieve subscription(s)",
+            deadline=deadline,
+        ):
+            yield SubscriptionRecord(subscription) if typed else subscription
 
     async def update_subscription(
         self,
@@ -201,6 +211,9 @@ class SubscriptionAPI:
         preferred_server: Optional[str] = None,
         error_count: Optional[int] = None,
         posts_count: Optional[int] = None,
+        deadline: Optional[float] = None,
+        reset_error_count: bool = False,
+        reset_posts_count: bool = False,
     ) -> dict:
         """
         Update an existing event subscription.
@@ -211,12 +224,15 @@ class SubscriptionAPI:
         :param subscription_geo_support: Optional. Whether geo support is enabled ("yes" or "no").
         :param subscription_expires_datetime: Optional. Expiration date-time in "YYYY-MM-DD HH:MM:SS" format.
         :param preferred_server: Optional. Preferred server hostname.
-        :param error_count: Optional. Resets the error count if set to 0.
-        :param posts_count: Optional. Resets the posts count if set to 0.
+        :param error_count: Optional. Resets the error count if truthy.
+        :param posts_count: Optional. Resets the posts count if truthy.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
+        :param reset_error_count: Optional. If True, reset the error count to 0.
+        :param reset_posts_count: Optional. If True, reset the posts count to 0.
         :return: A dictionary containing the updated subscription details.
         """
         # Validate model
-        if model not in self.VALID_MODELS:
+        if model is not None and model not in self.VALID_MODELS:
             self.logger.error(
                 f"Invalid model '{model}'. Must be one of: {', '.join(self.VALID_MODELS)}"
             )
@@ -260,9 +276,9 @@ class SubscriptionAPI:
             payload["subscription-expires-datetime"] = subscription_expires_datetime
         if preferred_server:
             payload["preferred-server"] = preferred_server
-        if error_count:
+        if error_count or reset_error_count:
             payload["error-count"] = "0"
-        if posts_count:
+        if posts_count or reset_posts_count:
             payload["posts-count"] = "0"
 
         # Ensure there's data to update
@@ -273,49 +289,41 @@ class SubscriptionAPI:
             )
 
         self.logger.debug(
-            f"Updating subscription {subscription_id} with payload: {payload}"
+            "Updating subscription %s with payload: %s",
+            subscription_id,
+            summarize(payload),
         )
 
         # Make PUT request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            try:
-                async with session.put(url, json=payload, headers=headers) as response:
-                    if response.status == 202:
-                        result = await response.json()
-                        self.logger.info(
-                            f"Subscription {subscription_id} updated successfully: {result}"
-                        )
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to update subscription {subscription_id}. "
-                            f"Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(
-                            f"Failed to update subscription: {error_message}"
-                        )
-            except aiohttp.ClientError as e:
-                self.logger.error(
-                    f"Network error while updating subscription {subscription_id}: {e}"
-                )
-                raise Exception(
-                    "Network error occurred while updating subscription."
-                ) from e
-            except Exception as e:
-                self.logger.error(
-                    f"Unexpected error while updating subscription {subscription_id}: {e}"
-                )
-                raise Exception(
-                    "An unexpected error occurred while updating subscription."
-                ) from e
+        try:
+            result = await self.auth_client.request(
+                "PUT",
+                url,
+                group="subscriptions",
+                action=f"update subscription {subscription_id}",
+                ok_statuses=(202,),
+                json=payload,
+                deadline=deadline,
+            )
+        finally:
+            self.auth_client.invalidate_cache(
+                f"{self.base_url}/ns-api/v2/subscriptions"
+            )
+        self.logger.info(
+            "Subscription %s updated successfully: %s",
+            subscription_id,
+            summarize(result),
+        )
+        return result
 
-    async def delete_subscription(self, subscription_id: str) -> dict:
+    async def delete_subscription(
+        self, subscription_id: str, deadline: Optional[float] = None
+    ) -> dict:
         """
         Delete an event subscription by its ID.
 
         :param subscription_id: The ID of the subscription to delete.
+        :param deadline: Optional. Total time budget in seconds for the call, including retries.
         :return: A dictionary containing the API response or confirmation message.
         """
         # Validate subscription ID
@@ -329,39 +337,25 @@ class SubscriptionAPI:
 
         # Construct the URL
         url = f"{self.base_url}/ns-api/v2/subscriptions/{subscription_id}"
-        self.logger.debug(f"Deleting subscription {subscription_id} at {url}")
+        self.logger.debug("Deleting subscription %s at %s", subscription_id, url)
 
         # Make DELETE request
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {self.auth_data['access_token']}"}
-            try:
-                async with session.delete(url, headers=headers) as response:
-                    if response.status == 202:
-                        result = await response.json()
-                        self.logger.info(
-                            f"Subscription {subscription_id} deleted successfully: {result}"
-                        )
-                        return result
-                    else:
-                        error_message = await response.text()
-                        self.logger.error(
-                            f"Failed to delete subscription {subscription_id}. "
-                            f"Status: {response.status}, Error: {error_message}"
-                        )
-                        raise Exception(
-                            f"Failed to delete subscription: {error_message}"
-                        )
-            except aiohttp.ClientError as e:
-                self.logger.error(
-                    f"Network error while deleting subscription {subscription_id}: {e}"
-                )
-                raise Exception(
-                    "Network error occurred while deleting subscription."
-                ) from e
-            except Exception as e:
-                self.logger.error(
-                    f"Unexpected error while deleting subscription {subscription_id}: {e}"
-                )
-                raise Exception(
-                    "An unexpected error occurred while deleting subscription."
-                ) from e
+        try:
+            result = await self.auth_client.request(
+                "DELETE",
+                url,
+                group="subscriptions",
+                action=f"delete subscription {subscription_id}",
+                ok_statuses=(202,),
+                deadline=deadline,
+            )
+        finally:
+            self.auth_client.invalidate_cache(
+                f"{self.base_url}/ns-api/v2/subscriptions"
+            )
+        self.logger.info(
+            "Subscription %s deleted successfully: %s",
+            subscription_id,
+            summarize(result),
+        )
+        return result
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from .auth import NetsapiensAPI
+from .concurrency import run_bounded
+from .log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+TenantKey = Tuple[str, str, str]
+
+
+def tenant_key(auth_config: dict) -> TenantKey:
+    """
+    Return the (base_url, client_id, username) key identifying a set of credentials.
+    """
+    return (
+        auth_config.get("base_url") or "",
+        auth_config.get("client_id") or "",
+        auth_config.get("username") or "",
+    )
+
+
+class TokenStore:
+    def __init__(self, path: str):
+        """
+        JSON file holding token data for several tenants.
+
+        The file is created with mode 0600 and its directory with mode 0700, since it
+        contains access and refresh tokens. Writes take an exclusive lock on a sibling
+        ".lock" file, re-read the file and replace it atomically, so several processes
+        can share one cache without losing each other's tokens. Locking is skipped on
+        platforms without fcntl.
+
+        :param path: Location of the cache file.
+        """
+        self.path = os.path.expanduser(path)
+        self._lock_path = self.path + ".lock"
+
+    def load(self) -> Dict[str, dict]:
+        """
+        Return every stored token, keyed by the string form of the tenant key.
+        """
+        with self._locked(exclusive=False):
+            return self._read()
+
+    def save(self, key: TenantKey, token_data: dict):
+        """
+        Store the token data of one tenant.
+
+        :param key: The tenant key, see tenant_key().
+        :param token_data: The token data returned by the token endpoint.
+        """
+        with self._locked(exclusive=True):
+            tokens = self._read()
+            tokens[self.entry_name(key)] = token_data
+            self._write(tokens)
+
+    def delete(self, key: TenantKey):
+        """
+        Remove the token data of one tenant.
+        """
+        with self._locked(exclusive=True):
+            tokens = self._read()
+            if tokens.pop(self.entry_name(key), None) is not None:
+                self._write(tokens)
+
+    @staticmethod
+    def entry_name(key: TenantKey) -> str:
+        return "|".join(key)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r") as f:
+                tokens = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            # A corrupt cache only costs a fresh login
+            return {}
+        return tokens if isinstance(tokens, dict) else {}
+
+    def _write(self, tokens: Dict[str, dict]):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(tokens, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+class TokenPool:
+    def __init__(
+        self,
+        cache_path: Optional[str] = None,
+        refresh_concurrency: int = 10,
+        min_refresh_interval: float = 5.0,
+        log_level=logging.INFO,
+        **client_options,
+    ):
+        """
+        Manage authenticated NetsapiensAPI clients for many sets of credentials.
+
+        Clients are keyed by (base_url, client_id, username), so asking twice for the
+        same credentials returns the same client. A single scheduler task refreshes
+        every tenant's token shortly before it expires, instead of one background task
+        per client. When `cache_path` is set, tokens are persisted there after every
+        login or refresh, and a restarted process reuses still valid tokens (or their
+        refresh tokens) instead of performing a password grant per tenant.
+
+        :param cache_path: Optional path of the token cache file, e.g.
+                           "~/.cache/netsapiens/tokens.json".
+        :param refresh_concurrency: Maximum number of tenants refreshed at the same time.
+        :param min_refresh_interval: Minimum seconds between two refreshes of the same
+                                     tenant, so a token that is already due again
+                                     right after a refresh (e.g. a very short
+                                     expires_in) does not hammer the token endpoint.
+        :param log_level: Logging level (default is INFO).
+        :param client_options: Extra keyword arguments for every NetsapiensAPI, e.g.
+                               refresh_skew or rate_limits.
+        """
+        self.store = TokenStore(cache_path) if cache_path else None
+        self.refresh_concurrency = refresh_concurrency
+        self.min_refresh_interval = min_refresh_interval
+        self.client_options = dict(client_options, auto_refresh=False)
+        self.client_options.setdefault("log_level", log_level)
+
+        self._clients: Dict[TenantKey, NetsapiensAPI] = {}
+        self._opening: Dict[TenantKey, asyncio.Task] = {}
+        self._load_task: Optional[asyncio.Task] = None
+        self._retry_at: Dict[TenantKey, float] = {}
+        self._retry_delay: Dict[TenantKey, float] = {}
+        self._not_before: Dict[TenantKey, float] = {}
+        self._save_lock: Optional[asyncio.Lock] = None
+        self._pending_saves = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._scheduler_task: Optional[asyncio.Task] = None
+
+        self.logins = 0
+        self.reused = 0
+        self.refreshes = 0
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("TokenPool initialized")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def __len__(self):
+        return len(self._clients)
+
+    async def get_client(self, auth_config: dict) -> NetsapiensAPI:
+        """
+        Return an authenticated client for the credentials in `auth_config`.
+
+        :param auth_config: Dictionary with base_url, client_id, client_secret,
+                            username and password, as for NetsapiensAPI.
+        :return: A NetsapiensAPI instance holding a valid token.
+        """
+        key = tenant_key(auth_config)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        task = self._opening.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._open(key, auth_config))
+            self._opening[key] = task
+            task.add_done_callback(lambda _: self._opening.pop(key, None))
+        return await asyncio.shield(task)
+
+    def clients(self) -> List[NetsapiensAPI]:
+        """
+        Return the clients opened so far.
+        """
+        return list(self._clients.values())
+
+    async def close(self):
+        """
+        Stop the refresh scheduler, finish pending cache writes and close every client.
+        """
+        task, self._scheduler_task = self._scheduler_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._pending_saves:
+            await asyncio.gather(*self._pending_saves, return_exceptions=True)
+        await asyncio.gather(
+            *(client.close() for client in self._clients.values()),
+            return_exceptions=True,
+        )
+        self._clients.clear()
+        self._not_before.clear()
+
+    async def _open(self, key: TenantKey, auth_config: dict) -> NetsapiensAPI:
+        client = NetsapiensAPI(auth_config, **self.client_options)
+        stored = await self._stored_token(key)
+        try:
+            if stored is not None:
+                # check_token_expiry() reuses the token if it is still valid, and
+                # otherwise tries its refresh token before falling back to a login
+                client.token_data = stored
+                await client.check_token_expiry()
+                if client.token_data is stored:
+                    self.reused += 1
+                    self.logger.debug("Reusing cached token for %s@%s", key[2], key[0])
+            else:
+                await client.get_token()
+                self.logins += 1
+        except BaseException:
+            await client.close()
+            raise
+
+        client.add_token_listener(lambda token_data: self._on_token(key, token_data))
+        if client.token_data is not stored:
+            self._on_token(key, client.token_data)
+        self._clients[key] = client
+        self._ensure_scheduler()
+        return client
+
+    async def _stored_token(self, key: TenantKey) -> Optional[dict]:
+        if self.store is None:
+            return None
+        if self._load_task is None:
+            # Read the file once, however many tenants are opened concurrently
+            self._load_task = asyncio.ensure_future(self._load_store())
+        stored = await asyncio.shield(self._load_task)
+        token_data = stored.get(TokenStore.entry_name(key))
+        if not isinstance(token_data, dict) or "access_token" not in token_data:
+            return None
+        return token_data
+
+    async def _load_store(self) -> Dict[str, dict]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self.store.load)
+        except OSError as e:
+            self.logger.warning(f"Could not read token cache: {e}")
+            return {}
+
+    def _on_token(self, key: TenantKey, token_data: dict):
+        self._retry_at.pop(key, None)
+        self._retry_delay.pop(key, None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self.store is not None:
+            task = asyncio.ensure_future(self._persist(key, token_data))
+            self._pending_saves.add(task)
+            task.add_done_callback(self._pending_saves.discard)
+
+    async def _persist(self, key: TenantKey, token_data: dict):
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        # Serialise the writes so an older token never overwrites a newer one
+        async with self._save_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self.store.save, key, token_data)
+            except OSError as e:
+                self.logger.warning(f"Could not write token cache: {e}")
+
+    def _ensure_scheduler(self):
+        if self._scheduler_task is None or self._scheduler_task.done():
+            self._wakeup = asyncio.Event()
+            self._scheduler_task = asyncio.ensure_future(self._schedule_loop())
+
+    def _due_at(self, key: TenantKey, client: NetsapiensAPI) -> float:
+        return max(
+            client.token_refresh_at,
+            self._retry_at.get(key, 0.0),
+            self._not_before.get(key, 0.0),
+        )
+
+    async def _schedule_loop(self):
+        """
+        Refresh the tokens of every tenant from one task, earliest deadline first.
+        """
+        while True:
+            now = time.monotonic()
+            due = [
+                key
+                for key, client in self._clients.items()
+                if self._due_at(key, client) <= now
+            ]
+            if due:
+                async for outcome in run_bounded(
+                    due, self._refresh, self.refresh_concurrency
+                ):
+                    if not outcome.ok:
+                        self._back_off(outcome.item, outcome.error)
+                continue
+
+            next_at = min(
+                (self._due_at(key, client) for key, client in self._clients.items()),
+                default=None,
+            )
+            self._wakeup.clear()
+            try:
+                if next_at is None:
+                    await self._wakeup.wait()
+                else:
+                    await asyncio.wait_for(self._wakeup.wait(), next_at - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self, key: TenantKey):
+        await self._clients[key].refresh_token()
+        self.refreshes += 1
+        self._not_before[key] = time.monotonic() + self.min_refresh_interval
+
+    def _back_off(self, key: TenantKey, error: BaseException):
+        delay = min(self._retry_delay.get(key, 0.5) * 2, 60.0)
+        self._retry_delay[key] = delay
+        self._retry_at[key] = time.monotonic() + delay
+        self.logger.error(
+            f"Token refresh for {key[2]}@{key[0]} failed, retrying in {delay}s: {error}"
+        )
+
+    def stats(self) -> dict:
+        """
+        Return the number of tenants, logins, reused cached tokens and refreshes.
+        """
+        return {
+            "tenants": len(self._clients),
+            "logins": self.logins,
+            "reused": self.reused,
+            "refreshes": self.refreshes,
+            "failing": len(self._retry_at),
+        }
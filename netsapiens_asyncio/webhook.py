@@ -0,0 +1,408 @@
+import asyncio
+import hmac
+import inspect
+import json
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+import aiohttp
+from aiohttp import web
+from .log import get_logger
+from .subscribe import SubscriptionAPI
+
+EventHandler = Callable[["WebhookEvent"], Awaitable[None]]
+DeliveryVerifier = Callable[[web.Request, bytes], Union[bool, Awaitable[bool]]]
+
+
+class WebhookEvent:
+    __slots__ = ("model", "payload", "received_at")
+
+    def __init__(self, model: str, payload: dict, received_at: float):
+        """
+        A single event delivered by a subscription.
+
+        :param model: The subscription model the event belongs to (e.g. call, cdr).
+        :param payload: The decoded event.
+        :param received_at: time.time() when the delivery was accepted.
+        """
+        self.model = model
+        self.payload = payload
+        self.received_at = received_at
+
+    def __repr__(self):
+        return f"WebhookEvent(model={self.model!r}, payload={self.payload!r})"
+
+
+class RateMeter:
+    def __init__(self, window: int = 10):
+        """
+        Count events in one-second buckets and report the average rate over a window.
+
+        :param window: Length of the averaging window in seconds.
+        """
+        self.window = window
+        self._buckets = deque()
+
+    def add(self, count: int = 1):
+        second = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += count
+        else:
+            self._buckets.append([second, count])
+        self._expire(second)
+
+    def rate(self) -> float:
+        """
+        Return the average number of events per second over the window.
+        """
+        self._expire(int(time.monotonic()))
+        return sum(count for _, count in self._buckets) / self.window
+
+    def _expire(self, second: int):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        path: str = "/netsapiens",
+        max_queue_events: int = 10000,
+        workers: int = 4,
+        enqueue_timeout: float = 1.0,
+        max_body_size: int = 16 * 1024 * 1024,
+        spool=None,
+        secret: Optional[str] = None,
+        verify: Optional[DeliveryVerifier] = None,
+        log_level=logging.INFO,
+    ):
+        """
+        Receive subscription event deliveries and dispatch them to async handlers.
+
+        Subscriptions should post to `{path}/{model}`, e.g.
+        https://hooks.example.com/netsapiens/call for the "call" model. Each delivery may
+        contain a single event object or a JSON array of events. Deliveries are validated,
+        placed on a bounded queue and acknowledged before any handler runs; a pool of
+        worker tasks then dispatches them.
+
+        When the queue is full, a delivery waits up to `enqueue_timeout` seconds for
+        space and is then refused with 503 and Retry-After, so the PBX slows down instead
+        of events being dropped.
+
+        Without `secret` or `verify`, anyone who can reach the port can post events.
+        When either is set, a delivery that fails the check is refused with 401 before
+        it is queued.
+
+        :param host: Interface to listen on.
+        :param port: Port to listen on.
+        :param path: URL prefix the subscriptions post to.
+        :param max_queue_events: Maximum number of events waiting to be processed.
+        :param workers: Number of worker tasks running handlers.
+        :param enqueue_timeout: Seconds a delivery may wait for queue space.
+        :param max_body_size: Largest accepted request body in bytes.
+        :param spool: Optional open EventSpool. Each delivery is appended to it, and
+                      only acknowledged once it is on disk. If the append fails the
+                      delivery is refused with 503 so the PBX retries it.
+        :param secret: Optional shared secret. A delivery must carry it as the `token`
+                       query parameter, e.g. a post_url ending in "/call?token=...",
+                       or as an "Authorization: Bearer" header.
+        :param verify: Optional function called as verify(request, body) with the raw
+                       body, returning True (or an awaitable of True) to accept the
+                       delivery. Use it for HMAC signatures or IP allow-lists.
+        :param log_level: Logging level (default is INFO).
+        """
+        self.host = host
+        self.port = port
+        self.path = path.rstrip("/")
+        self.max_queue_events = max_queue_events
+        self.workers = workers
+        self.enqueue_timeout = enqueue_timeout
+        self.max_body_size = max_body_size
+        self.spool = spool
+        self.secret = secret
+        self.verify = verify
+
+        self._handlers: Dict[str, List[EventHandler]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._space = None
+        self._depth = 0
+        self._worker_tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.unauthorized = 0
+        self.ingest_meter = RateMeter()
+
+        # Create a dedicated logger for this class
+        self.logger = get_logger(self.__class__.__name__, log_level)
+
+        self.logger.debug("WebhookServer initialized")
+
+    def add_handler(self, model: str, handler: EventHandler):
+        """
+        Register an async handler for events of a subscription model.
+
+        :param model: One of SubscriptionAPI.VALID_MODELS, or "*" for every model.
+        :param handler: Coroutine function called with each WebhookEvent.
+        """
+        if model != "*" and model not in SubscriptionAPI.VALID_MODELS:
+            raise ValueError(
+                f"Invalid model '{model}'. Must be one of: {', '.join(SubscriptionAPI.VALID_MODELS)}"
+            )
+        self._handlers.setdefault(model, []).append(handler)
+
+    def on(self, model: str):
+        """
+        Decorator form of add_handler().
+
+        :param model: One of SubscriptionAPI.VALID_MODELS, or "*" for every model.
+        """
+
+        def decorator(handler: EventHandler) -> EventHandler:
+            self.add_handler(model, handler)
+            return handler
+
+        return decorator
+
+    def make_app(self) -> web.Application:
+        """
+        Build the aiohttp application. Useful with aiohttp's test client or to mount the
+        receiver inside an existing application.
+
+        :return: An aiohttp web.Application serving the webhook routes.
+        """
+        app = web.Application(client_max_size=self.max_body_size)
+        app.router.add_post(self.path + "/{model}", self._handle_delivery)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def start(self):
+        """
+        Start listening for deliveries and start the worker tasks.
+        """
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.logger.info(
+            f"Webhook server listening on http://{self.host}:{self.port}{self.path}/<model>"
+        )
+
+    async def stop(self):
+        """
+        Stop accepting deliveries, finish queued events and stop the workers.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def stats(self) -> dict:
+        """
+        Return ingest and processing counters, the current ingest rate and queue depth.
+        """
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "unauthorized": self.unauthorized,
+            "queue_depth": self._depth,
+            "ingest_rate": self.ingest_meter.rate(),
+        }
+
+    async def _on_startup(self, app: web.Application):
+        self._queue = asyncio.Queue()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._depth = 0
+        self._worker_tasks = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def _on_cleanup(self, app: web.Application):
+        # Let the workers drain what has already been acknowledged
+        if self._queue is not None:
+            await self._queue.join()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def _handle_delivery(self, request: web.Request) -> web.Response:
+        model = request.match_info["model"]
+        if model not in SubscriptionAPI.VALID_MODELS:
+            return web.json_response({"error": f"Unknown model '{model}'"}, status=404)
+
+        raw = await request.read()
+        if not await self._authorized(request, raw):
+            self.unauthorized += 1
+            self.logger.warning(
+                f"Refusing unauthorized {model} delivery from {request.remote}"
+            )
+            return web.json_response({"error": "Unauthorized"}, status=401)
+
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            return web.json_response({"error": "Body is not valid JSON"}, status=400)
+
+        events = body if isinstance(body, list) else [body]
+        if not all(isinstance(event, dict) for event in events):
+            return web.json_response(
+                {"error": "Each event must be a JSON object"}, status=400
+            )
+        if not events:
+            return web.json_response({"accepted": 0})
+
+        if not await self._reserve(len(events)):
+            self.rejected += len(events)
+            self.logger.warning(f"Queue full, refusing {len(events)} {model} event(s)")
+            return web.json_response(
+                {"error": "Receiver is busy"}, status=503, headers={"Retry-After": "1"}
+            )
+
+        received_at = time.time()
+        batch = [WebhookEvent(model, event, received_at) for event in events]
+        if self.spool is not None:
+            try:
+                await self.spool.append_events(batch)
+            except Exception as e:
+                self._depth -= len(events)
+                self._space.set()
+                self.rejected += len(events)
+                self.logger.error(
+                    f"Failed to spool {len(events)} {model} event(s): {e}"
+                )
+                return web.json_response(
+                    {"error": "Receiver is unavailable"},
+                    status=503,
+                    headers={"Retry-After": "1"},
+                )
+        self._queue.put_nowait(batch)
+        self.received += len(events)
+        self.ingest_meter.add(len(events))
+        return web.json_response({"accepted": len(events)})
+
+    async def _authorized(self, request: web.Request, body: bytes) -> bool:
+        if self.secret is not None:
+            token = request.query.get("token")
+            if token is None:
+                scheme, _, token = request.headers.get("Authorization", "").partition(
+                    " "
+                )
+                if scheme.lower() != "bearer":
+                    return False
+            if not hmac.compare_digest(token.encode(), self.secret.encode()):
+                return False
+        if self.verify is not None:
+            try:
+                accepted = self.verify(request, body)
+                if inspect.isawaitable(accepted):
+                    accepted = await accepted
+            except Exception as e:
+                self.logger.error(f"Failed to verify delivery: {e}")
+                return False
+            if not accepted:
+                return False
+        return True
+
+    async def _reserve(self, count: int) -> bool:
+        """
+        Wait for room for `count` events on the queue. A batch larger than the whole
+        queue is admitted once the queue is empty.
+        """
+        deadline = time.monotonic() + self.enqueue_timeout
+        while self._depth and self._depth + count > self.max_queue_events:
+            self._space.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._space.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        self._depth += count
+        return True
+
+    async def _worker(self):
+        while True:
+            batch = await self._queue.get()
+            remaining = len(batch)
+            try:
+                for event in batch:
+                    await self._dispatch(event)
+                    remaining -= 1
+                    self._depth -= 1
+                    self._space.set()
+            finally:
+                self._depth -= remaining
+                self._space.set()
+                self._queue.task_done()
+
+    async def _dispatch(self, event: WebhookEvent):
+        handlers = self._handlers.get(event.model, []) + self._handlers.get("*", [])
+        # A failing handler does not keep the event from the other handlers
+        ok = True
+        for handler in handlers:
+            try:
+                await handler(event)
+            except Exception as e:
+                ok = False
+                self.logger.error(f"Handler for {event.model} event failed: {e}")
+        if ok:
+            self.processed += 1
+        else:
+            self.failed += 1
+
+
+async def send_test_events(
+    url: str,
+    model: str,
+    events: List[dict],
+    batch_size: int = 100,
+    session: Optional[aiohttp.ClientSession] = None,
+    secret: Optional[str] = None,
+) -> List[int]:
+    """
+    Post events to a webhook receiver the way the PBX would. Useful in tests and local
+    development in place of a real subscription.
+
+    :param url: Base URL of the receiver, e.g. "http://127.0.0.1:8080/netsapiens".
+    :param model: The subscription model to deliver as.
+    :param events: The events to deliver.
+    :param batch_size: Number of events per delivery.
+    :param session: Optional aiohttp session to use.
+    :param secret: Optional shared secret sent as the `token` query parameter.
+    :return: The HTTP status of each delivery.
+    """
+    params = {"token": secret} if secret is not None else None
+    owns_session = session is None
+    if owns_session:
+        session = aiohttp.ClientSession()
+    statuses = []
+    try:
+        for start in range(0, len(events), batch_size):
+            async with session.post(
+                f"{url.rstrip('/')}/{model}",
+                json=events[start : start + batch_size],
+                params=params,
+            ) as response:
+                statuses.append(response.status)
+    finally:
+        if owns_session:
+            await session.close()
+    return statuses
@@ -11,6 +11,7 @@ setup(
     url="https://github.com/DallanL/netsapiens-asyncio.git",
     packages=find_packages(),
     install_requires=["aiohttp"],
+    extras_require={"fast": ["orjson"], "cdr": ["numpy"]},
     python_requires=">=3.7",
     classifiers=[
         "Programming Language :: Python :: 3",
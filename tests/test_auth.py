@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import MockNetsapiens
+from netsapiens_asyncio.auth import NetsapiensAPI
+from netsapiens_asyncio.exceptions import (
+    AuthenticationError,
+    NetworkError,
+    RateLimitError,
+    ServerError,
+)
+
+
+def refresh_with_failing_endpoint(status: int):
+    async def main():
+        async with MockNetsapiens(error_status=status) as mock:
+            api = NetsapiensAPI(mock.auth_config(), log_level=50, auto_refresh=False)
+            async with api:
+                await api.get_token()
+                before = mock.requests
+                mock.error_rate = 1.0
+                with pytest.raises(Exception) as info:
+                    await api.refresh_token()
+                return info.value, mock.requests - before
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "status, error", [(503, ServerError), (500, ServerError), (429, RateLimitError)]
+)
+def test_overloaded_token_endpoint_does_not_fall_back(status, error):
+    raised, requests = refresh_with_failing_endpoint(status)
+    assert isinstance(raised, error) and raised.retryable
+    # No password grant is sent after the failed refresh
+    assert requests == 1
+
+
+@pytest.mark.parametrize("status", [400, 401])
+def test_rejected_refresh_token_falls_back_to_password(status):
+    raised, requests = refresh_with_failing_endpoint(status)
+    assert isinstance(raised, AuthenticationError) and raised.status == status
+    assert requests == 2
+
+
+def test_unreachable_token_endpoint_raises_network_error():
+    async def main():
+        mock = MockNetsapiens()
+        await mock.start()
+        config = mock.auth_config()
+        await mock.stop()
+        api = NetsapiensAPI(config, log_level=50, auto_refresh=False)
+        async with api:
+            with pytest.raises(NetworkError):
+                await api.get_token()
+
+    asyncio.run(main())
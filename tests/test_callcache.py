@@ -0,0 +1,83 @@
+import asyncio
+
+from netsapiens_asyncio.callcache import ActiveCallStore
+
+
+class FakeCallsAPI:
+    def __init__(self, result):
+        self.result = result
+        self.queried = []
+
+    async def read_calls(self, domain):
+        self.queried.append(domain)
+        return self.result
+
+
+def call(call_id: str, domain: str = "example", user: str = "101") -> dict:
+    return {
+        "call-orig-call-id": call_id,
+        "call-orig-domain": domain,
+        "call-orig-user": user,
+    }
+
+
+def test_reconcile_repairs_cold_store():
+    api = FakeCallsAPI([call("a"), call("b", domain="other")])
+    store = ActiveCallStore(api, log_level=50)
+    asyncio.run(store.reconcile())
+    assert api.queried == ["*"]
+    assert store.count("*") == 2 and store.count("other") == 1
+    assert store.repaired == 2
+
+
+def test_reconcile_empty_body_removes_stale_calls():
+    store = ActiveCallStore(FakeCallsAPI(None), log_level=50)
+    store.apply(call("a"))
+    asyncio.run(store.reconcile())
+    assert store.count("*") == 0
+
+
+def test_background_pass_defaults_to_all_domains():
+    async def main():
+        api = FakeCallsAPI([call("a", domain="unseen")])
+        store = ActiveCallStore(api, log_level=50)
+        store.start_reconciler(interval=0.01)
+        await asyncio.sleep(0.05)
+        await store.stop_reconciler()
+        return api, store
+
+    api, store = asyncio.run(main())
+    assert set(api.queried) == {"*"}
+    assert store.count("unseen") == 1
+
+
+def test_event_only_store_does_not_keep_removed_calls():
+    store = ActiveCallStore(log_level=50)
+    for i in range(1000):
+        store.apply(call(str(i)))
+        store.apply(dict(call(str(i)), remove="yes"))
+    store.apply(dict(call("never-seen"), remove="yes"))
+    assert len(store) == 0
+    assert not store._updated_at
+
+
+def test_removal_during_reconcile_is_not_resurrected():
+    class SlowCallsAPI(FakeCallsAPI):
+        async def read_calls(self, domain):
+            await asyncio.sleep(0.01)
+            return self.result
+
+    async def main():
+        store = ActiveCallStore(SlowCallsAPI([call("a")]), log_level=50)
+        store.apply(call("a"))
+        pass_ = asyncio.ensure_future(store.reconcile())
+        await asyncio.sleep(0)
+        # The hangup arrives while the stale listing is in flight
+        store.apply(dict(call("a"), remove="yes"))
+        assert "a" in store._updated_at
+        await pass_
+        return store
+
+    store = asyncio.run(main())
+    assert len(store) == 0
+    assert not store._updated_at
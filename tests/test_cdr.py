@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from netsapiens_asyncio.cdr import CDRAggregator, numpy
+
+
+def cdrs(count: int, start: float, spread: float, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "domain": f"d{rng.randrange(3)}",
+            "user": str(rng.randrange(5)),
+            "time-start": start + rng.random() * spread,
+            "time-talking": rng.choice([0, 0, rng.randrange(1, 600)]),
+            "duration": rng.randrange(1, 900),
+        }
+        for _ in range(count)
+    ]
+
+
+def expected(aggregator: CDRAggregator, span: float, now: float, by=None) -> list:
+    windows = max(1, int(-(-span // aggregator.window)))
+    end = (int(now // aggregator.window) + 1) * aggregator.window
+    start = end - windows * aggregator.window
+    return aggregator.totals(start, end, by, per_window=False)
+
+
+def same(rows: list, other: list):
+    assert len(rows) == len(other)
+    for row, reference in zip(rows, other):
+        assert row.keys() == reference.keys()
+        for name, value in row.items():
+            assert value == pytest.approx(reference[name]), name
+
+
+@pytest.mark.parametrize("use_numpy", [False, True] if numpy is not None else [False])
+def test_rolling_matches_totals_as_data_arrives(use_numpy):
+    aggregator = CDRAggregator(window=60, batch_size=50, use_numpy=use_numpy)
+    base = 1_700_000_000.0
+    now = base
+    for step in range(30):
+        # Mostly new CDRs, plus some late ones landing in older windows
+        aggregator.extend(cdrs(40, now, 120, seed=step))
+        aggregator.extend(cdrs(10, now - 900, 900, seed=1000 + step))
+        now += 90
+        for span in (300, 900):
+            same(aggregator.rolling(span, now=now), expected(aggregator, span, now))
+            same(
+                aggregator.rolling(span, by=("domain",), now=now),
+                expected(aggregator, span, now, ("domain",)),
+            )
+    # Moving back in time and jumping far ahead are handled too
+    for moment in (now - 400, now - 5000, now + 10, now + 10000):
+        same(aggregator.rolling(900, now=moment), expected(aggregator, 900, moment))
+
+
+def test_rolling_follows_retention():
+    aggregator = CDRAggregator(window=60, retention=300, batch_size=10)
+    base = 1_700_000_000.0
+    aggregator.extend(cdrs(30, base, 600))
+    aggregator.rolling(3600)
+    aggregator.extend(cdrs(30, base + 600, 600, seed=2))
+    assert aggregator.rolling(3600) == aggregator.totals(by=None, per_window=False)
+
+
+def test_rolling_defaults_to_newest_data():
+    aggregator = CDRAggregator(window=60, by=("domain",))
+    assert aggregator.rolling(600) == []
+    aggregator.extend(cdrs(20, 1_700_000_000.0, 300))
+    newest = max(row["window_start"] for row in aggregator.totals())
+    same(aggregator.rolling(600), expected(aggregator, 600, newest))
+
+
+@pytest.mark.skipif(numpy is None, reason="numpy is not installed")
+def test_numpy_group_by_does_not_overflow():
+    records = [
+        {"domain": "a", "user": "1", "time-start": 0.0, "time-talking": 5},
+        {"domain": "b", "user": "2", "time-start": 1e10, "time-talking": 0},
+        {"domain": "a", "user": "2", "time-start": 1e10, "time-talking": 7},
+    ]
+    # A tiny window over a wide span would overflow a packed int64 key
+    fast = CDRAggregator(window=0.001, use_numpy=True)
+    slow = CDRAggregator(window=0.001, use_numpy=False)
+    for aggregator in (fast, slow):
+        for _ in range(2000):
+            aggregator.users.encode(f"pad{_}")
+            aggregator.domains.encode(f"pad{_}")
+        aggregator.extend(records)
+    assert fast.totals() == slow.totals()
+    assert len(fast.totals()) == 3
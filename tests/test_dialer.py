@@ -0,0 +1,97 @@
+import asyncio
+
+from benchmarks.mock_server import MockNetsapiens
+from netsapiens_asyncio.auth import NetsapiensAPI
+from netsapiens_asyncio.calls import CallsAPI
+from netsapiens_asyncio.dialer import CampaignDialer
+from netsapiens_asyncio.exceptions import NetsapiensAPIError, ServerError
+
+
+def collect(dialer: CampaignDialer, requests) -> list:
+    async def main():
+        return [outcome async for outcome in dialer.dial(requests)]
+
+    return asyncio.run(asyncio.wait_for(main(), 10))
+
+
+class FakeCallsAPI:
+    def __init__(self, failures: int = 0, poll_error=None):
+        self.failures = failures
+        self.poll_error = poll_error
+        self.attempts = {}
+
+    async def read_calls(self, domain, user=None, count=False):
+        if self.poll_error is not None:
+            raise self.poll_error
+        return {"total": 0}
+
+    async def new_call(
+        self, domain, user, synchronous, destination, call_id, **options
+    ):
+        self.attempts[call_id] = self.attempts.get(call_id, 0) + 1
+        if self.attempts[call_id] <= self.failures:
+            raise ServerError("Failed to place call: 503", 503)
+        return {"call-id": call_id}
+
+
+def test_dial_completes_against_mock_server():
+    async def main():
+        async with MockNetsapiens(calls=0, call_duration=0.05) as mock:
+            api = NetsapiensAPI(mock.auth_config(), log_level=50)
+            async with api:
+                await api.get_token()
+                dialer = CampaignDialer(
+                    CallsAPI(api, log_level=50),
+                    target_active=3,
+                    poll_interval=0.02,
+                    log_level=50,
+                )
+                requests = [("example", "101", f"1555000{i:04d}") for i in range(12)]
+                outcomes = [outcome async for outcome in dialer.dial(requests)]
+                return outcomes, dialer.stats()
+
+    outcomes, stats = asyncio.run(asyncio.wait_for(main(), 10))
+    assert sorted(outcome.index for outcome in outcomes) == list(range(12))
+    assert all(outcome.ok for outcome in outcomes)
+    assert stats["placed"] == 12 and stats["failed"] == 0
+
+
+def test_retryable_failures_are_retried_with_the_same_call_id():
+    api = FakeCallsAPI(failures=1)
+    dialer = CampaignDialer(
+        api, poll_interval=0.01, retry_delay=0.01, max_attempts=3, log_level=50
+    )
+    outcomes = collect(
+        dialer, [("example", "101", "15550001"), ("example", "102", "2")]
+    )
+    assert all(outcome.ok and outcome.attempts == 2 for outcome in outcomes)
+    assert sorted(api.attempts.values()) == [2, 2]
+    assert dialer.stats()["retried"] == 2
+
+
+def test_attempts_are_bounded():
+    dialer = CampaignDialer(
+        FakeCallsAPI(failures=10),
+        poll_interval=0.01,
+        retry_delay=0.01,
+        max_attempts=2,
+        log_level=50,
+    )
+    (outcome,) = collect(dialer, [("example", "101", "15550001")])
+    assert isinstance(outcome.error, ServerError) and outcome.attempts == 2
+
+
+def test_failing_count_reads_fail_the_waiting_calls():
+    error = NetsapiensAPIError("Failed to retrieve calls: 403", 403)
+    dialer = CampaignDialer(
+        FakeCallsAPI(poll_error=error),
+        poll_interval=0.01,
+        max_poll_failures=2,
+        backlog=2,
+        log_level=50,
+    )
+    requests = [("example", "101", str(i)) for i in range(5)]
+    outcomes = collect(dialer, requests)
+    assert len(outcomes) == 5
+    assert all(outcome.error is error and outcome.attempts == 0 for outcome in outcomes)
+    assert dialer.stats()["failed"] == 5
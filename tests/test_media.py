@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import json
+import os
+
+import pytest
+
+from netsapiens_asyncio.media import CHUNK_SIZE, MessageBody, prepare_media
+
+FIELDS = {"type": "mms", "message": "hi", "destination": ["15555550100"]}
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def media_bytes(size: int) -> bytes:
+    data = (PNG + bytes(range(256)) * (size // 256 + 1))[:size]
+    assert len(data) == size
+    return data
+
+
+async def iterate(data: bytes, step: int):
+    for start in range(0, len(data), step):
+        yield data[start : start + step]
+
+
+async def send(body: MessageBody) -> bytes:
+    await body.resolve()
+    sent = b"".join([chunk async for chunk in body.open()])
+    if body.length is not None:
+        assert body.length == len(sent)
+    return sent
+
+
+def check(sent: bytes, data: bytes, mime_type: str = "image/png"):
+    document = json.loads(sent)
+    assert base64.b64decode(document.pop("data"), validate=True) == data
+    assert document.pop("mime-type") == mime_type
+    assert document.pop("size") == str(len(data))
+    assert document == FIELDS
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 1000, CHUNK_SIZE + 1, 2 * CHUNK_SIZE + 2])
+def test_bytes_round_trip(size):
+    data = media_bytes(size)
+    sent = asyncio.run(send(MessageBody(FIELDS, data, "image/png", _dumps)))
+    check(sent, data)
+
+
+@pytest.mark.parametrize("step", [1, 4, 1000, CHUNK_SIZE + 2])
+def test_async_iterator_round_trip(step):
+    data = media_bytes(3 * 1000 + 1 if step < 10 else CHUNK_SIZE * 2 + 1)
+    body = MessageBody(FIELDS, iterate(data, step), None, _dumps)
+    sent = asyncio.run(send(body))
+    assert body.length is None and not body.replayable
+    check(sent, data)
+    with pytest.raises(ValueError):
+        body.open()
+
+
+def test_path_round_trip_detects_type(tmp_path):
+    data = media_bytes(CHUNK_SIZE * 3 + 2)
+    path = tmp_path / "photo"
+    path.write_bytes(data)
+    body = MessageBody(FIELDS, str(path), None, _dumps)
+    check(asyncio.run(send(body)), data)
+    # A path can be sent again, e.g. on retry
+    assert body.replayable
+    check(asyncio.run(send(body)), data)
+
+
+@pytest.mark.parametrize("spool_size", [10**9, 1000])
+def test_prepared_media_round_trip(spool_size):
+    data = media_bytes(CHUNK_SIZE * 2 + 1)
+
+    async def main():
+        media = await prepare_media(iterate(data, 7777), spool_size=spool_size)
+        with media:
+            assert (media.path is not None) == (spool_size < media.encoded_size)
+            first = await send(MessageBody(FIELDS, media, None, _dumps))
+            second = await send(MessageBody(FIELDS, media, None, _dumps))
+            path = media.path
+        assert path is None or not os.path.exists(path)
+        return media, first, second
+
+    media, first, second = asyncio.run(main())
+    assert media.size == len(data) and media.mime_type == "image/png"
+    check(first, data)
+    assert first == second
+
+
+def test_prefix_does_not_depend_on_encoder_layout():
+    def spaced(value) -> bytes:
+        return json.dumps(value, indent=2).encode() + b"\n"
+
+    data = media_bytes(10)
+    check(asyncio.run(send(MessageBody(FIELDS, data, None, spaced))), data)
+
+
+def test_streamed_media_is_not_retried():
+    from benchmarks.mock_server import MockNetsapiens
+    from netsapiens_asyncio.auth import NetsapiensAPI
+    from netsapiens_asyncio.exceptions import RateLimitError
+    from netsapiens_asyncio.messages import MessageAPI
+
+    async def main():
+        async with MockNetsapiens(error_status=429) as mock:
+            api = NetsapiensAPI(mock.auth_config(), log_level=50)
+            async with api:
+                await api.get_token()
+                mock.error_rate = 1.0
+                messages = MessageAPI(api, log_level=50)
+                with pytest.raises(RateLimitError):
+                    await messages.send_message(
+                        "mms",
+                        "hi",
+                        "15555550100",
+                        "15555550101",
+                        media=iterate(media_bytes(1000), 100),
+                    )
+                return mock.errors_injected
+
+    assert asyncio.run(main()) == 1
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from benchmarks.mock_server import MockNetsapiens
+from netsapiens_asyncio.auth import NetsapiensAPI
+from netsapiens_asyncio.messages import MessageAPI
+from netsapiens_asyncio.messagesync import MessageStore, MessageSync, SessionWatermark
+
+
+def message(i: int, session: str = "s1") -> dict:
+    return {
+        "id": f"{session}-{i}",
+        "messagesession": session,
+        "message": f"text {i}",
+        "timestamp": f"2024-12-09 21:27:{i:02d}",
+    }
+
+
+def test_save_upserts_messages_and_session(tmp_path):
+    async def main():
+        async with MessageStore(str(tmp_path / "messages.db"), log_level=50) as store:
+            watermark = SessionWatermark("s1", "mock.example", "1000")
+            first = await store.save(
+                watermark, {"messagesession": "s1", "v": 1}, [message(0), message(1)], 0
+            )
+            second = await store.save(
+                watermark,
+                {"messagesession": "s1", "v": 2},
+                [message(1), message(2)],
+                0,
+            )
+            return (
+                first,
+                second,
+                await store.messages("s1"),
+                await store.sessions(),
+                await store.watermarks(),
+            )
+
+    first, second, messages, sessions, watermarks = asyncio.run(main())
+    assert (first, second) == (2, 1)
+    assert [m["id"] for m in messages] == ["s1-0", "s1-1", "s1-2"]
+    assert sessions == [{"messagesession": "s1", "v": 2}]
+    assert watermarks["s1"].message_count == 3
+    assert not watermarks["s1"].dirty
+
+
+def test_mark_dirty_during_save_stays_dirty(tmp_path):
+    async def main():
+        async with MessageStore(str(tmp_path / "messages.db"), log_level=50) as store:
+            await store.mark_dirty([("s1", "mock.example", "1000"), ("s2", "x", "y")])
+            started = time.time()
+            # s1 changes again while its fetch is in flight, s2 does not
+            await store.mark_dirty([("s1", "mock.example", "1000")])
+            await store.save(
+                SessionWatermark("s1", "mock.example", "1000"), None, [], started
+            )
+            await store.save(SessionWatermark("s2", "x", "y"), None, [], started)
+            return [w.messagesession for w in await store.dirty_sessions()]
+
+    assert asyncio.run(main()) == ["s1"]
+
+
+def sync_against_mock(tmp_path, during_fetch=None):
+    async def main():
+        async with MockNetsapiens(sessions=3, messages=5) as mock:
+            api = NetsapiensAPI(mock.auth_config(), log_level=50)
+            async with api:
+                await api.get_token()
+                message_api = MessageAPI(api, log_level=50)
+                async with MessageStore(
+                    str(tmp_path / "messages.db"), log_level=50
+                ) as store:
+                    sync = MessageSync(message_api, store, page_size=2, log_level=50)
+                    if during_fetch is not None:
+                        get_messages = message_api.get_messages
+
+                        async def fetch(**kwargs):
+                            await during_fetch(sync, kwargs)
+                            return await get_messages(**kwargs)
+
+                        message_api.get_messages = fetch
+                    first = await sync.sync()
+                    second = await sync.sync()
+                    counts = {
+                        s: w.message_count
+                        for s, w in (await store.watermarks()).items()
+                    }
+                    return first, second, counts
+
+    return asyncio.run(main())
+
+
+def test_sync_fetches_only_changed_sessions(tmp_path):
+    first, second, counts = sync_against_mock(tmp_path)
+    assert first == {"synced": 3, "failed": 0, "added": 15, "listed": 3, "skipped": 0}
+    assert second == {"synced": 0, "failed": 0, "added": 0, "listed": 3, "skipped": 3}
+    assert sorted(counts.values()) == [5, 5, 5]
+
+
+def test_event_during_sync_keeps_session_dirty(tmp_path):
+    marked = set()
+
+    async def during_fetch(sync, kwargs):
+        session = kwargs.get("messagesession") or ""
+        if session.endswith("0") and session not in marked:
+            marked.add(session)
+            await sync.mark_dirty([{"messagesession": session}])
+
+    first, second, _ = sync_against_mock(tmp_path, during_fetch)
+    assert first["added"] == 15
+    # The session dirtied mid-fetch is fetched again, the others are skipped
+    assert second == {"synced": 1, "failed": 0, "added": 0, "listed": 3, "skipped": 2}
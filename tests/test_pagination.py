@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from netsapiens_asyncio.pagination import Paginator
+
+
+def make_fetch(total: int, calls: list):
+    async def fetch_page(offset, limit):
+        calls.append((offset, limit))
+        await asyncio.sleep(0)
+        return list(range(offset, min(offset + limit, total)))
+
+    return fetch_page
+
+
+def collect(paginator: Paginator) -> list:
+    async def main():
+        return [item async for item in paginator]
+
+    return asyncio.run(main())
+
+
+def test_iterates_all_pages():
+    calls = []
+    assert collect(Paginator(make_fetch(25, calls), page_size=10)) == list(range(25))
+    assert calls == [(0, 10), (10, 10), (20, 10)]
+
+
+def test_exact_multiple_of_page_size_fetches_empty_page():
+    calls = []
+    assert collect(Paginator(make_fetch(20, calls), page_size=10)) == list(range(20))
+    assert calls[-1] == (20, 10)
+
+
+def test_max_items_limits_requests():
+    calls = []
+    paginator = Paginator(make_fetch(100, calls), page_size=10, max_items=15)
+    assert collect(paginator) == list(range(15))
+    assert calls == [(0, 10), (10, 5)]
+
+
+def test_fetch_error_is_raised_to_caller():
+    async def fetch_page(offset, limit):
+        if offset:
+            raise RuntimeError("boom")
+        return list(range(limit))
+
+    async def main():
+        received = []
+        with pytest.raises(RuntimeError):
+            async for item in Paginator(fetch_page, page_size=5):
+                received.append(item)
+        return received
+
+    assert asyncio.run(main()) == list(range(5))
+
+
+def test_prefetch_is_bounded():
+    calls = []
+
+    async def main():
+        paginator = Paginator(make_fetch(1000, calls), page_size=10, prefetch=2)
+        pages = paginator.pages()
+        await pages.__anext__()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        # One page handed out, `prefetch` queued and one blocked on the full queue
+        assert len(calls) <= 4
+        await pages.aclose()
+        assert paginator._task is None
+
+    asyncio.run(main())
+
+
+def test_early_aclose_cancels_background_fetch():
+    cancelled = []
+
+    async def main():
+        event = asyncio.Event()
+
+        async def fetch_page(offset, limit):
+            if offset:
+                event.set()
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(offset)
+                    raise
+            return list(range(offset, offset + limit))
+
+        paginator = Paginator(fetch_page, page_size=5, prefetch=1)
+        items = paginator.items()
+        assert await items.__anext__() == 0
+        await event.wait()
+        await items.aclose()
+
+    asyncio.run(main())
+    assert cancelled
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        Paginator(make_fetch(1, []), page_size=0)
+    with pytest.raises(ValueError):
+        Paginator(make_fetch(1, []), prefetch=0)
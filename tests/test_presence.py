@@ -0,0 +1,29 @@
+from netsapiens_asyncio.presence import PresenceIndex
+
+
+def presence(user: str, state: str = "open", remove: bool = False) -> dict:
+    record = {"domain": "example", "user": user, "presence": state}
+    if remove:
+        record["remove"] = "yes"
+    return record
+
+
+def test_returning_entity_keeps_counting_up():
+    index = PresenceIndex(log_level=50)
+    index.apply("presence", presence("101"))
+    index.apply("presence", presence("101", "busy"))
+    removed = index.apply("presence", presence("101", remove=True))
+    assert removed.version == 3
+    assert index.apply("presence", presence("101")).version == 4
+    # A live entity holds its own version
+    assert not index._versions
+
+
+def test_removed_versions_are_bounded():
+    index = PresenceIndex(removed_versions=100, log_level=50)
+    for round_ in range(3):
+        for user in range(1000):
+            index.apply("presence", presence(str(user)))
+            index.apply("presence", presence(str(user), remove=True))
+    assert len(index._versions) == 100
+    assert index.stats()["entities"] == 0
@@ -0,0 +1,108 @@
+import asyncio
+
+from benchmarks.mock_server import MockNetsapiens
+from netsapiens_asyncio.auth import NetsapiensAPI
+from netsapiens_asyncio.models import SubscriptionRecord
+from netsapiens_asyncio.reconcile import DesiredSubscription, SubscriptionReconciler
+from netsapiens_asyncio.subscribe import SubscriptionAPI
+
+HOOK = "https://hooks.example.com/netsapiens/"
+
+
+def subscription(id_: str, model: str = "call", url: str = HOOK + "call", **fields):
+    record = {
+        "id": id_,
+        "model": model,
+        "post-url": url,
+        "subscription-geo-support": "no",
+        "reseller": "mock",
+        "domain": "*",
+        "user": "*",
+        "subscription-expires-datetime": "2099-12-09T21:27:11+00:00",
+    }
+    record.update(fields)
+    return SubscriptionRecord.decode(record)
+
+
+def desired(model: str = "call", url: str = HOOK + "call") -> DesiredSubscription:
+    return DesiredSubscription(
+        model, url, subscription_geo_support="no", reseller="mock"
+    )
+
+
+def reconcile_against_mock(**options):
+    async def main():
+        async with MockNetsapiens(subscriptions=3) as mock:
+            api = NetsapiensAPI(mock.auth_config(), log_level=50)
+            async with api:
+                await api.get_token()
+                reconciler = SubscriptionReconciler(
+                    SubscriptionAPI(api, log_level=50),
+                    [desired(), desired("cdr", HOOK + "cdr")],
+                    log_level=50,
+                    **options,
+                )
+                outcomes = await reconciler.reconcile()
+                return outcomes, reconciler.stats()
+
+    return asyncio.run(main())
+
+
+def test_default_pass_never_deletes():
+    # The mock lists three identical call subscriptions
+    outcomes, stats = reconcile_against_mock()
+    assert all(outcome.ok for outcome in outcomes)
+    assert (stats["created"], stats["updated"], stats["deleted"]) == (1, 0, 0)
+
+
+def test_prune_deletes_duplicates():
+    outcomes, stats = reconcile_against_mock(prune=True)
+    assert all(outcome.ok for outcome in outcomes)
+    assert (stats["created"], stats["deleted"], stats["failed"]) == (1, 2, 0)
+
+
+def test_other_deployment_on_same_host_is_left_alone():
+    existing = [subscription("ours"), subscription("theirs", "message", HOOK + "sms")]
+    reconciler = SubscriptionReconciler(None, [desired(), desired("cdr", HOOK + "cdr")])
+    changes = reconciler.plan(existing)
+    assert [(c.action, c.subscription_id) for c in changes] == [("create", None)]
+
+
+def test_prune_retargets_and_deletes_managed_leftovers():
+    existing = [
+        subscription("keep"),
+        subscription("old", "message", HOOK + "old"),
+        subscription("stale", "message", HOOK + "stale", domain="other"),
+        subscription("foreign", "message", "https://elsewhere.example.com/x"),
+    ]
+    reconciler = SubscriptionReconciler(
+        None, [desired(), desired("cdr", HOOK + "cdr")], prune=True
+    )
+    changes = {c.subscription_id: c for c in reconciler.plan(existing)}
+    assert set(changes) == {"old", "stale"}
+    assert changes["old"].action == "update"
+    assert changes["old"].changes == {"model": "cdr", "post_url": HOOK + "cdr"}
+    assert changes["stale"].action == "delete"
+
+
+def test_manage_predicate_limits_pruning():
+    existing = [
+        subscription("keep"),
+        subscription("mine", "message", HOOK + "a/old", domain="x"),
+        subscription("shared", "message", HOOK + "b/old", domain="x"),
+    ]
+    reconciler = SubscriptionReconciler(
+        None,
+        [desired()],
+        prune=True,
+        manage=lambda record: record.post_url == HOOK + "call"
+        or record.post_url.startswith(HOOK + "a/"),
+    )
+    changes = reconciler.plan(existing)
+    assert [(c.action, c.subscription_id) for c in changes] == [("delete", "mine")]
+
+
+def test_counter_reset_uses_explicit_keyword():
+    reconciler = SubscriptionReconciler(None, [desired()], reset_error_count=10)
+    (change,) = reconciler.plan([subscription("a", **{"error-count": 12})])
+    assert change.changes == {"reset_error_count": True}
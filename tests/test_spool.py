@@ -0,0 +1,138 @@
+import asyncio
+import os
+import struct
+
+import pytest
+
+from netsapiens_asyncio.exceptions import SpoolError
+from netsapiens_asyncio.spool import SEGMENT_SUFFIX, EventSpool
+
+
+def records(count: int, start: int = 0) -> list:
+    return [f"record-{i}".encode() * 3 for i in range(start, start + count)]
+
+
+def segments(directory) -> list:
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def spool(directory, **options) -> EventSpool:
+    options.setdefault("fsync", False)
+    return EventSpool(str(directory), log_level=50, **options)
+
+
+async def read_all(log: EventSpool, offset=None) -> list:
+    return [item async for item in log.iterate(offset)]
+
+
+def test_reopen_existing_spool(tmp_path):
+    async def main():
+        async with spool(tmp_path, segment_bytes=200) as log:
+            assert await log.append_many(records(20)) == 0
+            await log.commit("worker", 7)
+        async with spool(tmp_path, segment_bytes=200) as log:
+            assert log.next_offset == 20
+            assert log.position("worker") == 7
+            assert await log.append(b"after") == 20
+            return await read_all(log)
+
+    assert asyncio.run(main()) == list(enumerate(records(20) + [b"after"]))
+    assert len(segments(tmp_path)) > 1
+
+
+def test_reopen_is_exclusive(tmp_path):
+    async def main():
+        async with spool(tmp_path):
+            with pytest.raises(SpoolError):
+                await spool(tmp_path).open()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "tail",
+    [
+        b"\x05",  # part of a header
+        struct.pack("<II", 100, 0) + b"short",  # length beyond the end of the file
+    ],
+)
+def test_torn_tail_is_discarded(tmp_path, tail):
+    async def main():
+        async with spool(tmp_path) as log:
+            await log.append_many(records(5))
+        path = segments(tmp_path)[-1]
+        size = os.path.getsize(path)
+        with open(path, "ab") as f:
+            f.write(tail)
+        async with spool(tmp_path) as log:
+            assert os.path.getsize(path) == size
+            assert log.next_offset == 5
+            assert await log.append(b"new") == 5
+        async with spool(tmp_path) as log:
+            return await read_all(log)
+
+    assert asyncio.run(main()) == list(enumerate(records(5) + [b"new"]))
+
+
+def test_crc_mismatch_at_tail_is_discarded(tmp_path):
+    async def main():
+        async with spool(tmp_path) as log:
+            await log.append_many(records(5))
+        path = segments(tmp_path)[-1]
+        with open(path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+        async with spool(tmp_path) as log:
+            assert log.next_offset == 4
+            return await read_all(log)
+
+    assert asyncio.run(main()) == list(enumerate(records(4)))
+
+
+def test_crc_mismatch_in_sealed_segment_raises(tmp_path):
+    async def main():
+        async with spool(tmp_path, segment_bytes=100) as log:
+            await log.append_many(records(10))
+        sealed = segments(tmp_path)[0]
+        with open(sealed, "r+b") as f:
+            f.seek(8)
+            first = f.read(1)
+            f.seek(8)
+            f.write(bytes([first[0] ^ 0xFF]))
+        async with spool(tmp_path, segment_bytes=100) as log:
+            with pytest.raises(SpoolError):
+                log.read(0)
+
+    asyncio.run(main())
+
+
+def test_replay_from_offset_after_compaction(tmp_path):
+    async def main():
+        async with spool(tmp_path, segment_bytes=100, index_interval=2) as log:
+            await log.append_many(records(30))
+            before = len(segments(tmp_path))
+            await log.commit("worker", 17)
+            removed = await log.compact()
+            assert removed > 0
+            assert len(segments(tmp_path)) == before - removed
+            first = log.first_offset
+            assert 0 < first <= 17
+            with pytest.raises(SpoolError):
+                log.read(first - 1)
+            assert log.read(first, 1) == [(first, records(1, first)[0])]
+            resumed = [item async for item in log.iterate(consumer="worker")]
+        async with spool(tmp_path, segment_bytes=100) as log:
+            assert log.first_offset == first
+            assert await log.append(b"more") == 30
+            replayed = await read_all(log, 20)
+        return resumed, replayed
+
+    resumed, replayed = asyncio.run(main())
+    assert resumed == list(enumerate(records(30)))[17:]
+    assert replayed == list(enumerate(records(30) + [b"more"]))[20:]
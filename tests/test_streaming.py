@@ -0,0 +1,157 @@
+import asyncio
+import json
+
+import pytest
+
+from netsapiens_asyncio.streaming import JSONArrayDecoder
+
+
+def decode(document: bytes, chunk_size: int) -> list:
+    decoder = JSONArrayDecoder()
+    elements = []
+    for start in range(0, len(document), chunk_size):
+        elements.extend(decoder.feed(document[start : start + chunk_size]))
+    elements.extend(decoder.close())
+    return elements
+
+
+DOCUMENT = [
+    {"id": 1, "tags": ["a", "b"], "nested": {"x": [1, [2, 3]]}},
+    {"text": 'closing ] and "quoted" and \\ backslash'},
+    {"text": "brace } and comma , inside", "empty": []},
+    "plain string with ]",
+    42,
+    None,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 100000])
+def test_elements_split_across_chunks(chunk_size):
+    document = json.dumps(DOCUMENT).encode()
+    assert decode(document, chunk_size) == DOCUMENT
+
+
+def test_escaped_quote_split_at_backslash():
+    document = b'[{"a": "x\\"]"}, 2]'
+    split = document.index(b"\\") + 1
+    decoder = JSONArrayDecoder()
+    elements = decoder.feed(document[:split]) + decoder.feed(document[split:])
+    assert elements + decoder.close() == [{"a": 'x"]'}, 2]
+
+
+def test_elements_returned_as_soon_as_complete():
+    decoder = JSONArrayDecoder()
+    assert decoder.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert decoder.feed(b": 2}]") == [{"b": 2}]
+    assert decoder.close() == []
+
+
+def test_empty_array_and_whitespace():
+    assert decode(b"  [ ]  ", 1) == []
+    assert decode(b"\n[\n1 ,\n2\n]\n", 3) == [1, 2]
+
+
+def test_non_array_document_is_one_element():
+    document = json.dumps({"code": 404, "message": "not found ]"}).encode()
+    assert decode(document, 5) == [{"code": 404, "message": "not found ]"}]
+
+
+def test_empty_document():
+    assert decode(b"", 1) == []
+    assert decode(b"   ", 1) == []
+
+
+def test_incomplete_array_raises():
+    decoder = JSONArrayDecoder()
+    decoder.feed(b'[{"a": 1}, {"b":')
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_data_after_array_raises():
+    decoder = JSONArrayDecoder()
+    with pytest.raises(ValueError):
+        decoder.feed(b"[1, 2] 3")
+    decoder = JSONArrayDecoder()
+    decoder.feed(b"[1]")
+    with pytest.raises(ValueError):
+        decoder.feed(b"[2]")
+
+
+def test_buffer_only_holds_current_element():
+    decoder = JSONArrayDecoder()
+    decoder.feed(b"[" + b",".join([b'{"pad": "' + b"x" * 100 + b'"}'] * 50))
+    assert len(decoder._buffer) < 200
+
+
+def test_early_aclose_releases_stream():
+    closed = []
+
+    async def elements():
+        decoder = JSONArrayDecoder()
+        try:
+            for chunk in (b"[1,", b"2,", b"3,", b"4]"):
+                for element in decoder.feed(chunk):
+                    yield element
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = elements()
+        received = []
+        async for element in stream:
+            received.append(element)
+            if len(received) == 2:
+                break
+        await stream.aclose()
+        return received
+
+    assert asyncio.run(main()) == [1, 2]
+    assert closed == [True]
+
+
+def test_stream_releases_slot_after_headers():
+    from benchmarks.mock_server import MockNetsapiens
+    from netsapiens_asyncio.auth import NetsapiensAPI
+    from netsapiens_asyncio.calls import CallsAPI
+
+    async def main():
+        async with MockNetsapiens(calls=5) as mock:
+            api = NetsapiensAPI(
+                mock.auth_config(),
+                log_level=50,
+                rate_limits={"calls": {"max_concurrency": 1}},
+            )
+            async with api:
+                await api.get_token()
+                calls = CallsAPI(api, log_level=50)
+                stream = calls.stream_calls("example")
+                first = await stream.__anext__()
+                # A paused consumer does not hold the group's only slot
+                others = await asyncio.wait_for(calls.read_calls("example"), 2)
+                await stream.aclose()
+                assert api.rate_limiter.stats()["calls"]["in_flight"] == 0
+                return first, others
+
+    first, others = asyncio.run(main())
+    assert first == others[0]
+
+
+def test_stream_deadline():
+    from benchmarks.mock_server import MockNetsapiens
+    from netsapiens_asyncio.auth import NetsapiensAPI
+    from netsapiens_asyncio.calls import CallsAPI
+    from netsapiens_asyncio.exceptions import DeadlineExceededError
+
+    async def main():
+        async with MockNetsapiens() as mock:
+            api = NetsapiensAPI(mock.auth_config(), log_level=50)
+            async with api:
+                await api.get_token()
+                mock.latency = 1.0
+                calls = CallsAPI(api, log_level=50)
+                with pytest.raises(DeadlineExceededError):
+                    async for _ in calls.stream_calls("example", deadline=0.1):
+                        pass
+
+    asyncio.run(main())
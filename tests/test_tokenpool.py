@@ -0,0 +1,18 @@
+import asyncio
+
+from benchmarks.mock_server import MockNetsapiens
+from netsapiens_asyncio.tokenpool import TokenPool
+
+
+def test_token_due_right_after_refresh_does_not_busy_loop():
+    async def main():
+        async with MockNetsapiens(token_expires_in=0) as mock:
+            async with TokenPool(min_refresh_interval=0.1, log_level=50) as pool:
+                await pool.get_client(mock.auth_config())
+                await asyncio.sleep(0.35)
+                return pool.stats(), mock.requests
+
+    stats, requests = asyncio.run(main())
+    # One login, then a refresh at most every 0.1s
+    assert 1 <= stats["refreshes"] <= 4
+    assert requests <= 5
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import hmac
+
+import aiohttp
+from aiohttp import web
+
+from netsapiens_asyncio.webhook import WebhookServer, send_test_events
+
+
+async def serve(server: WebhookServer):
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}{server.path}"
+
+
+def deliver(server: WebhookServer, send):
+    received = []
+
+    async def handler(event):
+        received.append(event.payload)
+
+    server.add_handler("call", handler)
+
+    async def main():
+        runner, url = await serve(server)
+        try:
+            async with aiohttp.ClientSession() as session:
+                statuses = await send(url, session)
+        finally:
+            await runner.cleanup()
+        return statuses
+
+    return asyncio.run(main()), received, server.stats()
+
+
+def test_open_by_default():
+    server = WebhookServer(log_level=50)
+    statuses, received, _ = deliver(
+        server, lambda url, s: send_test_events(url, "call", [{"a": 1}], session=s)
+    )
+    assert statuses == [200] and received == [{"a": 1}]
+
+
+def test_secret_required():
+    async def send(url, session):
+        statuses = await send_test_events(url, "call", [{"a": 1}], session=session)
+        statuses += await send_test_events(
+            url, "call", [{"a": 2}], session=session, secret="wrong"
+        )
+        statuses += await send_test_events(
+            url, "call", [{"a": 3}], session=session, secret="s3cret"
+        )
+        async with session.post(
+            f"{url}/call", json={"a": 4}, headers={"Authorization": "Bearer s3cret"}
+        ) as response:
+            statuses.append(response.status)
+        return statuses
+
+    server = WebhookServer(secret="s3cret", log_level=50)
+    statuses, received, stats = deliver(server, send)
+    assert statuses == [401, 401, 200, 200]
+    assert received == [{"a": 3}, {"a": 4}]
+    assert stats["unauthorized"] == 2
+
+
+def test_verify_hook_sees_raw_body():
+    key = b"signing-key"
+
+    async def verify(request, body):
+        expected = hmac.new(key, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(request.headers.get("X-Signature", ""), expected)
+
+    async def send(url, session):
+        statuses = []
+        body = b'{"a": 1}'
+        for signature in ("bad", hmac.new(key, body, hashlib.sha256).hexdigest()):
+            async with session.post(
+                f"{url}/call", data=body, headers={"X-Signature": signature}
+            ) as response:
+                statuses.append(response.status)
+        return statuses
+
+    server = WebhookServer(verify=verify, log_level=50)
+    statuses, received, _ = deliver(server, send)
+    assert statuses == [401, 200] and received == [{"a": 1}]
+
+
+def test_failing_verify_hook_rejects():
+    def verify(request, body):
+        raise RuntimeError("boom")
+
+    server = WebhookServer(verify=verify, log_level=50)
+    statuses, received, _ = deliver(
+        server, lambda url, s: send_test_events(url, "call", [{"a": 1}], session=s)
+    )
+    assert statuses == [401] and received == []
+
+
+def test_failing_handler_does_not_starve_others():
+    server = WebhookServer(log_level=50)
+    seen = []
+
+    async def broken(event):
+        raise RuntimeError("boom")
+
+    async def catch_all(event):
+        seen.append(("*", event.payload))
+
+    server.add_handler("call", broken)
+    server.add_handler("*", catch_all)
+    statuses, received, stats = deliver(
+        server,
+        lambda url, s: send_test_events(url, "call", [{"a": 1}, {"a": 2}], session=s),
+    )
+    assert statuses == [200]
+    # The handler registered by deliver() runs after the failing one
+    assert received == [{"a": 1}, {"a": 2}]
+    assert seen == [("*", {"a": 1}), ("*", {"a": 2})]
+    assert stats["failed"] == 2 and stats["processed"] == 0